@@ -0,0 +1,121 @@
+from argparse import ArgumentParser
+
+from .assignment import run_assignment_benchmark
+from .batch import run_batch_benchmark
+from .cache import run_cache_benchmark
+from .events import run_events_benchmark
+from .nodes import run_nodes_benchmark
+from .refinement import run_adaptive_benchmark, run_refinement_benchmark, run_shift_cache_benchmark
+from .rendering import run_rendering_benchmark
+from .scaling import run_scaling_benchmark
+from .session import run_session_benchmark
+from .streaming import run_streaming_benchmark
+from .sweep import run_sweep_benchmark
+
+
+def main():
+    parser = ArgumentParser()
+
+    subparsers = parser.add_subparsers(dest="command", help="Benchmarks")
+
+    assign_parser = subparsers.add_parser("assignment", help="Notehead to measure assignment")
+    assign_parser.add_argument("-s", "--staffs", type=int, nargs="+", default=[1, 10, 50, 100],
+                               help="Numbers of staffs on generated pages")
+
+    events_parser = subparsers.add_parser("events", help="Grouping noteheads of a single measure into note events")
+    events_parser.add_argument("-n", "--noteheads", type=int, nargs="+", default=[1, 10, 100, 1000],
+                               help="Numbers of noteheads in the measure")
+
+    nodes_parser = subparsers.add_parser("nodes", help="Memory and tag access of graph nodes")
+    nodes_parser.add_argument("-s", "--staffs", type=int, nargs="+", default=[10, 100, 1000],
+                              help="Numbers of staffs on generated pages")
+
+    batch_parser = subparsers.add_parser("batch", help="Batch reconstruction on a process pool")
+    batch_parser.add_argument("-w", "--workers", type=int, nargs="+", default=[0, 1, 2, 4],
+                              help="Numbers of worker processes, 0 runs the pages serially")
+    batch_parser.add_argument("-p", "--pages", type=int, default=200, help="Number of generated pages")
+
+    scaling_parser = subparsers.add_parser("scaling", help="Reconstruction and linearization of growing pages")
+    scaling_parser.add_argument("-n", "--noteheads", type=int, nargs="+", default=[10, 100, 1000, 10000, 100000],
+                                help="Approximate numbers of noteheads on generated pages")
+    scaling_parser.add_argument("--staffs_per_system", type=int, default=2, help="Number of staffs in a system")
+    scaling_parser.add_argument("--chord_density", type=float, default=0.3,
+                                help="Probability of a notehead being stacked into a chord")
+    scaling_parser.add_argument("--jitter", type=int, default=2, help="Maximum random shift of boxes in pixels")
+    scaling_parser.add_argument("-r", "--repeats", type=int, default=3, help="Number of timed runs of each size")
+
+    session_parser = subparsers.add_parser("session", help="Single notehead edits in a page session")
+    session_parser.add_argument("-s", "--systems", type=int, nargs="+", default=[1, 10, 50],
+                                help="Numbers of grand staff systems on generated pages")
+    session_parser.add_argument("-e", "--edits", type=int, default=50, help="Number of edits")
+
+    cache_parser = subparsers.add_parser("cache", help="Memoized reconstruction")
+    cache_parser.add_argument("-s", "--systems", type=int, nargs="+", default=[1, 10, 50],
+                              help="Numbers of grand staff systems on generated pages")
+
+    sweep_parser = subparsers.add_parser("sweep", help="Threshold sweep with shared precomputation")
+    sweep_parser.add_argument("-s", "--systems", type=int, nargs="+", default=[1, 10, 50],
+                              help="Numbers of grand staff systems on generated pages")
+
+    streaming_parser = subparsers.add_parser("streaming", help="Tile by tile streaming reconstruction")
+    streaming_parser.add_argument("-s", "--systems", type=int, nargs="+", default=[1, 10, 50],
+                                  help="Numbers of grand staff systems on generated pages")
+    streaming_parser.add_argument("-l", "--latency", type=float, default=0.02,
+                                  help="Simulated detection time of a single tile in seconds")
+
+    refinement_parser = subparsers.add_parser("refinement", help="Concurrent staff line refinement")
+    refinement_parser.add_argument("-w", "--workers", type=int, nargs="+", default=[0, 1, 2, 4, 8],
+                                   help="Numbers of worker threads, 0 refines measures sequentially")
+    refinement_parser.add_argument("-s", "--systems", type=int, default=8,
+                                   help="Number of grand staff systems on the generated page (16 measures each)")
+
+    adaptive_parser = subparsers.add_parser("adaptive", help="Adaptive staff line refinement")
+    adaptive_parser.add_argument("-s", "--systems", type=int, nargs="+", default=[1, 10, 50],
+                                 help="Numbers of grand staff systems on generated pages")
+    adaptive_parser.add_argument("-l", "--loose", type=float, default=0.1,
+                                 help="Share of measures with loose top and bottom edges")
+
+    shifts_parser = subparsers.add_parser("shifts", help="Cached staff line shifts")
+    shifts_parser.add_argument("-s", "--systems", type=int, nargs="+", default=[1, 10, 50],
+                               help="Numbers of grand staff systems on generated pages")
+
+    render_parser = subparsers.add_parser("render", help="Headless rendering of page overlays")
+    render_parser.add_argument("-w", "--workers", type=int, nargs="+", default=[0, 2, 4],
+                               help="Numbers of worker processes, 0 renders pages in the main process")
+    render_parser.add_argument("-p", "--pages", type=int, default=20, help="Number of rendered pages")
+
+    args = parser.parse_args()
+
+    if args.command == "assignment":
+        run_assignment_benchmark(args.staffs)
+    elif args.command == "events":
+        run_events_benchmark(args.noteheads)
+    elif args.command == "batch":
+        run_batch_benchmark(args.workers, page_count=args.pages)
+    elif args.command == "nodes":
+        run_nodes_benchmark(args.staffs)
+    elif args.command == "refinement":
+        run_refinement_benchmark(args.workers, system_count=args.systems)
+    elif args.command == "adaptive":
+        run_adaptive_benchmark(args.systems, loose_share=args.loose)
+    elif args.command == "shifts":
+        run_shift_cache_benchmark(args.systems)
+    elif args.command == "render":
+        run_rendering_benchmark(args.workers, page_count=args.pages)
+    elif args.command == "streaming":
+        run_streaming_benchmark(args.systems, tile_latency=args.latency)
+    elif args.command == "sweep":
+        run_sweep_benchmark(args.systems)
+    elif args.command == "cache":
+        run_cache_benchmark(args.systems)
+    elif args.command == "session":
+        run_session_benchmark(args.systems, edit_count=args.edits)
+    elif args.command == "scaling":
+        run_scaling_benchmark(args.noteheads, staffs_per_system=args.staffs_per_system,
+                              chord_density=args.chord_density, jitter=args.jitter, repeats=args.repeats)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
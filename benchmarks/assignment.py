@@ -0,0 +1,41 @@
+from timeit import default_timer as timer
+
+import numpy as np
+from prettytable import PrettyTable, MARKDOWN
+
+from tonic.Reconstruction.Graph.Node import assign_to_closest
+from .synthetic import generate_page, MEASURE_HEIGHT
+
+
+def run_assignment_benchmark(staff_counts: list[int], measures_per_staff: int = 8, notes_per_measure: int = 8):
+    """
+    Compares the interval index based ``assign_to_closest`` with the original loop over all measures.
+    """
+    table = PrettyTable(["staffs", "measures", "noteheads", "loop [s]", "index [s]", "speedup"])
+    table.set_style(MARKDOWN)
+    table.align = "r"
+
+    for staff_count in staff_counts:
+        times = []
+        assignments = []
+        for use_index in [False, True]:
+            measures, _, noteheads = generate_page(staff_count, measures_per_staff, notes_per_measure)
+            start = timer()
+            assign_to_closest(measures, noteheads, upper_limit=MEASURE_HEIGHT * 1.5, use_index=use_index)
+            times.append(timer() - start)
+            positions = {id(n): i for i, n in enumerate(noteheads)}
+            assignments.append([[positions[id(n)] for n in m.children()] for m in measures])
+
+        if assignments[0] != assignments[1]:
+            raise RuntimeError(f"Assignments differ for {staff_count} staffs")
+
+        table.add_row([
+            staff_count,
+            staff_count * measures_per_staff,
+            staff_count * measures_per_staff * notes_per_measure,
+            f"{times[0]:.4f}",
+            f"{times[1]:.4f}",
+            f"{times[0] / max(times[1], np.finfo(float).eps):.1f}x"
+        ])
+
+    print(table)
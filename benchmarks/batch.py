@@ -0,0 +1,48 @@
+from timeit import default_timer as timer
+
+from prettytable import PrettyTable, MARKDOWN
+
+from tonic.Reconstruction import reconstruct_note_events_batch
+from tonic.Reconstruction.Graph import PageGraph
+from tonic.Reconstruction.Graph.BoxArrays import boxes_from_nodes
+from .synthetic import generate_page
+
+
+def run_batch_benchmark(
+        worker_counts: list[int],
+        page_count: int = 200,
+        staff_count: int = 10,
+        chunksize: int = 8
+):
+    """
+    Measures throughput of batch reconstruction for different numbers of worker processes,
+    0 workers is the serial baseline.
+    """
+    pages = []
+    for seed in range(page_count):
+        measures, grand_staffs, noteheads = generate_page(staff_count, seed=seed)
+        pages.append((boxes_from_nodes(measures), boxes_from_nodes(grand_staffs), PageGraph.from_nodes(noteheads)))
+
+    table = PrettyTable(["workers", "pages", "time [s]", "pages/s", "speedup"])
+    table.set_style(MARKDOWN)
+    table.align = "r"
+
+    baseline = None
+    for workers in worker_counts:
+        start = timer()
+        failed = sum(not result.ok for result in reconstruct_note_events_batch(pages, workers=workers,
+                                                                                chunksize=chunksize))
+        elapsed = timer() - start
+        if failed > 0:
+            raise RuntimeError(f"{failed} pages failed with {workers} workers")
+
+        baseline = elapsed if baseline is None else baseline
+        table.add_row([
+            workers,
+            page_count,
+            f"{elapsed:.3f}",
+            f"{page_count / elapsed:.1f}",
+            f"{baseline / elapsed:.1f}x"
+        ])
+
+    print(table)
@@ -0,0 +1,60 @@
+import tempfile
+from timeit import default_timer as timer
+
+from prettytable import PrettyTable, MARKDOWN
+
+from tonic.Reconstruction import ReconstructionCache
+from tonic.Reconstruction.Graph import PageGraph
+from tonic.Reconstruction.Graph.BoxArrays import boxes_from_nodes
+from .synthetic import PageShape, generate_score_page
+
+
+def run_cache_benchmark(system_counts: list[int], repeats: int = 5, seed: int = 0):
+    """
+    Compares the first (missed) reconstruction of a page with repeated reconstructions
+    served from memory and from the disk store of ``ReconstructionCache``.
+    """
+    table = PrettyTable(["systems", "noteheads", "miss [ms]", "memory hit [ms]", "disk hit [ms]",
+                         "nodes hit [ms]", "speedup"])
+    table.set_style(MARKDOWN)
+    table.align = "r"
+
+    with tempfile.TemporaryDirectory() as directory:
+        for system_count in system_counts:
+            shape = PageShape(system_count, staffs_per_system=2, chord_density=0.3, jitter=2)
+            measures, grand_staffs, noteheads = generate_score_page(shape, seed=seed)
+            page = (boxes_from_nodes(measures), boxes_from_nodes(grand_staffs), PageGraph.from_nodes(noteheads))
+
+            cache = ReconstructionCache(directory=directory)
+            start = timer()
+            cache.reconstruct_lmx(*page)
+            miss = timer() - start
+
+            start = timer()
+            for _ in range(repeats):
+                cache.reconstruct_lmx(*page)
+            memory_hit = (timer() - start) / repeats
+
+            start = timer()
+            for _ in range(repeats):
+                # a new cache with the same directory has nothing in memory
+                ReconstructionCache(directory=directory).reconstruct_lmx(*page)
+            disk_hit = (timer() - start) / repeats
+
+            # nodes are converted to arrays before hashing
+            start = timer()
+            for _ in range(repeats):
+                cache.reconstruct_lmx(measures, grand_staffs, noteheads)
+            nodes_hit = (timer() - start) / repeats
+
+            table.add_row([
+                system_count,
+                shape.notehead_count,
+                f"{miss * 1000:.2f}",
+                f"{memory_hit * 1000:.3f}",
+                f"{disk_hit * 1000:.3f}",
+                f"{nodes_hit * 1000:.3f}",
+                f"{miss / memory_hit:.0f}x"
+            ])
+
+    print(table)
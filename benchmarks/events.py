@@ -0,0 +1,106 @@
+import itertools
+from timeit import default_timer as timer
+
+import numpy as np
+from prettytable import PrettyTable, MARKDOWN
+
+from odtools.Conversions.BoundingBox import Direction
+from tonic.Reconstruction.Graph import Strips
+from tonic.Reconstruction.Graph.BoxArrays import intersects
+from .synthetic import MEASURE_WIDTH, MEASURE_HEIGHT, NOTEHEAD_SIZE
+
+
+def _random_noteheads(count: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    lefts = rng.integers(0, MEASURE_WIDTH - NOTEHEAD_SIZE, count)
+    tops = rng.integers(-NOTEHEAD_SIZE, MEASURE_HEIGHT, count)
+    return np.stack([lefts, tops, lefts + NOTEHEAD_SIZE, tops + NOTEHEAD_SIZE], axis=1)
+
+
+def _cluster_noteheads(count: int, seed: int = 0) -> np.ndarray:
+    """
+    Chain of slightly shifted noteheads (tone cluster), consecutive noteheads have low IoU,
+    so every notehead joins the event only because it intersects with the previous ones.
+    """
+    rng = np.random.default_rng(seed)
+    lefts = np.arange(count) * (NOTEHEAD_SIZE * 5 // 8)
+    tops = rng.integers(0, NOTEHEAD_SIZE // 2, count)
+    return np.stack([lefts, tops, lefts + NOTEHEAD_SIZE, tops + NOTEHEAD_SIZE], axis=1)
+
+
+def _merge_intersecting_scan(
+        sorted_boxes: np.ndarray,
+        new_strip: np.ndarray,
+        segment_start: np.ndarray,
+        direction: Direction
+) -> np.ndarray:
+    """
+    Reference for ``Strips._merge_intersecting_sweep``, keeps box in the current strip if it intersects
+    with any box already in the strip, compares every box with all boxes of the current strip.
+    """
+    new_strip = new_strip.copy()
+    strip_start = 0
+    for i in range(len(sorted_boxes)):
+        if segment_start[i]:
+            strip_start = i
+        elif new_strip[i]:
+            if intersects(sorted_boxes[i], sorted_boxes[strip_start:i]).any():
+                new_strip[i] = False
+            else:
+                strip_start = i
+    return new_strip
+
+
+def run_events_benchmark(note_counts: list[int], neiou_threshold: float = 0.4, repeats: int = 3):
+    """
+    Compares the sweep line intersection check used when grouping noteheads into note events
+    with comparing every notehead to all members of the current event, noteheads are placed in a single measure.
+    """
+    table = PrettyTable(["layout", "noteheads", "events", "scan [s]", "sweep [s]", "speedup"])
+    table.set_style(MARKDOWN)
+    table.align = "r"
+
+    for (layout, generator), count in itertools.product(
+            [("random", _random_noteheads), ("cluster", _cluster_noteheads)],
+            note_counts
+    ):
+        boxes = generator(count)
+        offsets = np.array([0, count])
+
+        times = []
+        results = []
+        for merge in [_merge_intersecting_scan, Strips._merge_intersecting_sweep]:
+            best = np.inf
+            for _ in range(repeats):
+                # the same sorting is run with the given implementation of the intersection check
+                sorted_boxes = boxes[np.argsort(boxes[:, 0], kind="stable")]
+                iou = Strips.iou_1d(sorted_boxes[1:, 0], sorted_boxes[1:, 2], sorted_boxes[:-1, 0], sorted_boxes[:-1, 2])
+                new_strip = np.ones(count, dtype=bool)
+                new_strip[1:] = ~(iou > neiou_threshold)
+                segment_start = np.zeros(count, dtype=bool)
+                segment_start[0] = True
+
+                start = timer()
+                result = merge(sorted_boxes, new_strip, segment_start, Direction.VERTICAL)
+                best = min(best, timer() - start)
+            times.append(best)
+            results.append(result)
+
+        if not np.array_equal(results[0], results[1]):
+            raise RuntimeError(f"Note events differ for {count} noteheads")
+
+        # sanity check of the whole pipeline
+        labels, _, _ = Strips.sort_segments_to_strips(
+            boxes, offsets, neiou_threshold, direction=Direction.VERTICAL, check_intersections=True
+        )
+
+        table.add_row([
+            layout,
+            count,
+            labels.max() + 1 if count > 0 else 0,
+            f"{times[0]:.5f}",
+            f"{times[1]:.5f}",
+            f"{times[0] / max(times[1], np.finfo(float).eps):.1f}x"
+        ])
+
+    print(table)
@@ -0,0 +1,100 @@
+import tracemalloc
+from timeit import default_timer as timer
+from typing import Any
+
+from prettytable import PrettyTable, MARKDOWN
+
+from odtools.Conversions.Annotations.Annotation import Annotation
+from tonic.Reconstruction.Graph import Node, NodeName, NoteheadType, NOTEHEAD_TYPE_TAG
+from tonic.Reconstruction.Graph.Tags import SYMBOL_PITCH_TAG, SYMBOL_GS_INDEX_TAG
+from .synthetic import generate_page
+
+
+class _DictNode:
+    """
+    Node storing its tags in a per-instance dictionary, the way nodes were stored before ``__slots__``.
+    """
+
+    def __init__(self, base: Annotation, tags: dict[str, Any] = None, name: NodeName = None):
+        self.total_bbox = base.bbox
+        self.name = name
+        self._children = []
+        self._tags: dict[str, Any] = tags if tags is not None else {}
+        self.annot = base
+
+    def get_tag(self, key: str) -> Any:
+        return self._tags.get(key, None)
+
+    def set_tag(self, key: str, value: Any):
+        self._tags[key] = value
+
+
+def _build(node_class, annots: list[Annotation]) -> list:
+    nodes = []
+    for i, annot in enumerate(annots):
+        node = node_class(annot, name=NodeName.NOTEHEAD)
+        node.set_tag(NOTEHEAD_TYPE_TAG, NoteheadType.FULL)
+        node.set_tag(SYMBOL_PITCH_TAG, i % 16 - 4.0)
+        node.set_tag(SYMBOL_GS_INDEX_TAG, i % 2 + 1)
+        nodes.append(node)
+    return nodes
+
+
+def _read(nodes: list) -> float:
+    total = 0.0
+    for node in nodes:
+        total += node.get_tag(SYMBOL_PITCH_TAG) + node.get_tag(SYMBOL_GS_INDEX_TAG)
+    return total
+
+
+def _read_attributes(nodes: list[Node]) -> float:
+    total = 0.0
+    for node in nodes:
+        total += node.pitch + node.gs_index
+    return total
+
+
+def run_nodes_benchmark(staff_counts: list[int], measures_per_staff: int = 8, notes_per_measure: int = 8):
+    """
+    Compares memory and tag access time of ``__slots__`` based nodes with dictionary based nodes.
+    Memory is measured for the nodes only, annotations are created beforehand and shared.
+    """
+    table = PrettyTable(["noteheads", "node", "memory [MB]", "bytes/node", "build [s]", "get_tag [s]", "attribute [s]"])
+    table.set_style(MARKDOWN)
+    table.align = "r"
+
+    for staff_count in staff_counts:
+        _, _, noteheads = generate_page(staff_count, measures_per_staff, notes_per_measure)
+        annots = [n.annot for n in noteheads]
+        del noteheads
+
+        for label, node_class in [("dict", _DictNode), ("slots", Node)]:
+            tracemalloc.start()
+            start = timer()
+            nodes = _build(node_class, annots)
+            build_time = timer() - start
+            memory, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            start = timer()
+            _read(nodes)
+            read_time = timer() - start
+
+            attribute_time = None
+            if node_class is Node:
+                start = timer()
+                _read_attributes(nodes)
+                attribute_time = timer() - start
+
+            table.add_row([
+                len(annots),
+                label,
+                f"{memory / 2 ** 20:.2f}",
+                f"{memory / max(len(annots), 1):.0f}",
+                f"{build_time:.4f}",
+                f"{read_time:.4f}",
+                f"{attribute_time:.4f}" if attribute_time is not None else "-"
+            ])
+            del nodes
+
+    print(table)
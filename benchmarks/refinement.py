@@ -0,0 +1,193 @@
+import random
+import tempfile
+from pathlib import Path
+from timeit import default_timer as timer
+
+import cv2
+import numpy as np
+from odtools.Conversions.BoundingBox import BoundingBox
+from prettytable import PrettyTable, MARKDOWN
+
+from tonic.Linearization.GraphToLMX import linearize_note_events_to_lmx
+from tonic.Reconstruction import PipelineStats, ShiftCache, reconstruct_note_events
+from tonic.Reconstruction.Graph.BoxArrays import boxes_from_nodes
+from tonic.Reconstruction.StaLiXWrapper import refactor_measures_on_page, refine_measure_boxes
+from tonic.Reconstruction.Stats import COUNT_DETECTED_MEASURES
+from tonic.SERVal.utils import compute_LMX_metrics
+from .synthetic import PageShape, generate_score_page
+
+PAGE_MARGIN = 50
+
+
+def _draw_staffs(measures: np.ndarray) -> np.ndarray:
+    """
+    Draws five staff lines into every measure box on a white page.
+    """
+    image = np.full((int(measures[:, 3].max()) + PAGE_MARGIN, int(measures[:, 2].max()) + PAGE_MARGIN), 255,
+                    dtype=np.uint8)
+    for left, top, right, bottom in measures.tolist():
+        for line in np.linspace(top, bottom, 5).round().astype(int).tolist():
+            image[line:line + 2, left:right] = 0
+    return image
+
+
+def run_refinement_benchmark(worker_counts: list[int], system_count: int = 8, repeats: int = 3, seed: int = 0):
+    """
+    Measures staff line refinement of all measures of a generated page with staff lines drawn in,
+    for different numbers of worker threads, 0 workers is the sequential baseline.
+    Every configuration must shift the measures exactly as the sequential refinement.
+    """
+    shape = PageShape(system_count, staffs_per_system=2)
+    measures, _, _ = generate_score_page(shape, seed=seed)
+    image = _draw_staffs(boxes_from_nodes(measures))
+
+    table = PrettyTable(["workers", "measures", "time [s]", "measures/s", "speedup"])
+    table.set_style(MARKDOWN)
+    table.align = "r"
+
+    baseline = None
+    expected = None
+    for workers in worker_counts:
+        best = np.inf
+        for _ in range(repeats):
+            measures, _, _ = generate_score_page(shape, seed=seed)
+            start = timer()
+            refactor_measures_on_page(measures, image, workers=workers)
+            best = min(best, timer() - start)
+
+        refined = boxes_from_nodes(measures)
+        expected = refined if expected is None else expected
+        if not np.array_equal(refined, expected):
+            raise RuntimeError(f"Refinement with {workers} workers differs from the sequential one")
+
+        baseline = best if baseline is None else baseline
+        table.add_row([
+            workers,
+            len(measures),
+            f"{best:.3f}",
+            f"{len(measures) / best:.1f}",
+            f"{baseline / best:.1f}x"
+        ])
+
+    print(table)
+
+
+def _loosen_measures(measures: list, loose_share: float, padding: int, jitter: int, seed: int):
+    """
+    Turns exact measures into detections, every edge is shifted by up to ``jitter`` pixels
+    and a share of measures gets loose top and bottom edges.
+    """
+    rnd = random.Random(seed)
+    for measure in measures:
+        bbox = measure.annot.bbox
+        pad = padding if rnd.random() < loose_share else 0
+        measure.annot.bbox = BoundingBox(
+            bbox.left + rnd.randint(-jitter, jitter),
+            bbox.top - pad + rnd.randint(-jitter, jitter),
+            bbox.right + rnd.randint(-jitter, jitter),
+            bbox.bottom + pad + rnd.randint(-jitter, jitter)
+        )
+
+
+def run_adaptive_benchmark(
+        system_counts: list[int],
+        loose_share: float = 0.1,
+        padding: int = 12,
+        jitter: int = 2,
+        repeats: int = 3,
+        seed: int = 0
+):
+    """
+    Compares refinement of every measure with the adaptive refinement on generated pages with staff lines
+    drawn in, whose measure boxes are jittered and partly loosened. Pages refined both ways are reconstructed
+    and SER against the page reconstructed from exact measures is reported for each.
+    """
+    table = PrettyTable(["systems", "measures", "detected", "full [ms]", "adaptive [ms]", "saved [ms]",
+                         "SER full", "SER adaptive", "same LMX"])
+    table.set_style(MARKDOWN)
+    table.align = "r"
+
+    for system_count in system_counts:
+        shape = PageShape(system_count, staffs_per_system=2, chord_density=0.3)
+        measures, grand_staffs, noteheads = generate_score_page(shape, seed=seed)
+        image = _draw_staffs(boxes_from_nodes(measures))
+        ground_truth = linearize_note_events_to_lmx(reconstruct_note_events(measures, grand_staffs, noteheads))
+
+        times = []
+        results = []
+        stats = None
+        for adaptive in [False, True]:
+            best = np.inf
+            for _ in range(repeats):
+                measures, grand_staffs, noteheads = generate_score_page(shape, seed=seed)
+                _loosen_measures(measures, loose_share, padding, jitter, seed)
+                stats = PipelineStats()
+                start = timer()
+                refactor_measures_on_page(measures, image, stats=stats, adaptive=adaptive)
+                best = min(best, timer() - start)
+            times.append(best)
+            results.append(linearize_note_events_to_lmx(reconstruct_note_events(measures, grand_staffs, noteheads)))
+
+        detected = stats.counts[COUNT_DETECTED_MEASURES]
+        table.add_row([
+            system_count,
+            len(measures),
+            f"{100 * detected / len(measures):.1f} %",
+            f"{times[0] * 1000:.2f}",
+            f"{times[1] * 1000:.2f}",
+            f"{(times[0] - times[1]) * 1000:.2f}",
+            f"{compute_LMX_metrics(results[0], ground_truth)[0]:.4f}",
+            f"{compute_LMX_metrics(results[1], ground_truth)[0]:.4f}",
+            results[0].tokens == results[1].tokens
+        ])
+
+    print(table)
+
+
+def run_shift_cache_benchmark(system_counts: list[int], repeats: int = 3, seed: int = 0):
+    """
+    Measures repeated refinement of a page stored as PNG, without a cache, served by ``ShiftCache``
+    from memory and from disk by a new cache instance (as in a rerun of the pipeline).
+    Cached pages are not decoded, so both cached columns include only hashing of the file.
+    """
+    table = PrettyTable(["systems", "measures", "no cache [ms]", "memory [ms]", "disk [ms]", "speedup memory",
+                         "speedup disk"])
+    table.set_style(MARKDOWN)
+    table.align = "r"
+
+    with tempfile.TemporaryDirectory() as directory:
+        for system_count in system_counts:
+            measures, _, _ = generate_score_page(PageShape(system_count, staffs_per_system=2, jitter=2), seed=seed)
+            boxes = boxes_from_nodes(measures)
+            image_path = Path(directory) / f"page_{system_count}.png"
+            cv2.imwrite(str(image_path), _draw_staffs(boxes))
+            expected = refine_measure_boxes(boxes, image_path)
+
+            cache_directory = Path(directory) / "shifts"
+            refine_measure_boxes(boxes, image_path, shift_cache=ShiftCache(directory=cache_directory))
+            memory_cache = ShiftCache()
+            refine_measure_boxes(boxes, image_path, shift_cache=memory_cache)
+
+            times = []
+            for make_cache in [lambda: None, lambda: memory_cache, lambda: ShiftCache(directory=cache_directory)]:
+                best = np.inf
+                for _ in range(repeats):
+                    cache = make_cache()
+                    start = timer()
+                    refined = refine_measure_boxes(boxes, image_path, shift_cache=cache)
+                    best = min(best, timer() - start)
+                    if not np.array_equal(refined, expected):
+                        raise RuntimeError("Cached shifts differ from the detected ones")
+                times.append(best)
+
+            table.add_row([
+                system_count,
+                len(boxes),
+                f"{times[0] * 1000:.2f}",
+                f"{times[1] * 1000:.2f}",
+                f"{times[2] * 1000:.2f}",
+                f"{times[0] / times[1]:.1f}x",
+                f"{times[0] / times[2]:.1f}x"
+            ])
+
+    print(table)
@@ -0,0 +1,92 @@
+import tempfile
+from pathlib import Path
+from timeit import default_timer as timer
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from prettytable import PrettyTable, MARKDOWN
+
+from tonic.Reconstruction import PageOverlay, PageRenderer, reconstruct_note_events, render_pages_batch
+from tonic.Reconstruction.Graph.BoxArrays import boxes_from_nodes
+from .refinement import _draw_staffs
+from .synthetic import PageShape, generate_score_page
+
+
+def _load_font_per_call() -> ImageFont.ImageFont:
+    try:
+        return ImageFont.truetype("arial.ttf", size=30)
+    except IOError:
+        return ImageFont.load_default()
+
+
+def _render_like_viz_utils(image_path: Path, overlay: PageOverlay, output_path: Path):
+    """
+    Steps of ``visualize_result`` followed by ``write_numbers_on_image``, with the image written
+    instead of shown: the image is decoded for each layer, boxes are drawn one by one,
+    the canvas is converted to PIL and the font is loaded for every call.
+    """
+    canvas = None
+    for boxes, color in [(overlay.grand_staffs, (0, 255, 0)), (overlay.measures, (0, 0, 255)),
+                         (overlay.events, (255, 0, 0))]:
+        layer = cv2.imread(str(image_path)) if canvas is None else canvas.copy()
+        for left, top, right, bottom in boxes.tolist():
+            cv2.rectangle(layer, (left, top), (right, bottom), color, 2)
+        canvas = layer
+
+    image = Image.fromarray(cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB))
+    draw = ImageDraw.Draw(image)
+    font = _load_font_per_call()
+    for (x, y), label in zip(overlay.label_positions.tolist(), overlay.labels):
+        draw.text((x, y), label, font=font, fill=(0, 255, 0))
+    image.save(output_path.with_suffix(".result.png"))
+
+    # generated pages are gray, colored text needs an RGB image
+    image = Image.open(image_path).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    font = _load_font_per_call()
+    for i, (x, y) in enumerate(np.concatenate(overlay.reading_order).tolist(), start=1):
+        draw.text((x, y), str(i), font=font, fill=(255, 0, 0))
+    image.save(output_path.with_suffix(".order.png"))
+
+
+def run_rendering_benchmark(worker_counts: list[int], page_count: int = 20, system_count: int = 10, seed: int = 0):
+    """
+    Writes overlays of a batch of reconstructed pages with steps of the ``VizUtils`` helpers
+    (two files per page, as the helpers show two windows) and with ``PageRenderer``
+    by ``render_pages_batch`` for different numbers of worker processes, 0 renders in this process.
+    """
+    shape = PageShape(system_count, staffs_per_system=2, chord_density=0.3)
+    table = PrettyTable(["renderer", "workers", "pages", "time [s]", "pages/s", "speedup"])
+    table.set_style(MARKDOWN)
+    table.align = "r"
+
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        jobs = []
+        for page in range(page_count):
+            measures, grand_staffs, noteheads = generate_score_page(shape, seed=seed + page)
+            image_path = directory / f"page_{page}.png"
+            cv2.imwrite(str(image_path), _draw_staffs(boxes_from_nodes(measures)))
+            overlay = PageOverlay.from_note_events(reconstruct_note_events(measures, grand_staffs, noteheads),
+                                                   measures, grand_staffs)
+            jobs.append((image_path, overlay, directory / "rendered" / f"page_{page}.png"))
+
+        (directory / "viz").mkdir()
+        start = timer()
+        for image_path, overlay, _ in jobs:
+            _render_like_viz_utils(image_path, overlay, directory / "viz" / image_path.name)
+        baseline = timer() - start
+        table.add_row(["VizUtils steps", 0, page_count, f"{baseline:.3f}", f"{page_count / baseline:.1f}", "1.0x"])
+
+        renderer = PageRenderer()
+        for workers in worker_counts:
+            start = timer()
+            results = list(render_pages_batch(jobs, renderer, workers=workers))
+            elapsed = timer() - start
+            if not all(result.ok for result in results):
+                raise RuntimeError(next(result.error for result in results if not result.ok))
+            table.add_row(["PageRenderer", workers, page_count, f"{elapsed:.3f}", f"{page_count / elapsed:.1f}",
+                           f"{baseline / elapsed:.1f}x"])
+
+    print(table)
@@ -0,0 +1,85 @@
+import math
+import tracemalloc
+from timeit import default_timer as timer
+
+from prettytable import PrettyTable, MARKDOWN
+
+from tonic.Linearization.GraphToLMX import linearize_note_events_to_lmx
+from tonic.Reconstruction import reconstruct_note_events
+from .synthetic import PageShape, generate_score_page
+
+
+def _run(shape: PageShape, seed: int) -> tuple[float, float]:
+    measures, grand_staffs, noteheads = generate_score_page(shape, seed=seed)
+
+    start = timer()
+    events = reconstruct_note_events(measures, grand_staffs, noteheads)
+    reconstruction = timer() - start
+
+    start = timer()
+    linearize_note_events_to_lmx(events)
+    linearization = timer() - start
+
+    return reconstruction, linearization
+
+
+def _peak_memory(shape: PageShape, seed: int) -> int:
+    # the page is generated before tracing, only allocations of the pipeline are measured
+    measures, grand_staffs, noteheads = generate_score_page(shape, seed=seed)
+
+    tracemalloc.start()
+    try:
+        linearize_note_events_to_lmx(reconstruct_note_events(measures, grand_staffs, noteheads))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def run_scaling_benchmark(
+        notehead_counts: list[int],
+        staffs_per_system: int = 2,
+        chord_density: float = 0.3,
+        jitter: int = 2,
+        repeats: int = 3,
+        seed: int = 0
+):
+    """
+    Measures time and peak memory of reconstruction and linearization of generated pages
+    with increasing number of noteheads.
+
+    Times are the best of ``repeats`` runs, the exponent is the slope of total time between two consecutive
+    sizes in log-log scale, linear algorithms stay close to 1, quadratic ones approach 2.
+    """
+    table = PrettyTable(["noteheads", "measures", "systems", "reconstruction [s]", "linearization [s]",
+                         "us/notehead", "exponent", "peak memory [MB]"])
+    table.set_style(MARKDOWN)
+    table.align = "r"
+
+    previous = None
+    for count in notehead_counts:
+        shape = PageShape.for_notehead_count(count, staffs_per_system=staffs_per_system,
+                                             chord_density=chord_density, jitter=jitter)
+        runs = [_run(shape, seed) for _ in range(repeats)]
+        reconstruction = min(run[0] for run in runs)
+        linearization = min(run[1] for run in runs)
+        total = reconstruction + linearization
+        peak = _peak_memory(shape, seed)
+
+        exponent = ""
+        if previous is not None and shape.notehead_count != previous[0] and previous[1] > 0:
+            exponent = f"{math.log(total / previous[1]) / math.log(shape.notehead_count / previous[0]):.2f}"
+        previous = (shape.notehead_count, total)
+
+        table.add_row([
+            shape.notehead_count,
+            shape.measure_count,
+            shape.systems_per_page,
+            f"{reconstruction:.4f}",
+            f"{linearization:.4f}",
+            f"{total / shape.notehead_count * 1e6:.1f}",
+            exponent,
+            f"{peak / 2 ** 20:.2f}"
+        ])
+
+    print(table)
@@ -0,0 +1,68 @@
+import random
+from timeit import default_timer as timer
+
+from prettytable import PrettyTable, MARKDOWN
+
+from odtools.Conversions.BoundingBox import BoundingBox
+from tonic.Linearization.GraphToLMX import linearize_note_events_to_lmx
+from tonic.Reconstruction import PageSession, reconstruct_note_events
+from .synthetic import PageShape, generate_score_page, NOTEHEAD_SIZE
+
+
+def _random_moves(noteheads: list, edit_count: int, seed: int) -> list[tuple[int, BoundingBox]]:
+    rnd = random.Random(seed)
+    moves = []
+    for _ in range(edit_count):
+        index = rnd.randrange(len(noteheads))
+        bbox = noteheads[index].annot.bbox
+        dx, dy = rnd.randint(-8, 8), rnd.randint(-8, 8)
+        moves.append((index, BoundingBox(bbox.left + dx, bbox.top + dy,
+                                         bbox.left + dx + NOTEHEAD_SIZE, bbox.top + dy + NOTEHEAD_SIZE)))
+    return moves
+
+
+def run_session_benchmark(system_counts: list[int], edit_count: int = 50, seed: int = 0):
+    """
+    Compares moving single noteheads in a ``PageSession`` with reconstructing
+    and linearizing the whole page after every move.
+    """
+    table = PrettyTable(["systems", "noteheads", "full [ms/edit]", "session [ms/edit]", "speedup"])
+    table.set_style(MARKDOWN)
+    table.align = "r"
+
+    for system_count in system_counts:
+        shape = PageShape(system_count, staffs_per_system=2, chord_density=0.3, jitter=2)
+
+        _, _, noteheads = generate_score_page(shape, seed=seed)
+        moves = _random_moves(noteheads, edit_count, seed)
+
+        full = 0.0
+        for index, bbox in moves:
+            noteheads[index].set_bbox(bbox)
+            # the full pipeline modifies its input, every run gets freshly generated nodes
+            measures, grand_staffs, fresh = generate_score_page(shape, seed=seed)
+            for node, moved in zip(fresh, noteheads):
+                node.set_bbox(moved.annot.bbox)
+
+            start = timer()
+            linearize_note_events_to_lmx(reconstruct_note_events(measures, grand_staffs, fresh))
+            full += timer() - start
+        full /= edit_count
+
+        measures, grand_staffs, noteheads = generate_score_page(shape, seed=seed)
+        session = PageSession(measures, grand_staffs, noteheads)
+        start = timer()
+        for index, bbox in moves:
+            session.move_symbol(noteheads[index], bbox)
+            _ = session.lmx
+        incremental = (timer() - start) / edit_count
+
+        table.add_row([
+            system_count,
+            shape.notehead_count,
+            f"{full * 1000:.3f}",
+            f"{incremental * 1000:.3f}",
+            f"{full / incremental:.1f}x"
+        ])
+
+    print(table)
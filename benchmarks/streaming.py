@@ -0,0 +1,98 @@
+import queue
+import threading
+import time
+from timeit import default_timer as timer
+
+import numpy as np
+from prettytable import PrettyTable, MARKDOWN
+
+from tonic.Linearization.GraphToLMX import linearize_note_events_to_lmx
+from tonic.Reconstruction import StreamingReconstruction, reconstruct_note_events, split_page_into_tiles
+from tonic.Reconstruction.Graph.BoxArrays import LEFT, RIGHT, boxes_from_nodes, vertical_centers
+from .synthetic import PageShape, generate_score_page
+
+TILE_SIZE = 640
+
+
+def _split_noteheads(noteheads: list, tiles: np.ndarray) -> list[list]:
+    # every notehead is detected by the first tile containing its center
+    boxes = boxes_from_nodes(noteheads)
+    x = (boxes[:, LEFT] + boxes[:, RIGHT]) / 2
+    y = vertical_centers(boxes)
+    inside = ((tiles[:, 0] <= x[:, np.newaxis]) & (tiles[:, 2] >= x[:, np.newaxis])
+              & (tiles[:, 1] <= y[:, np.newaxis]) & (tiles[:, 3] >= y[:, np.newaxis]))
+    owner = inside.argmax(axis=1)
+    return [[noteheads[i] for i in np.flatnonzero(owner == t).tolist()] for t in range(len(tiles))]
+
+
+def _detect(tile_noteheads: list[list], tile_latency: float, output: queue.Queue):
+    # inference of a tile is simulated by sleeping, like GPU inference it does not hold the GIL
+    for tile, noteheads in enumerate(tile_noteheads):
+        time.sleep(tile_latency)
+        output.put((tile, noteheads))
+    output.put(None)
+
+
+def _page(shape: PageShape, seed: int):
+    measures, grand_staffs, noteheads = generate_score_page(shape, seed=seed)
+    boxes = boxes_from_nodes(measures + noteheads)
+    tiles = split_page_into_tiles(int(boxes[:, 2].max()), int(boxes[:, 3].max()), TILE_SIZE, TILE_SIZE,
+                                  overlap_ratio=0.1)
+    return measures, grand_staffs, noteheads, tiles, _split_noteheads(noteheads, tiles)
+
+
+def run_streaming_benchmark(system_counts: list[int], tile_latency: float = 0.02, seed: int = 0):
+    """
+    Compares reconstructing a page after all of its tiles were detected with streaming reconstruction
+    that consumes tiles while the remaining ones are still being detected.
+    Latency is measured from the start of detection of the page.
+    """
+    table = PrettyTable(["systems", "noteheads", "tiles", "detection [s]", "stitched [s]",
+                         "stream first group [s]", "stream done [s]", "groups final early"])
+    table.set_style(MARKDOWN)
+    table.align = "r"
+
+    for system_count in system_counts:
+        shape = PageShape(system_count, staffs_per_system=2, chord_density=0.3, jitter=2)
+
+        # detect all tiles, then reconstruct
+        measures, grand_staffs, noteheads, tiles, tile_noteheads = _page(shape, seed)
+        detected: queue.Queue = queue.Queue()
+        start = timer()
+        _detect(tile_noteheads, tile_latency, detected)
+        stitched = [symbol for tile in iter(detected.get, None) for symbol in tile[1]]
+        detection = timer() - start
+        linearize_note_events_to_lmx(reconstruct_note_events(measures, grand_staffs, stitched))
+        stitched_latency = timer() - start
+
+        # reconstruct while tiles are being detected
+        measures, grand_staffs, noteheads, tiles, tile_noteheads = _page(shape, seed)
+        detected = queue.Queue()
+        start = timer()
+        detector = threading.Thread(target=_detect, args=(tile_noteheads, tile_latency, detected))
+        detector.start()
+        stream = StreamingReconstruction(measures, grand_staffs, tiles)
+        first_group = timer() - start if len(stream.initial_groups) > 0 else None
+        early = len(stream.initial_groups)
+        for tile, symbols in iter(detected.get, None):
+            final = stream.add_tile(tile, symbols)
+            if len(final) > 0 and first_group is None:
+                first_group = timer() - start
+            if tile < len(tiles) - 1:
+                early += len(final)
+        _ = stream.lmx
+        stream_latency = timer() - start
+        detector.join()
+
+        table.add_row([
+            system_count,
+            shape.notehead_count,
+            len(tiles),
+            f"{detection:.3f}",
+            f"{stitched_latency:.3f}",
+            f"{first_group:.3f}",
+            f"{stream_latency:.3f}",
+            f"{early}/{stream.group_count}"
+        ])
+
+    print(table)
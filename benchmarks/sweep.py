@@ -0,0 +1,59 @@
+import itertools
+from timeit import default_timer as timer
+
+from prettytable import PrettyTable, MARKDOWN
+
+from tonic.Linearization.GraphToLMX import linearize_page_graph_to_lmx
+from tonic.Reconstruction import ParameterSweep, reconstruct_page_graph
+from tonic.Reconstruction.Graph import PageGraph
+from tonic.Reconstruction.Graph.BoxArrays import boxes_from_nodes
+from .synthetic import PageShape, generate_score_page
+
+UAL_FACTORS = [1.0, 1.25, 1.5, 1.75, 2.0]
+MRIOU_THRESHOLDS = [0.3, 0.4, 0.5, 0.6, 0.7]
+NEIOU_THRESHOLDS = [0.2, 0.3, 0.4, 0.5]
+
+
+def run_sweep_benchmark(system_counts: list[int], seed: int = 0):
+    """
+    Compares reconstructing and linearizing a page once for every point of a 100 point threshold grid
+    with a single ``ParameterSweep`` over the same grid. SER is not computed, it costs the same in both cases
+    for every distinct result.
+    """
+    table = PrettyTable(["systems", "noteheads", "points", "distinct results", "full [s]", "sweep [s]", "speedup"])
+    table.set_style(MARKDOWN)
+    table.align = "r"
+
+    grid = list(itertools.product(UAL_FACTORS, MRIOU_THRESHOLDS, NEIOU_THRESHOLDS))
+    for system_count in system_counts:
+        shape = PageShape(system_count, staffs_per_system=2, chord_density=0.3, jitter=4)
+        measures, grand_staffs, noteheads = generate_score_page(shape, seed=seed)
+        measures, grand_staffs, noteheads = (boxes_from_nodes(measures), boxes_from_nodes(grand_staffs),
+                                             PageGraph.from_nodes(noteheads))
+
+        start = timer()
+        for ual_factor, mriou_threshold, neiou_threshold in grid:
+            linearize_page_graph_to_lmx(reconstruct_page_graph(
+                measures, grand_staffs, noteheads,
+                ual_factor=ual_factor,
+                mriou_threshold=mriou_threshold,
+                neiou_threshold=neiou_threshold
+            ))
+        full = timer() - start
+
+        start = timer()
+        points = ParameterSweep(measures, grand_staffs, noteheads).run(UAL_FACTORS, MRIOU_THRESHOLDS,
+                                                                       NEIOU_THRESHOLDS)
+        sweep = timer() - start
+
+        table.add_row([
+            system_count,
+            shape.notehead_count,
+            len(points),
+            len({tuple(point.lmx.tokens) for point in points}),
+            f"{full:.3f}",
+            f"{sweep:.3f}",
+            f"{full / sweep:.1f}x"
+        ])
+
+    print(table)
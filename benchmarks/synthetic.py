@@ -0,0 +1,153 @@
+import math
+import random
+
+from odtools.Conversions.Annotations.Annotation import Annotation
+from odtools.Conversions.BoundingBox import BoundingBox
+from tonic.Reconstruction.Graph import Node, NodeName, NOTEHEAD_TYPE_TAG, NoteheadType
+
+MEASURE_WIDTH = 300
+MEASURE_HEIGHT = 80
+STAFF_SPACING = 160
+NOTEHEAD_SIZE = 16
+# vertical distance of two noteheads of a chord, a third apart
+CHORD_STEP = MEASURE_HEIGHT // 4
+
+# maximum number of noteheads stacked into a single chord
+_MAX_CHORD_SIZE = 6
+
+
+class PageShape:
+    """
+    Layout of a generated page.
+
+    Every system contains ``staffs_per_system`` staffs with vertically aligned measures,
+    systems of two or more staffs are covered by a grand staff.
+    Each measure contains exactly ``notes_per_measure`` noteheads, ``chord_density`` is the probability
+    that a notehead is stacked onto the previous one forming a chord instead of starting a new event.
+    Boxes of measures and noteheads are shifted randomly by up to ``jitter`` pixels.
+    """
+
+    def __init__(
+            self,
+            systems_per_page: int = 10,
+            staffs_per_system: int = 1,
+            measures_per_staff: int = 8,
+            notes_per_measure: int = 8,
+            chord_density: float = 0.0,
+            jitter: int = 0
+    ):
+        if not 0 <= chord_density < 1:
+            raise ValueError(f"Chord density has to be in [0, 1), got {chord_density}")
+        self.systems_per_page = systems_per_page
+        self.staffs_per_system = staffs_per_system
+        self.measures_per_staff = measures_per_staff
+        self.notes_per_measure = notes_per_measure
+        self.chord_density = chord_density
+        self.jitter = jitter
+
+    @classmethod
+    def for_notehead_count(
+            cls,
+            notehead_count: int,
+            staffs_per_system: int = 2,
+            measures_per_staff: int = 8,
+            notes_per_measure: int = 8,
+            chord_density: float = 0.3,
+            jitter: int = 2
+    ) -> "PageShape":
+        """
+        Returns shape of a page with approximately the given number of noteheads,
+        small pages get fewer noteheads per measure, large pages get more systems.
+        """
+        measures_per_system = staffs_per_system * measures_per_staff
+        notes_per_measure = max(1, min(notes_per_measure, math.ceil(notehead_count / measures_per_system)))
+        systems = max(1, round(notehead_count / (measures_per_system * notes_per_measure)))
+        return cls(systems, staffs_per_system, measures_per_staff, notes_per_measure, chord_density, jitter)
+
+    @property
+    def measure_count(self) -> int:
+        return self.systems_per_page * self.staffs_per_system * self.measures_per_staff
+
+    @property
+    def notehead_count(self) -> int:
+        return self.measure_count * self.notes_per_measure
+
+
+def _node(left: int, top: int, right: int, bottom: int, name: NodeName, class_id: int = 0) -> Node:
+    return Node(Annotation.from_bbox(class_id, BoundingBox(left, top, right, bottom)), name=name)
+
+
+def _notehead(x: int, y: int) -> Node:
+    note = _node(x, y, x + NOTEHEAD_SIZE, y + NOTEHEAD_SIZE, NodeName.NOTEHEAD)
+    note.set_tag(NOTEHEAD_TYPE_TAG, NoteheadType.FULL)
+    return note
+
+
+def generate_score_page(shape: PageShape, seed: int = 0) -> tuple[list[Node], list[Node], list[Node]]:
+    """
+    Generates a page of the given shape, the same shape and seed always give the same page.
+
+    returns: measures, grand staffs, noteheads (in random order)
+    """
+    rnd = random.Random(seed)
+
+    def _jitter() -> int:
+        return rnd.randint(-shape.jitter, shape.jitter) if shape.jitter > 0 else 0
+
+    measures: list[Node] = []
+    grand_staffs: list[Node] = []
+    noteheads: list[Node] = []
+
+    # all staffs of the page are evenly spaced
+    system_height = (shape.staffs_per_system - 1) * STAFF_SPACING + MEASURE_HEIGHT
+    for system in range(shape.systems_per_page):
+        system_top = 100 + system * shape.staffs_per_system * STAFF_SPACING
+        if shape.staffs_per_system >= 2:
+            grand_staffs.append(_node(
+                50, system_top,
+                50 + shape.measures_per_staff * MEASURE_WIDTH, system_top + system_height,
+                NodeName.GRAND_STAFF
+            ))
+
+        for staff in range(shape.staffs_per_system):
+            top = system_top + staff * STAFF_SPACING
+            for index in range(shape.measures_per_staff):
+                left = 50 + index * MEASURE_WIDTH
+                measures.append(_node(
+                    left + _jitter(), top + _jitter(), left + MEASURE_WIDTH + _jitter(),
+                    top + MEASURE_HEIGHT + _jitter(), NodeName.MEASURE
+                ))
+
+                chord_size = 0
+                x, y = 0, 0
+                for _ in range(shape.notes_per_measure):
+                    if (0 < chord_size < _MAX_CHORD_SIZE and y - CHORD_STEP >= top - NOTEHEAD_SIZE
+                            and shape.chord_density > 0 and rnd.random() < shape.chord_density):
+                        # stack onto the previous notehead, chords stay inside the measure
+                        x, y = x + _jitter(), y - CHORD_STEP
+                        chord_size += 1
+                    else:
+                        x = rnd.randint(left, left + MEASURE_WIDTH - NOTEHEAD_SIZE)
+                        y = rnd.randint(top - NOTEHEAD_SIZE, top + MEASURE_HEIGHT)
+                        chord_size = 1
+                    noteheads.append(_notehead(x, y))
+
+    rnd.shuffle(noteheads)
+    return measures, grand_staffs, noteheads
+
+
+def generate_page(
+        staff_count: int = 10,
+        measures_per_staff: int = 8,
+        notes_per_measure: int = 8,
+        seed: int = 0
+) -> tuple[list[Node], list[Node], list[Node]]:
+    """
+    Generates a page of single staffs with evenly spaced measures
+    and noteheads placed randomly inside them.
+
+    returns: measures, grand staffs, noteheads
+    """
+    shape = PageShape(staff_count, 1, measures_per_staff, notes_per_measure)
+    measures, _, noteheads = generate_score_page(shape, seed=seed)
+    return measures, [], noteheads
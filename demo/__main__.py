@@ -12,7 +12,8 @@ from odtools.Inference import InferenceJob, SplitSettings, run_multiple_predicti
 from odtools.Inference.ModelWrappers import YOLODetectionModelWrapper
 from tonic import NOTEHEAD_TYPE_TAG, NoteheadType, NodeName, Node
 from tonic import (linearize_note_events_to_lmx, preprocess_annots_for_reconstruction, reconstruct_note_events,
-                   refactor_measures_on_page)
+                   refactor_measures_on_page, PipelineStats, ShiftCache, PageOverlay, PageRenderer,
+                   render_pages_batch)
 from tonic.Reconstruction.VizUtils import visualize_input_data, visualize_result
 
 VIZ_LEVEL_OUTPUT = 1
@@ -32,6 +33,17 @@ parser.add_argument("--visualize", type=int, default=0, help="Visualize inferenc
 parser.add_argument("--update", action="store_true", help="Update models and demo images")
 parser.add_argument("--notehead_detector", type=Path, help="Path to notehead detector")
 parser.add_argument("--layout_detector", type=Path, help="Path to layout detector")
+parser.add_argument("--stats", type=Path, help="Save per-stage statistics of the reconstruction as JSON")
+parser.add_argument("--stats_memory", action="store_true", help="Trace peak allocations of each stage")
+parser.add_argument("--refine_workers", type=int, default=0,
+                    help="Number of threads refining measures concurrently, 0 refines them sequentially")
+parser.add_argument("--refine_adaptive", action="store_true",
+                    help="Find staff lines only in measures not aligned with their staff row (experimental)")
+parser.add_argument("--shift_cache", type=Path,
+                    help="Directory caching staff line shifts of measures across runs on the same images")
+parser.add_argument("--render_dir", type=Path, help="Write overlays of reconstructed pages into this directory")
+parser.add_argument("--render_workers", type=int, default=0,
+                    help="Number of processes writing overlays, 0 writes them in this process")
 
 args = parser.parse_args()
 
@@ -53,6 +65,10 @@ if args.output_dir:
     args.output_dir = Path(args.output_dir)
     args.output_dir.mkdir(exist_ok=True, parents=True)
 
+stats = PipelineStats(track_memory=args.stats_memory) if args.stats else None
+shift_cache = ShiftCache(directory=args.shift_cache) if args.shift_cache else None
+render_jobs = []
+
 # LOAD IMAGES
 if args.image_path:
     args.image_path = Path(args.image_path)
@@ -151,7 +167,11 @@ for image_path in tqdm(images_to_process, disable=args.verbose, desc="Running in
         measures,
         image_path,
         verbose=args.verbose,
-        visualize=(args.visualize >= VIZ_LEVEL_STAFF_DETECTION)
+        visualize=(args.visualize >= VIZ_LEVEL_STAFF_DETECTION),
+        stats=stats,
+        workers=args.refine_workers,
+        adaptive=args.refine_adaptive,
+        shift_cache=shift_cache
     )
     time_spent_measure_refactoring += timer() - start
 
@@ -177,7 +197,8 @@ for image_path in tqdm(images_to_process, disable=args.verbose, desc="Running in
         ual_factor=1.8,
         neiou_threshold=0.4,
         verbose=args.verbose,
-        visualize=(args.visualize >= VIZ_LEVEL_ASSEMBLY)
+        visualize=(args.visualize >= VIZ_LEVEL_ASSEMBLY),
+        stats=stats
     )
     time_spent_reconstruction += timer() - start
 
@@ -186,6 +207,13 @@ for image_path in tqdm(images_to_process, disable=args.verbose, desc="Running in
             predicted_lmx = linearize_note_events_to_lmx(events)
             f.write(predicted_lmx.to_musicxml())
 
+    if args.render_dir:
+        render_jobs.append((
+            Path(image_path),
+            PageOverlay.from_note_events(events, measures, grand_staffs),
+            args.render_dir / (Path(image_path).stem + ".jpg")
+        ))
+
     if args.visualize >= VIZ_LEVEL_OUTPUT:
         visualize_result(
             Path(image_path),
@@ -199,3 +227,12 @@ if len(images_to_process) > 0:
     print(f"Average time spent inference: {time_spent_inference / len(images_to_process)}")
     print(f"Average time spent measure refactoring: {time_spent_measure_refactoring / len(images_to_process)}")
     print(f"Average time spent reconstruction: {time_spent_reconstruction / len(images_to_process)}")
+
+if len(render_jobs) > 0:
+    for result in render_pages_batch(render_jobs, PageRenderer(), workers=args.render_workers):
+        if not result.ok:
+            print(f"Warning: Overlay of {render_jobs[result.index][0]} was not written")
+            print(result.error)
+
+if stats is not None:
+    stats.save_json(args.stats)
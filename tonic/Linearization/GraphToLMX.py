@@ -1,5 +1,7 @@
 from decimal import Decimal, ROUND_HALF_UP
 
+import numpy as np
+
 from .Tokens import (G_CLEF_ZERO_PITCH_INDEX, F_CLEF_ZERO_PITCH_INDEX, PITCH_TOKENS, NOTE_QUARTER_TOKEN, CHORD_TOKEN,
                      GS_CLEF_LARGE_LT, BASE_TIME_BEAT_LT, STAFF_TOKEN, DEFAULT_STEM_TOKEN,
                      MEASURE_TOKEN,
@@ -7,30 +9,31 @@ from .Tokens import (G_CLEF_ZERO_PITCH_INDEX, F_CLEF_ZERO_PITCH_INDEX, PITCH_TOK
 from ..Linearization.LMXWrapper import LMXWrapper
 from ..Reconstruction.Graph.Names import NodeName
 from ..Reconstruction.Graph.Node import Node, VirtualNode
-from ..Reconstruction.Graph.Tags import (NOTEHEAD_TYPE_TAG, ACCIDENTAL_TYPE_TAG, SYMBOL_GS_INDEX_TAG, SYMBOL_PITCH_TAG)
+from ..Reconstruction.Graph.PageGraph import PageGraph, UNSET_GS_INDEX
+from ..Reconstruction.Graph.Tags import SYMBOL_GS_INDEX_TAG
 
 
 def _symbol_pitch_to_str(note: Node) -> int:
     # skip python default rounding (0.5 should be rounded to 1)
-    return int(Decimal(note.get_tag(SYMBOL_PITCH_TAG)).to_integral(ROUND_HALF_UP))
+    return int(Decimal(note.pitch).to_integral(ROUND_HALF_UP))
 
 
 def _notehead_to_string(note: Node) -> str:
-    gs_index = note.get_tag(SYMBOL_GS_INDEX_TAG)
+    gs_index = note.gs_index
     pitch = _symbol_pitch_to_str(note)
     if gs_index is not None:
-        return f"{gs_index}{note.get_tag(NOTEHEAD_TYPE_TAG)}{pitch}"
+        return f"{gs_index}{note.notehead_type}{pitch}"
     else:
-        return f"{note.get_tag(NOTEHEAD_TYPE_TAG)}{pitch}"
+        return f"{note.notehead_type}{pitch}"
 
 
 def _accident_to_string(note: Node) -> str:
-    gs_index = note.get_tag(SYMBOL_GS_INDEX_TAG)
+    gs_index = note.gs_index
     pitch = _symbol_pitch_to_str(note)
     if gs_index is not None:
-        return f"{gs_index}{note.get_tag(ACCIDENTAL_TYPE_TAG)}{pitch}"
+        return f"{gs_index}{note.accidental_type}{pitch}"
     else:
-        return f"{note.get_tag(ACCIDENTAL_TYPE_TAG)}{pitch}"
+        return f"{note.accidental_type}{pitch}"
 
 
 def symbol_to_str(note: Node) -> str:
@@ -44,8 +47,8 @@ def symbol_to_str(note: Node) -> str:
 
 
 def get_note_pitch(note: Node) -> str:
-    gs_index = note.get_tag(SYMBOL_GS_INDEX_TAG)
-    pitch = round(note.get_tag(SYMBOL_PITCH_TAG))
+    gs_index = note.gs_index
+    pitch = round(note.pitch)
 
     if gs_index is None or gs_index == 1:
         pitch_index = G_CLEF_ZERO_PITCH_INDEX + pitch
@@ -58,7 +61,7 @@ def get_note_pitch(note: Node) -> str:
 
 
 def _note_to_lmx(note: Node) -> list[str]:
-    gs_tag = note.get_tag(SYMBOL_GS_INDEX_TAG)
+    gs_tag = note.gs_index
     pitch_token = get_note_pitch(note)
 
     return [
@@ -85,6 +88,28 @@ def _linearize_note_event_to_lmx(event: VirtualNode) -> list[str]:
     return sequence
 
 
+def linearize_measure_group_to_lmx(measure_group: VirtualNode, first: bool = False) -> list[str]:
+    """
+    Linearizes a single measure group, tokens of a page are the concatenation of its measure groups.
+
+    :param measure_group: measure group containing note events
+    :param first: the group is the first one on the page, key, time and clefs are written after its measure token
+    :return: LMX tokens of the measure group
+    """
+    sequence: list[str] = [MEASURE_TOKEN]
+    if first:
+        sequence.append(DEFAULT_KEY_TOKEN)
+        sequence.extend(BASE_TIME_BEAT_LT.split())
+        sequence.extend(GS_CLEF_LARGE_LT.split())
+
+    for child in measure_group.children():
+        child: VirtualNode
+        if child.name == NodeName.NOTE_EVENT:
+            sequence.extend(_linearize_note_event_to_lmx(child))
+
+    return sequence
+
+
 def linearize_note_events_to_lmx(measure_groups: list[list[VirtualNode]]) -> LMXWrapper:
     note_written = False
     sequence: list[str] = []
@@ -92,6 +117,45 @@ def linearize_note_events_to_lmx(measure_groups: list[list[VirtualNode]]) -> LMX
     for row in measure_groups:
 
         for measure in row:
+            sequence.extend(linearize_measure_group_to_lmx(measure, first=first))
+            first = False
+            note_written = note_written or any(child.name == NodeName.NOTE_EVENT for child in measure.children())
+
+    if note_written:
+        return LMXWrapper(sequence)
+    else:
+        print("Warning: No note events were written.")
+        return LMXWrapper([])
+
+
+def _page_graph_pitch_tokens(graph: PageGraph, symbols: np.ndarray) -> list[str]:
+    gs_index = graph.gs_index[symbols]
+    invalid = gs_index[(gs_index != UNSET_GS_INDEX) & (gs_index != 1) & (gs_index != 2)]
+    if len(invalid) > 0:
+        raise ValueError(f"Unknown value of {SYMBOL_GS_INDEX_TAG}: {invalid[0]}")
+
+    # same rounding as python's round used by get_note_pitch
+    pitch = np.rint(graph.pitch[symbols]).astype(np.int64)
+    pitch_index = np.where(gs_index == 2, F_CLEF_ZERO_PITCH_INDEX, G_CLEF_ZERO_PITCH_INDEX) + pitch
+    return [PITCH_TOKENS[i] for i in pitch_index]
+
+
+def linearize_page_graph_to_lmx(graph: PageGraph) -> LMXWrapper:
+    """
+    Array version of ``linearize_note_events_to_lmx``, produces the same sequence from a ``PageGraph``.
+
+    :param graph: reconstructed page graph
+    :return: LMX of the page
+    """
+    pitch_tokens = _page_graph_pitch_tokens(graph, graph.event_symbols)
+    staff_tokens = [f"{STAFF_TOKEN}:{gs if gs != UNSET_GS_INDEX else 1}" for gs in graph.gs_index[graph.event_symbols]]
+
+    note_written = False
+    sequence: list[str] = []
+    first = True
+    for row in range(graph.row_count):
+
+        for group in graph.row_groups(row):
 
             sequence.append(MEASURE_TOKEN)
             if first:
@@ -100,11 +164,18 @@ def linearize_note_events_to_lmx(measure_groups: list[list[VirtualNode]]) -> LMX
                 sequence.extend(GS_CLEF_LARGE_LT.split())
                 first = False
 
-            for child in measure.children():
-                child: VirtualNode
-                if child.name == NodeName.NOTE_EVENT:
-                    sequence.extend(_linearize_note_event_to_lmx(child))
-                    note_written = True
+            items, is_event = graph.group_children(group)
+            for event in items[is_event]:
+                for position in range(graph.event_offsets[event], graph.event_offsets[event + 1]):
+                    if position != graph.event_offsets[event]:
+                        sequence.append(CHORD_TOKEN)
+                    sequence.extend((
+                        pitch_tokens[position],
+                        NOTE_QUARTER_TOKEN,
+                        DEFAULT_STEM_TOKEN,
+                        staff_tokens[position]
+                    ))
+                note_written = True
 
     if note_written:
         return LMXWrapper(sequence)
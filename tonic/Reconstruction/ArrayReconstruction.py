@@ -0,0 +1,532 @@
+from concurrent.futures import Executor
+
+import numpy as np
+
+from odtools.Conversions.BoundingBox import Direction
+from .Graph.BoxArrays import LEFT, TOP, BOTTOM, as_box_array, heights, vertical_centers
+from .Graph.Linkage import link_rows
+from .Graph.Names import NodeName, NODE_NAME_TO_CODE
+from .Graph.PageGraph import PageGraph, offsets_from_lengths, UNSET_GS_INDEX
+from .Graph.SpatialIndex import HorizontalIntervalIndex, VerticalIntervalIndex
+from .Graph.Strips import SortedSegments, sort_segments_to_strips_in_chunks
+from .MeasureManipulation import SectionType
+from .Stats import (PipelineStats, count, measure_stage, STAGE_ASSIGNMENT, STAGE_PITCH, STAGE_SECTION_SORT,
+                    STAGE_LINKING, STAGE_EVENT_GROUPING, COUNT_PAGES, COUNT_MEASURES, COUNT_SYMBOLS,
+                    COUNT_DROPPED_SYMBOLS, COUNT_ROWS, COUNT_MEASURE_GROUPS, COUNT_EVENTS)
+
+
+def assign_symbols_to_measures(
+        measures: np.ndarray,
+        symbols: np.ndarray,
+        upper_limit: float = None
+) -> np.ndarray:
+    """
+    Array version of ``assign_to_closest``.
+    Each symbol is assigned to the vertically closest measure that horizontally contains it.
+
+    :param measures: Mx4 array of measure boxes
+    :param symbols: Nx4 array of symbol boxes
+    :param upper_limit: maximum distance to assign symbol to measure
+    :return: index of assigned measure for each symbol, -1 if no suitable measure was found
+    """
+    return HorizontalIntervalIndex(measures).assign_closest(symbols, upper_limit=upper_limit)
+
+
+def compute_symbol_pitches(measures: np.ndarray, symbols: np.ndarray, assignment: np.ndarray) -> np.ndarray:
+    """
+    Computes each symbol's distance from the bottom staff line of its measure
+    in multiples of half of the staff line spacing, unassigned symbols get ``nan``.
+    """
+    pitch = np.full(len(symbols), np.nan)
+    assigned = assignment >= 0
+    target = measures[assignment[assigned]]
+    half_line_height = heights(target) / 8
+    pitch[assigned] = (target[:, BOTTOM] - vertical_centers(symbols[assigned])) / half_line_height
+    return pitch
+
+
+def compute_symbol_pitches_and_gs_index(
+        measures: np.ndarray,
+        symbols: np.ndarray,
+        assignment: np.ndarray,
+        measure_gs_index: np.ndarray = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Computes pitch and grand staff index of all assigned symbols in a single pass.
+    Pitch is kept as float, linearization rounds it the way each output format expects.
+    Works the same for a single page and a batch of pages concatenated together,
+    assignment of a batch has to index the concatenated measures.
+
+    :param measures: Mx4 array of measure boxes
+    :param symbols: Nx4 array of symbol boxes
+    :param assignment: index of assigned measure for each symbol, -1 for unassigned symbols
+    :param measure_gs_index: grand staff index of each measure, ``UNSET_GS_INDEX`` outside grand staffs
+    :return: pitch (``nan`` for unassigned symbols) and grand staff index (``UNSET_GS_INDEX``
+        for unassigned symbols) of each symbol
+    """
+    measures = as_box_array(measures)
+    symbols = as_box_array(symbols)
+    assignment = np.asarray(assignment, dtype=np.int64)
+    assigned = assignment >= 0
+
+    pitch = compute_symbol_pitches(measures, symbols, assignment)
+
+    gs_index = np.full(len(symbols), UNSET_GS_INDEX, dtype=np.int8)
+    if measure_gs_index is not None:
+        gs_index[assigned] = np.asarray(measure_gs_index)[assignment[assigned]]
+
+    return pitch, gs_index
+
+
+def sort_measures_into_sections(
+        measures: np.ndarray,
+        grand_staffs: np.ndarray
+) -> list[tuple[SectionType, np.ndarray]]:
+    """
+    Array version of ``sort_page_into_sections``, returns indices of measures in each section.
+
+    Membership of measures in grand staffs is looked up at once in an interval index over vertical extents,
+    the walk over measures then only checks membership of integer pairs.
+    """
+    grand_staffs = grand_staffs[np.argsort(grand_staffs[:, TOP], kind="stable")]
+    order = np.argsort(measures[:, TOP], kind="stable").tolist()
+    sections: list[tuple[SectionType, np.ndarray]] = []
+
+    measure_index, gs_hit = VerticalIntervalIndex(grand_staffs).intersecting_pairs(measures)
+    gs_count = len(grand_staffs)
+    memberships = set((measure_index * gs_count + gs_hit).tolist())
+
+    section: list[int] = []
+    gs_index = 0
+    in_gs = False
+
+    for measure in order:
+        if gs_index >= len(grand_staffs):
+            section.append(measure)
+            in_gs = False
+            continue
+
+        inside = measure * gs_count + gs_index in memberships
+
+        if inside and not in_gs:
+            if len(section) > 0:
+                sections.append((SectionType.OUT_GS, np.asarray(section, dtype=np.int64)))
+            section = [measure]
+            in_gs = True
+        elif inside == in_gs:
+            section.append(measure)
+        else:
+            sections.append((SectionType.IN_GS, np.asarray(section, dtype=np.int64)))
+            section = [measure]
+            in_gs = gs_index + 1 < gs_count and measure * gs_count + gs_index + 1 in memberships
+            gs_index += 1
+
+    sections.append((SectionType.IN_GS if in_gs else SectionType.OUT_GS, np.asarray(section, dtype=np.int64)))
+    return sections
+
+
+class MeasureReadingOrder:
+    """
+    Reading order of measures of a page: sections in/out of grand staffs, rows of each section
+    and measures of each row from left to right, all stored as integer arrays.
+
+        - ``measures`` are indices of measures in reading order (section after section, row after row)
+        - row ``r`` are measures ``measures[row_offsets[r]:row_offsets[r + 1]]``
+        - section ``s`` of type ``section_types[s]`` contains rows ``section_row_offsets[s]:section_row_offsets[s + 1]``
+    """
+
+    def __init__(
+            self,
+            measures: np.ndarray,
+            row_offsets: np.ndarray,
+            section_types: list[SectionType],
+            section_row_offsets: np.ndarray
+    ):
+        self.measures = measures
+        self.row_offsets = row_offsets
+        self.section_types = section_types
+        self.section_row_offsets = section_row_offsets
+
+    @property
+    def row_count(self) -> int:
+        return len(self.row_offsets) - 1
+
+    @property
+    def section_count(self) -> int:
+        return len(self.section_types)
+
+    def row(self, row: int) -> np.ndarray:
+        return self.measures[self.row_offsets[row]:self.row_offsets[row + 1]]
+
+    def section_rows(self, section: int) -> list[np.ndarray]:
+        return [self.row(r) for r in range(self.section_row_offsets[section], self.section_row_offsets[section + 1])]
+
+
+class MeasureSections:
+    """
+    Measures of a page sorted into sections and along the rows of sections,
+    the part of the reading order that does not depend on the measure reading IoU.
+    """
+
+    def __init__(self, measures: np.ndarray, grand_staffs: np.ndarray):
+        """
+        :param measures: Mx4 array of measure boxes
+        :param grand_staffs: Gx4 array of grand staff boxes
+        """
+        measures = as_box_array(measures)
+        sections = sort_measures_into_sections(measures, as_box_array(grand_staffs))
+        self.section_types = [section_type for section_type, _ in sections]
+        self.measures = np.concatenate([section for _, section in sections])
+        self._sorted = SortedSegments(
+            measures[self.measures],
+            offsets_from_lengths([len(section) for _, section in sections]),
+            direction=Direction.HORIZONTAL
+        )
+
+    def row_breaks(self, mriou_threshold: float) -> np.ndarray:
+        """
+        Thresholds giving the same row breaks give the same reading order, see ``SortedSegments.strip_breaks``.
+        """
+        return self._sorted.strip_breaks(mriou_threshold)
+
+    def reading_order(self, row_breaks: np.ndarray) -> MeasureReadingOrder:
+        labels, order, section_row_offsets = self._sorted.to_strips(row_breaks)
+        return MeasureReadingOrder(
+            self.measures[order],
+            offsets_from_lengths(np.bincount(labels, minlength=section_row_offsets[-1])),
+            self.section_types,
+            section_row_offsets
+        )
+
+
+def build_measure_reading_order(
+        measures: np.ndarray,
+        grand_staffs: np.ndarray,
+        mriou_threshold: float = 0.5
+) -> MeasureReadingOrder:
+    """
+    Sorts measures of the page into sections (see ``sort_page_into_sections``)
+    and rows of all sections in a single pass (see ``sort_to_strips_with_threshold``).
+
+    :param measures: Mx4 array of measure boxes
+    :param grand_staffs: Gx4 array of grand staff boxes
+    :param mriou_threshold: measure reading IoU, see ``link_measures_based_on_grand_staffs``
+    :return: reading order of measures
+    """
+    sections = MeasureSections(measures, grand_staffs)
+    return sections.reading_order(sections.row_breaks(mriou_threshold))
+
+
+def link_rows_inside_grand_staff(
+        measures: np.ndarray,
+        top_row: np.ndarray,
+        bottom_row: np.ndarray,
+        linkage_iou_threshold: float = 0.5
+) -> list[np.ndarray]:
+    """
+    Array version of ``link_measures_inside_grand_staff``, returns indices of measures in each link.
+    """
+    return link_rows(measures, [top_row, bottom_row], linkage_iou_threshold=linkage_iou_threshold)
+
+
+class MeasureLinks:
+    """
+    Measures of a page linked into measure groups, the array counterpart of ``link_measures_based_on_grand_staffs``.
+
+        - ``links[g]`` are indices of measures of group ``g``, ordered from the top staff
+        - ``group_gs[g]`` is set when group ``g`` was linked inside a grand staff
+        - row ``r`` contains groups ``row_offsets[r]:row_offsets[r + 1]``
+        - ``measure_gs_index`` is the grand staff index of every measure (1 upper, 2 lower, ``UNSET_GS_INDEX``)
+    """
+
+    def __init__(
+            self,
+            links: list[np.ndarray],
+            group_gs: list[bool],
+            row_offsets: np.ndarray,
+            measure_gs_index: np.ndarray
+    ):
+        self.links = links
+        self.group_gs = group_gs
+        self.row_offsets = row_offsets
+        self.measure_gs_index = measure_gs_index
+
+    @property
+    def group_count(self) -> int:
+        return len(self.links)
+
+    @property
+    def row_count(self) -> int:
+        return len(self.row_offsets) - 1
+
+
+def link_page_measures(
+        measures: np.ndarray,
+        grand_staffs: np.ndarray,
+        mriou_threshold: float = 0.5,
+        link_systems: bool = True,
+        stats: PipelineStats = None
+) -> MeasureLinks:
+    """
+    Sorts measures of the page into reading order and links measures of grand staffs into measure groups,
+    measures outside of grand staffs form groups on their own.
+
+    :param measures: Mx4 array of measure boxes
+    :param grand_staffs: Gx4 array of grand staff boxes
+    :param mriou_threshold: measure reading IoU, see ``link_measures_based_on_grand_staffs``
+    :param link_systems: link measures of grand staff sections with more than two staffs
+    :param stats: optional statistics filled in with times of section sorting and linking
+    :return: linked measures
+    """
+    measures = as_box_array(measures)
+    if len(measures) == 0:
+        return MeasureLinks([], [], np.zeros(2, dtype=np.int64), np.full(0, UNSET_GS_INDEX, dtype=np.int8))
+
+    with measure_stage(stats, STAGE_SECTION_SORT):
+        reading_order = build_measure_reading_order(measures, grand_staffs, mriou_threshold)
+
+    return link_measures_in_reading_order(measures, reading_order, link_systems=link_systems, stats=stats)
+
+
+def link_measures_in_reading_order(
+        measures: np.ndarray,
+        reading_order: MeasureReadingOrder,
+        link_systems: bool = True,
+        stats: PipelineStats = None
+) -> MeasureLinks:
+    """
+    Links measures of grand staffs of an already sorted page, see ``link_page_measures``.
+
+    :param measures: Mx4 array of measure boxes
+    :param reading_order: reading order of the measures
+    :param link_systems: link measures of grand staff sections with more than two staffs
+    :param stats: optional statistics filled in with the time of linking
+    :return: linked measures
+    """
+    measure_gs_index = np.full(len(measures), UNSET_GS_INDEX, dtype=np.int8)
+    rows = [reading_order.row(r) for r in range(reading_order.row_count)]
+    section_row_offsets = reading_order.section_row_offsets
+
+    with measure_stage(stats, STAGE_LINKING):
+        links: list[np.ndarray] = []
+        link_gs: list[bool] = []
+        row_lengths: list[int] = []
+        sections = zip(reading_order.section_types, section_row_offsets[:-1], section_row_offsets[1:])
+        for section_type, start, end in sections:
+            if section_type == SectionType.IN_GS and end - start == 2:
+                measure_gs_index[rows[start]] = 1
+                measure_gs_index[rows[start + 1]] = 2
+                linked_row = link_rows_inside_grand_staff(measures, rows[start], rows[start + 1])
+                links.extend(linked_row)
+                link_gs.extend([True] * len(linked_row))
+                row_lengths.append(len(linked_row))
+            elif link_systems and section_type == SectionType.IN_GS and end - start > 2:
+                linked_row = link_rows(measures, rows[start:end])
+                links.extend(linked_row)
+                link_gs.extend([True] * len(linked_row))
+                row_lengths.append(len(linked_row))
+            else:
+                for row in rows[start:end]:
+                    links.extend(np.array([measure]) for measure in row)
+                    link_gs.extend([False] * len(row))
+                    row_lengths.append(len(row))
+
+    return MeasureLinks(links, link_gs, offsets_from_lengths(row_lengths), measure_gs_index)
+
+
+def _group_symbols_by_measure(assignment: np.ndarray, measure_count: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns CSR-style (offsets, symbols) where symbols of each measure keep their input order.
+    """
+    order = np.argsort(assignment, kind="stable")
+    order = order[assignment[order] >= 0]
+    return offsets_from_lengths(np.bincount(assignment[order], minlength=measure_count)), order
+
+
+def _gather_segments(offsets: np.ndarray, values: np.ndarray, segments: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Concatenates given CSR segments in the given order.
+
+    :return: concatenated values and length of each gathered segment
+    """
+    lengths = offsets[segments + 1] - offsets[segments]
+    starts = np.cumsum(lengths) - lengths
+    positions = np.arange(lengths.sum()) - np.repeat(starts, lengths) + np.repeat(offsets[segments], lengths)
+    return values[positions], lengths
+
+
+class MeasureGroupMembers:
+    """
+    Symbols of every measure group, gathered measure after measure.
+
+        - ``members`` are the symbols, ``group_of_member`` the measure group of each of them
+        - ``noteheads`` are the members that form note events,
+          noteheads of group ``g`` are ``noteheads[notehead_offsets[g]:notehead_offsets[g + 1]]``
+    """
+
+    def __init__(
+            self,
+            names: np.ndarray,
+            links: list[np.ndarray],
+            measure_offsets: np.ndarray,
+            measure_symbols: np.ndarray
+    ):
+        """
+        :param names: name codes of all symbols
+        :param links: indices of measures of each group
+        :param measure_offsets: CSR-style offsets of symbols of each measure
+        :param measure_symbols: symbols of all measures
+        """
+        self.group_count = len(links)
+        link_measures = np.concatenate(links) if len(links) > 0 else np.empty(0, dtype=np.int64)
+        link_of_measure = np.repeat(np.arange(len(links)), [len(link) for link in links])
+        self.members, measure_lengths = _gather_segments(measure_offsets, measure_symbols, link_measures)
+        self.group_of_member = np.repeat(link_of_measure, measure_lengths)
+
+        self.is_notehead = names[self.members] == NODE_NAME_TO_CODE[NodeName.NOTEHEAD]
+        self.noteheads = self.members[self.is_notehead]
+        self.notehead_offsets = offsets_from_lengths(
+            np.bincount(self.group_of_member[self.is_notehead], minlength=self.group_count)
+        )
+
+
+def set_measure_groups(
+        graph: PageGraph,
+        linked: MeasureLinks,
+        members: MeasureGroupMembers,
+        event_strips: tuple[np.ndarray, np.ndarray, np.ndarray]
+):
+    """
+    Fills in the structure of the graph from linked measures and noteheads of each group sorted into note events.
+
+    :param graph: page graph with symbols
+    :param linked: linked measures
+    :param members: symbols of every measure group
+    :param event_strips: vertical strips of ``members.noteheads``, as returned by ``sort_segments_to_strips``
+    """
+    boxes = graph.boxes
+    labels, order, group_event_offsets = event_strips
+    event_symbols = members.noteheads[order]
+    event_offsets = offsets_from_lengths(np.bincount(labels, minlength=group_event_offsets[-1]))
+    event_lefts = (np.minimum.reduceat(boxes[event_symbols, LEFT], event_offsets[:-1])
+                   if len(event_symbols) > 0 else np.empty(0, dtype=boxes.dtype))
+
+    # events go first, then other symbols, both sorted by their left edge
+    others = members.members[~members.is_notehead]
+    items = np.concatenate([np.arange(len(event_lefts)), others])
+    is_event = np.concatenate([np.ones(len(event_lefts), dtype=bool), np.zeros(len(others), dtype=bool)])
+    group_of_item = np.concatenate([
+        np.repeat(np.arange(members.group_count), np.diff(group_event_offsets)),
+        members.group_of_member[~members.is_notehead]
+    ])
+    lefts = np.concatenate([event_lefts, boxes[others, LEFT]])
+    order = np.lexsort((np.arange(len(items)), lefts, group_of_item))
+
+    graph.row_offsets = linked.row_offsets
+    graph.group_offsets = offsets_from_lengths(np.bincount(group_of_item, minlength=members.group_count))
+    graph.group_items = items[order]
+    graph.group_item_is_event = is_event[order]
+    graph.group_gs = np.asarray(linked.group_gs, dtype=bool)
+    graph.event_offsets = event_offsets
+    graph.event_symbols = event_symbols
+
+
+def reconstruct_page_graph(
+        measures: np.ndarray,
+        grand_staffs: np.ndarray,
+        symbols: PageGraph,
+        ual_factor: float = 1.5,
+        mriou_threshold: float = 0.5,
+        neiou_threshold: float = 0.4,
+        verbose: bool = False,
+        link_systems: bool = True,
+        executor: Executor = None,
+        stats: PipelineStats = None
+) -> PageGraph:
+    """
+    Array version of ``reconstruct_note_events``, runs the whole reconstruction
+    without creating any per-symbol objects and returns the result as a ``PageGraph``.
+
+    :param measures: Mx4 array of measure boxes
+    :param grand_staffs: Gx4 array of grand staff boxes
+    :param symbols: page graph with symbols to reconstruct, its symbol columns are shared with the output
+    :param ual_factor: upper assignment limit factor, see ``assign_notes_to_measures_and_compute_pitch``
+    :param mriou_threshold: measure reading IoU, see ``link_measures_based_on_grand_staffs``
+    :param neiou_threshold: note event IoU, see ``compute_note_events``
+    :param verbose: make script verbose
+    :param link_systems: link measures of grand staff sections with more than two staffs,
+        see ``link_measures_based_on_grand_staffs``
+    :param executor: optional executor used to compute note events of chunks of measure groups concurrently,
+        see ``compute_measure_groups``
+    :param stats: optional statistics filled in with times of the stages and counts of the page
+    :return: page graph with computed pitches and structure
+    """
+    measures = as_box_array(measures)
+    grand_staffs = as_box_array(grand_staffs)
+    boxes = symbols.boxes
+
+    graph = PageGraph(
+        boxes, symbols.names,
+        class_ids=symbols.class_ids,
+        confidences=symbols.confidences,
+        pitch=symbols.pitch.copy(),
+        gs_index=symbols.gs_index.copy(),
+        notehead_type=symbols.notehead_type,
+        accidental_type=symbols.accidental_type,
+    )
+
+    count(stats, COUNT_PAGES)
+    count(stats, COUNT_MEASURES, len(measures))
+    count(stats, COUNT_SYMBOLS, len(boxes))
+
+    if len(measures) == 0:
+        graph.row_offsets = np.zeros(2, dtype=np.int64)
+        return graph
+
+    # ASSIGN SYMBOLS TO MEASURES AND COMPUTE PITCH
+    with measure_stage(stats, STAGE_ASSIGNMENT):
+        upper_assignment_limit = np.mean(heights(measures)) * ual_factor
+        assignment = assign_symbols_to_measures(measures, boxes, upper_limit=upper_assignment_limit)
+        dropped = np.count_nonzero(assignment < 0)
+        if dropped > 0:
+            print(f"Warning: No suitable target found for {dropped} source objects")
+
+        measure_offsets, measure_symbols = _group_symbols_by_measure(assignment, len(measures))
+    count(stats, COUNT_DROPPED_SYMBOLS, dropped)
+
+    # LINK MEASURES
+    linked = link_page_measures(measures, grand_staffs, mriou_threshold, link_systems=link_systems, stats=stats)
+    links = linked.links
+    measure_gs_index = linked.measure_gs_index
+
+    # pitch and grand staff index of all symbols at once
+    with measure_stage(stats, STAGE_PITCH):
+        pitch, gs_index = compute_symbol_pitches_and_gs_index(measures, boxes, assignment,
+                                                              measure_gs_index=measure_gs_index)
+        assigned = assignment >= 0
+        graph.pitch[assigned] = pitch[assigned]
+        in_gs = gs_index != UNSET_GS_INDEX
+        graph.gs_index[in_gs] = gs_index[in_gs]
+
+    if verbose:
+        print(f"Linked measures into {linked.row_count} rows")
+
+    # COMPUTE NOTE EVENTS
+    with measure_stage(stats, STAGE_EVENT_GROUPING):
+        members = MeasureGroupMembers(graph.names, links, measure_offsets, measure_symbols)
+
+        # all events of the page are computed at once
+        event_strips = sort_segments_to_strips_in_chunks(
+            boxes[members.noteheads],
+            members.notehead_offsets,
+            neiou_threshold,
+            direction=Direction.VERTICAL,
+            check_intersections=True,
+            executor=executor
+        )
+        set_measure_groups(graph, linked, members, event_strips)
+
+    count(stats, COUNT_ROWS, linked.row_count)
+    count(stats, COUNT_MEASURE_GROUPS, len(links))
+    count(stats, COUNT_EVENTS, len(graph.event_offsets) - 1)
+    return graph
@@ -0,0 +1,173 @@
+import os
+import traceback
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from enum import Enum
+from typing import Any, Callable, Iterable, Iterator
+
+import numpy as np
+
+from .ArrayReconstruction import reconstruct_page_graph
+from .Graph.PageGraph import PageGraph
+
+# compact input of a single page: measure boxes, grand staff boxes and symbols
+PageInput = tuple[np.ndarray, np.ndarray, PageGraph]
+
+
+class BatchOutput(Enum):
+    # list of LMX tokens
+    LMX = 0
+    # reconstructed page graph
+    GRAPH = 1
+
+
+class PageResult:
+    """
+    Result of a single page of a batch, either ``result`` is set or ``error`` contains the formatted traceback.
+    """
+
+    def __init__(self, index: int, result: Any = None, error: str = None):
+        self.index = index
+        self.result = result
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _reconstruct_chunk(
+        chunk: list[tuple[int, PageInput]],
+        output: BatchOutput,
+        parameters: dict[str, Any]
+) -> list[PageResult]:
+    # linearization imports the reconstruction package, importing it at the top would be circular
+    from ..Linearization.GraphToLMX import linearize_page_graph_to_lmx
+
+    results: list[PageResult] = []
+    for index, (measures, grand_staffs, symbols) in chunk:
+        try:
+            graph = reconstruct_page_graph(measures, grand_staffs, symbols, **parameters)
+            if output == BatchOutput.LMX:
+                results.append(PageResult(index, result=linearize_page_graph_to_lmx(graph).tokens))
+            else:
+                results.append(PageResult(index, result=graph))
+        except Exception:
+            results.append(PageResult(index, error=traceback.format_exc()))
+    return results
+
+
+def _chunks(pages: Iterable[Any], chunksize: int) -> Iterator[list[tuple[int, Any]]]:
+    chunk: list[tuple[int, Any]] = []
+    for index, page in enumerate(pages):
+        chunk.append((index, page))
+        if len(chunk) == chunksize:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+
+def _map_chunks(
+        process_chunk: Callable[..., list[PageResult]],
+        chunks: Iterator[list[tuple[int, Any]]],
+        arguments: tuple,
+        workers: int | None,
+        ordered: bool,
+        max_pending_chunks: int | None,
+        executor: Executor | None
+) -> Iterator[PageResult]:
+    """
+    Runs ``process_chunk(chunk, *arguments)`` of every chunk on a process pool with a bounded number
+    of chunks in flight and yields results of their pages.
+    """
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    if max_pending_chunks is None:
+        max_pending_chunks = 4 * (workers or os.cpu_count() or 1)
+
+    try:
+        pending: deque[Future] | set[Future] = deque() if ordered else set()
+
+        def _submit() -> bool:
+            chunk = next(chunks, None)
+            if chunk is None:
+                return False
+            future = executor.submit(process_chunk, chunk, *arguments)
+            if ordered:
+                pending.append(future)
+            else:
+                pending.add(future)
+            return True
+
+        while len(pending) < max_pending_chunks and _submit():
+            pass
+
+        while len(pending) > 0:
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                pending.difference_update(done)
+
+            for future in done:
+                yield from future.result()
+                _submit()
+    finally:
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
+
+
+def _reconstruct_note_events_batch(
+        pages: Iterable[PageInput],
+        workers: int,
+        chunksize: int,
+        output: BatchOutput,
+        ordered: bool,
+        max_pending_chunks: int,
+        executor: Executor,
+        parameters: dict
+) -> Iterator[PageResult]:
+    if workers == 0 and executor is None:
+        for chunk in _chunks(pages, chunksize):
+            yield from _reconstruct_chunk(chunk, output, parameters)
+        return
+
+    yield from _map_chunks(_reconstruct_chunk, _chunks(pages, chunksize), (output, parameters), workers, ordered,
+                           max_pending_chunks, executor)
+
+
+def reconstruct_note_events_batch(
+        pages: Iterable[PageInput],
+        workers: int = None,
+        chunksize: int = 1,
+        output: BatchOutput = BatchOutput.LMX,
+        ordered: bool = True,
+        max_pending_chunks: int = None,
+        executor: Executor = None,
+        **parameters
+) -> Iterator[PageResult]:
+    """
+    Reconstructs many pages on a process pool, each page is reconstructed by ``reconstruct_page_graph``.
+
+    Pages are sent to workers in chunks of ``chunksize`` pages, only a bounded number of chunks is in flight,
+    so pages can be produced lazily by a generator. Exception raised by a page is caught
+    and reported in the page's result, other pages of the chunk are not affected.
+
+    :param pages: iterable of (measure boxes, grand staff boxes, symbols) of each page
+    :param workers: number of worker processes, ``None`` uses all cores, 0 reconstructs pages in this process
+    :param chunksize: number of pages sent to a worker at once
+    :param output: whether to return LMX tokens or page graphs
+    :param ordered: yield results in the input order, otherwise as soon as they are completed
+    :param max_pending_chunks: maximum number of chunks in flight, four per worker (or core) by default
+    :param executor: optional executor to use instead of creating a new process pool
+    :param parameters: keyword parameters of ``reconstruct_page_graph``
+    :return: iterator of results, one for each page
+    """
+    # checked here and not in the generator, so invalid arguments raise at the call and not at the first page
+    if chunksize < 1:
+        raise ValueError(f"Chunk size has to be positive, got {chunksize}")
+
+    return _reconstruct_note_events_batch(pages, workers, chunksize, output, ordered, max_pending_chunks, executor,
+                                          parameters)
@@ -0,0 +1,114 @@
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from odtools.Conversions.BoundingBox import BoundingBox, Direction
+
+if TYPE_CHECKING:
+    from .Node import Node
+
+# columns of a box array
+LEFT = 0
+TOP = 1
+RIGHT = 2
+BOTTOM = 3
+
+BOX_DTYPE = np.int32
+
+
+def boxes_from_nodes(nodes: list["Node"]) -> np.ndarray:
+    """
+    Converts bounding boxes of annotations of given nodes into an Nx4 array of (left, top, right, bottom).
+
+    :param nodes: list of nodes
+    :return: array of boxes, one row per node
+    """
+    bboxes = [node.annot.bbox for node in nodes]
+    return np.array([(bbox.left, bbox.top, bbox.right, bbox.bottom) for bbox in bboxes],
+                    dtype=BOX_DTYPE).reshape(len(nodes), 4)
+
+
+def as_box_array(boxes) -> np.ndarray:
+    """
+    Returns given boxes as an Nx4 integer array, empty input results in an empty (0, 4) array.
+    """
+    boxes = np.asarray(boxes, dtype=BOX_DTYPE)
+    if boxes.size == 0:
+        return np.empty((0, 4), dtype=BOX_DTYPE)
+    if boxes.ndim != 2 or boxes.shape[1] != 4:
+        raise ValueError(f"Expected an array of shape (N, 4), got {boxes.shape}")
+    return boxes
+
+
+def box_to_bbox(box: np.ndarray) -> BoundingBox:
+    return BoundingBox(int(box[LEFT]), int(box[TOP]), int(box[RIGHT]), int(box[BOTTOM]))
+
+
+def axis_columns(direction: Direction) -> tuple[int, int]:
+    """
+    Returns the (start, end) columns of the given direction,
+    HORIZONTAL is (left, right), VERTICAL is (top, bottom).
+    """
+    if direction == Direction.HORIZONTAL:
+        return LEFT, RIGHT
+    elif direction == Direction.VERTICAL:
+        return TOP, BOTTOM
+    else:
+        raise NotImplementedError(f"Not implemented for direction {direction}")
+
+
+def vertical_centers(boxes: np.ndarray) -> np.ndarray:
+    return boxes[:, TOP] + (boxes[:, BOTTOM] - boxes[:, TOP]) / 2
+
+
+def heights(boxes: np.ndarray) -> np.ndarray:
+    return boxes[:, BOTTOM] - boxes[:, TOP]
+
+
+def clip_boxes(boxes: np.ndarray, image_shape: tuple[int, ...]) -> np.ndarray:
+    """
+    Clips boxes to the image the same way as slicing of the image clips crops.
+    """
+    clipped = boxes.astype(np.int64)
+    clipped[:, [LEFT, RIGHT]] = np.clip(clipped[:, [LEFT, RIGHT]], 0, image_shape[1])
+    clipped[:, [TOP, BOTTOM]] = np.clip(clipped[:, [TOP, BOTTOM]], 0, image_shape[0])
+    clipped[:, RIGHT] = np.maximum(clipped[:, RIGHT], clipped[:, LEFT])
+    clipped[:, BOTTOM] = np.maximum(clipped[:, BOTTOM], clipped[:, TOP])
+    return clipped
+
+
+def iou_1d(
+        first_start: np.ndarray,
+        first_end: np.ndarray,
+        second_start: np.ndarray,
+        second_end: np.ndarray
+) -> np.ndarray:
+    """
+    Computes intersection over union of pairs of 1D intervals, pairs with empty union have IoU of 0.
+    Inputs are broadcast against each other.
+    """
+    overlap = np.maximum(0, np.minimum(first_end, second_end) - np.maximum(first_start, second_start))
+    union = (first_end - first_start) + (second_end - second_start) - overlap
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(union > 0, overlap / np.where(union > 0, union, 1), 0.0)
+
+
+def pairwise_iou_1d(first: np.ndarray, second: np.ndarray, direction: Direction) -> np.ndarray:
+    """
+    Computes IoU of boxes in the given direction for every pair of boxes in the given arrays.
+
+    :return: array of shape (len(first), len(second))
+    """
+    start, end = axis_columns(direction)
+    return iou_1d(
+        first[:, start, None], first[:, end, None],
+        second[None, :, start], second[None, :, end]
+    )
+
+
+def intersects(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """
+    Checks whether boxes intersect (touching counts as intersecting), inputs are broadcast against each other.
+    """
+    return ((first[..., LEFT] <= second[..., RIGHT]) & (first[..., RIGHT] >= second[..., LEFT])
+            & (first[..., TOP] <= second[..., BOTTOM]) & (first[..., BOTTOM] >= second[..., TOP]))
@@ -0,0 +1,70 @@
+import heapq
+
+import numpy as np
+
+from .BoxArrays import LEFT, RIGHT, as_box_array, iou_1d
+
+
+def link_rows(
+        boxes: np.ndarray,
+        rows: list[np.ndarray],
+        linkage_iou_threshold: float = 0.5
+) -> list[np.ndarray]:
+    """
+    Links vertically aligned boxes (measures) of any number of rows (staffs) in a single sweep from left to right.
+
+    The leftmost unprocessed box of all rows becomes the anchor of a new link,
+    the first unprocessed box of every other row joins the link if its horizontal IoU with the anchor
+    is above ``linkage_iou_threshold``, all boxes of the link are then consumed from their rows.
+    Boxes that do not link with any other box form a link on their own.
+    For two rows the result is the same as the two-pointer walk of ``link_measures_inside_grand_staff``.
+
+    Heads of the rows are kept in a heap ordered by their left edge and only heads that start before
+    the right edge of the anchor are compared with it, so aligned systems are linked in O(n log k)
+    for n boxes in k rows.
+
+    :param boxes: Nx4 array of boxes
+    :param rows: indices of boxes of each row, every row sorted from left to right
+    :param linkage_iou_threshold: threshold for linkage to be made
+    :return: list of links, each link contains indices of boxes ordered by their row
+    """
+    boxes = as_box_array(boxes)
+    lefts = boxes[:, LEFT].tolist()
+    rights = boxes[:, RIGHT].tolist()
+    rows = [np.asarray(row).tolist() for row in rows]
+    # boxes that do not overlap can link only with a negative threshold
+    prune = linkage_iou_threshold >= 0
+
+    def _iou(first: int, second: int) -> float:
+        return float(iou_1d(lefts[first], rights[first], lefts[second], rights[second]))
+
+    heads = [0] * len(rows)
+    # leftmost head first, the lower row on ties
+    heap = [(lefts[row[0]], -r, r) for r, row in enumerate(rows) if len(row) > 0]
+    heapq.heapify(heap)
+
+    linked: list[np.ndarray] = []
+    while len(heap) > 0:
+        _, _, anchor_row = heapq.heappop(heap)
+        anchor = rows[anchor_row][heads[anchor_row]]
+
+        members = [anchor_row]
+        rejected = []
+        while len(heap) > 0 and (not prune or heap[0][0] < rights[anchor]):
+            entry = heapq.heappop(heap)
+            row = entry[2]
+            if _iou(anchor, rows[row][heads[row]]) > linkage_iou_threshold:
+                members.append(row)
+            else:
+                rejected.append(entry)
+        for entry in rejected:
+            heapq.heappush(heap, entry)
+
+        members.sort()
+        linked.append(np.array([rows[row][heads[row]] for row in members], dtype=np.int64))
+        for row in members:
+            heads[row] += 1
+            if heads[row] < len(rows[row]):
+                heapq.heappush(heap, (lefts[rows[row][heads[row]]], -row, row))
+
+    return linked
@@ -18,3 +18,8 @@ class NodeName(Enum):
     NOTE_EVENT = "note_event"
 
     _MEASURER_GROUP = "measure_group"
+
+
+# small integer codes used by array based representations of the graph
+NODE_NAME_TO_CODE: dict[NodeName, int] = {name: code for code, name in enumerate(NodeName)}
+CODE_TO_NODE_NAME: list[NodeName] = list(NodeName)
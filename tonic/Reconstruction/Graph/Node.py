@@ -3,22 +3,89 @@ from typing import Self, Any
 
 import numpy as np
 
-from .Names import NodeName
+from .BoxArrays import boxes_from_nodes
+from .Names import NodeName, NODE_NAME_TO_CODE
+from .SpatialIndex import HorizontalIntervalIndex
+from .Strips import sort_boxes_to_strips, split_order_to_strips
+from .Tags import (SYMBOL_PITCH_TAG, SYMBOL_GS_INDEX_TAG, NOTEHEAD_TYPE_TAG, ACCIDENTAL_TYPE_TAG,
+                   MEASURE_GROUP_GS_TAG, NoteheadType, AccidentalType)
 from odtools.Conversions.Annotations.Annotation import Annotation
 from odtools.Conversions.BoundingBox import BoundingBox, Direction
 
 
+# known tags are stored directly in node attributes
+_TAG_ATTRIBUTES: dict[str, str] = {
+    SYMBOL_PITCH_TAG: "pitch",
+    SYMBOL_GS_INDEX_TAG: "gs_index",
+    NOTEHEAD_TYPE_TAG: "notehead_type",
+    ACCIDENTAL_TYPE_TAG: "accidental_type",
+    MEASURE_GROUP_GS_TAG: "in_grand_staff",
+}
+
+
+def _union_bbox(first: BoundingBox, second: BoundingBox) -> BoundingBox:
+    return BoundingBox(
+        second.left if second.left < first.left else first.left,
+        second.top if second.top < first.top else first.top,
+        second.right if second.right > first.right else first.right,
+        second.bottom if second.bottom > first.bottom else first.bottom
+    )
+
+
 class BaseNode:
-    name: NodeName
-    total_box: BoundingBox
+    """
+    Node of the graph, nodes use ``__slots__`` and store tags known from ``Tags.py``
+    in typed attributes, unknown tags are kept in a dictionary created on demand.
+
+    ``name_code`` is a small integer code of the node's name (see ``NODE_NAME_TO_CODE``),
+    cheaper to compare than the name itself.
+    """
+    __slots__ = ("_name", "name_code", "_total_bbox", "_children",
+                 "pitch", "gs_index", "notehead_type", "accidental_type", "in_grand_staff", "_other_tags")
+
+    name_code: int
+    _total_bbox: BoundingBox | None
     _children: list[Self]
-    _tags: dict[str, Any]
+
+    pitch: float | None
+    gs_index: int | None
+    notehead_type: NoteheadType | None
+    accidental_type: AccidentalType | None
+    in_grand_staff: bool | None
+    _other_tags: dict[str, Any] | None
 
     def __init__(self, tags: dict[str, Any] = None, name: NodeName = None):
-        self.total_bbox = None
+        self._total_bbox = None
         self.name = name
         self._children = []
-        self._tags: dict[str, Any] = tags if tags is not None else {}
+
+        self.pitch = None
+        self.gs_index = None
+        self.notehead_type = None
+        self.accidental_type = None
+        self.in_grand_staff = None
+        self._other_tags = None
+
+        if tags is not None:
+            for key, value in tags.items():
+                self.set_tag(key, value)
+
+    @property
+    def name(self) -> NodeName:
+        return self._name
+
+    @name.setter
+    def name(self, name: NodeName):
+        self._name = name
+        self.name_code = NODE_NAME_TO_CODE[name] if name is not None else -1
+
+    @property
+    def total_bbox(self) -> BoundingBox | None:
+        return self._total_bbox
+
+    @total_bbox.setter
+    def total_bbox(self, bbox: BoundingBox | None):
+        self._total_bbox = bbox
 
     def add_child(self, child: Self):
         self._children.append(child)
@@ -27,10 +94,29 @@ class BaseNode:
         return self._children
 
     def get_tag(self, key: str) -> Any:
-        return self._tags.get(key, None)
+        attribute = _TAG_ATTRIBUTES.get(key)
+        if attribute is not None:
+            return getattr(self, attribute)
+        return self._other_tags.get(key, None) if self._other_tags is not None else None
 
     def set_tag(self, key: str, value: Any):
-        self._tags[key] = value
+        attribute = _TAG_ATTRIBUTES.get(key)
+        if attribute is not None:
+            setattr(self, attribute, value)
+        else:
+            if self._other_tags is None:
+                self._other_tags = {}
+            self._other_tags[key] = value
+
+    def tags(self) -> dict[str, Any]:
+        """
+        Returns all tags that are set on this node.
+        """
+        tags = {key: getattr(self, attribute) for key, attribute in _TAG_ATTRIBUTES.items()
+                if getattr(self, attribute) is not None}
+        if self._other_tags is not None:
+            tags.update(self._other_tags)
+        return tags
 
     @abstractmethod
     def update_total_bbox(self):
@@ -41,12 +127,17 @@ class Node(BaseNode):
     """
     Object with a bounding box in a scene.
     """
+    __slots__ = ("annot", "_bbox_child_count")
+
     annot: Annotation
+    # number of children already included in the total bounding box
+    _bbox_child_count: int
 
     def __init__(self, base: Annotation, tags: dict[str, Any] = None, name: NodeName = None):
         super().__init__(tags=tags, name=name)
         self.annot = base
         self.total_bbox = base.bbox
+        self._bbox_child_count = 0
 
     def add_child(self, child: Self, update_t_bbox: bool = False):
         self._children.append(child)
@@ -54,31 +145,82 @@ class Node(BaseNode):
             self.update_total_bbox()
 
     def update_total_bbox(self):
-        if len(self._children) > 0:
-            temp_box = BoundingBox(
-                min(self._children, key=lambda b: b.annot.bbox.left).annot.bbox.left,
-                min(self._children, key=lambda b: b.annot.bbox.top).annot.bbox.top,
-                max(self._children, key=lambda b: b.annot.bbox.right).annot.bbox.right,
-                max(self._children, key=lambda b: b.annot.bbox.bottom).annot.bbox.bottom
-            )
-            self.total_bbox = BoundingBox(
-                temp_box.left if temp_box.left < self.total_bbox.left else self.total_bbox.left,
-                temp_box.top if temp_box.top < self.total_bbox.top else self.total_bbox.top,
-                temp_box.right if temp_box.right > self.total_bbox.right else self.total_bbox.right,
-                temp_box.bottom if temp_box.bottom > self.total_bbox.bottom else self.total_bbox.bottom
-            )
+        """
+        Extends the total bounding box by bounding boxes of children added since the last update,
+        the total bounding box only grows, so adding a single child is O(1).
+        """
+        for child in self._children[self._bbox_child_count:]:
+            self.total_bbox = _union_bbox(self.total_bbox, child.annot.bbox)
+        self._bbox_child_count = len(self._children)
+
+    def insert_child(self, position: int, child: Self):
+        """
+        Inserts the child at the given position of children.
+        """
+        self._children.insert(position, child)
+        if position < self._bbox_child_count:
+            self.total_bbox = _union_bbox(self.total_bbox, child.annot.bbox)
+            self._bbox_child_count += 1
+
+    def remove_child(self, child: Self):
+        """
+        Removes the child, the total bounding box is recomputed from the remaining children.
+        """
+        position = self._children.index(child)
+        del self._children[position]
+        self._recompute_total_bbox(self._bbox_child_count - (position < self._bbox_child_count))
+
+    def set_bbox(self, bbox: BoundingBox):
+        """
+        Replaces the bounding box of the node, the total bounding box is recomputed from its children.
+        """
+        self.annot.bbox = bbox
+        self._recompute_total_bbox(self._bbox_child_count)
+
+    def _recompute_total_bbox(self, included: int):
+        # children added after the last update stay excluded until the next one
+        self.total_bbox = self.annot.bbox
+        self._bbox_child_count = 0
+        for child in self._children[:included]:
+            self.total_bbox = _union_bbox(self.total_bbox, child.annot.bbox)
+        self._bbox_child_count = included
 
 
 class VirtualNode(BaseNode):
     """
     Virtual object without a bounding box in a scene.
     """
+    __slots__ = ()
+
     _children: list[BaseNode]
 
     def __init__(self, children: list[BaseNode], tags: dict[str, Any] = None, name: NodeName = None):
         super().__init__(tags=tags, name=name)
         self._children: list[BaseNode] = children
-        self.update_total_bbox()
+
+    @property
+    def total_bbox(self) -> BoundingBox | None:
+        """
+        Union of total bounding boxes of children, computed on the first access and cached.
+        """
+        if self._total_bbox is None:
+            self.update_total_bbox()
+        return self._total_bbox
+
+    @total_bbox.setter
+    def total_bbox(self, bbox: BoundingBox | None):
+        self._total_bbox = bbox
+
+    def add_child(self, child: BaseNode):
+        self._children.append(child)
+        if self._total_bbox is not None:
+            self._total_bbox = _union_bbox(self._total_bbox, child.total_bbox)
+
+    def invalidate_total_bbox(self):
+        """
+        Drops the cached total bounding box, has to be called when children are modified other than by ``add_child``.
+        """
+        self._total_bbox = None
 
     def update_total_bbox(self):
         if len(self._children) > 0:
@@ -93,37 +235,56 @@ class VirtualNode(BaseNode):
         return self._children
 
 
+def _find_closest_target(source: Node, target: list[Node], upper_limit: float = None) -> Node | None:
+    best_distance = np.inf
+    best_target: Node = None
+
+    for current_target in target:
+        if source.annot.bbox.is_fully_inside(current_target.annot.bbox, direction=Direction.HORIZONTAL):
+            current_distance = current_target.annot.bbox.center_distance(
+                source.annot.bbox,
+                direction=Direction.VERTICAL
+            )
+            if (upper_limit is None or current_distance < upper_limit) and current_distance < best_distance:
+                best_distance = current_distance
+                best_target = current_target
+
+    return best_target
+
+
 def assign_to_closest(
         target: list[Node],
         source: list[Node],
         upper_limit: float = None,
-        verbose: bool = False
+        verbose: bool = False,
+        use_index: bool = True
 ):
     """
     Assigns object from source to targets based on their distance from them.
     Modifies the target list in place.
 
+    By default, candidate targets are looked up in an interval index over their horizontal extents,
+    which makes the assignment run in O(n log n), the original O(sources * targets) search
+    can be selected with ``use_index=False``. Both return the same assignments.
+
     :param target: list of targets to assign sources to
     :param source: list of sources to assign to targets
     :param upper_limit: maximum distance to assign source to target
     :param verbose: make script verbose
+    :param use_index: look up candidate targets in an interval index
     """
     unable_to_add = 0
 
-    for current_source in source:
-        best_distance = np.inf
-        best_target: Node = None
-
-        for current_target in target:
-            if current_source.annot.bbox.is_fully_inside(current_target.annot.bbox, direction=Direction.HORIZONTAL):
-                current_distance = current_target.annot.bbox.center_distance(
-                    current_source.annot.bbox,
-                    direction=Direction.VERTICAL
-                )
-                if (upper_limit is None or current_distance < upper_limit) and current_distance < best_distance:
-                    best_distance = current_distance
-                    best_target = current_target
+    if use_index:
+        assignment = HorizontalIntervalIndex(boxes_from_nodes(target)).assign_closest(
+            boxes_from_nodes(source),
+            upper_limit=upper_limit
+        )
+        best_targets = [target[t] if t >= 0 else None for t in assignment]
+    else:
+        best_targets = [_find_closest_target(s, target, upper_limit=upper_limit) for s in source]
 
+    for current_source, best_target in zip(source, best_targets):
         if best_target is None:
             if verbose:
                 print(
@@ -160,65 +321,13 @@ def sort_to_strips_with_threshold(
     if it intersects with any other of the strip in any direction
     :return: list of sorted strips
     """
-
-    def _intersects_any(row: list[Node], node: Node):
-        for n in row:
-            if node.annot.bbox.intersects(n.annot.bbox):
-                return True
-        return False
-
     if len(nodes) == 0:
         return []
 
-    if direction == Direction.HORIZONTAL:
-        top_sorted = sorted(nodes, key=lambda n: n.annot.bbox.top)
-        sorted_rows: list[list[Node]] = []
-        row: list[Node] = []
-        for node in top_sorted:
-            if len(row) == 0:
-                row.append(node)
-                continue
-
-            computed_iou = node.annot.bbox.intersection_over_union(
-                row[-1].annot.bbox,
-                direction=Direction.VERTICAL
-            )
-            inter_any = (check_intersections and _intersects_any(row, node))
-
-            if computed_iou > iou_threshold or inter_any:
-                row.append(node)
-            else:
-                sorted_rows.append(sorted(row, key=lambda n: n.annot.bbox.left))
-                row = [node]
-
-        sorted_rows.append(sorted(row, key=lambda n: n.annot.bbox.left))
-
-        return sorted_rows
-
-    elif direction == Direction.VERTICAL:
-        left_sorted = sorted(nodes, key=lambda n: n.annot.bbox.left)
-        sorted_rows: list[list[Node]] = []
-        row: list[Node] = []
-        for node in left_sorted:
-            if len(row) == 0:
-                row.append(node)
-                continue
-
-            computed_iou = node.annot.bbox.intersection_over_union(
-                row[-1].annot.bbox,
-                direction=Direction.HORIZONTAL
-            )
-            inter_any = (check_intersections and _intersects_any(row, node))
-
-            if computed_iou > iou_threshold or inter_any:
-                row.append(node)
-            else:
-                sorted_rows.append(sorted(row, key=lambda n: n.annot.bbox.top, reverse=True))
-                row = [node]
-
-        sorted_rows.append(sorted(row, key=lambda n: n.annot.bbox.top, reverse=True))
-
-        return sorted_rows
-
-    else:
-        raise NotImplementedError(f"Not implemented for direction {direction}")
+    labels, order = sort_boxes_to_strips(
+        boxes_from_nodes(nodes),
+        iou_threshold,
+        direction=direction,
+        check_intersections=check_intersections
+    )
+    return [[nodes[i] for i in strip] for strip in split_order_to_strips(labels, order)]
@@ -0,0 +1,428 @@
+from typing import Self
+
+import numpy as np
+
+from .BoxArrays import as_box_array, box_to_bbox, boxes_from_nodes
+from .Names import NodeName, NODE_NAME_TO_CODE, CODE_TO_NODE_NAME
+from .Node import Node, VirtualNode
+from .Tags import MEASURE_GROUP_GS_TAG, NoteheadType, AccidentalType
+from odtools.Conversions.Annotations.Annotation import Annotation
+
+# values of typed columns that mark a missing tag
+UNSET_GS_INDEX = 0
+UNSET_TYPE = -1
+UNSET_CLASS_ID = -1
+
+
+def offsets_from_lengths(lengths: list[int] | np.ndarray) -> np.ndarray:
+    """
+    Converts lengths of consecutive segments to CSR-style offsets (with a leading zero).
+    """
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+class PageGraph:
+    """
+    Columnar representation of a reconstructed page.
+
+    Every symbol (notehead, accidental...) is a single row in the symbol columns:
+    boxes as an Nx4 integer array (left, top, right, bottom), node names as small integer codes,
+    class ids, detection confidences and known tags in typed columns (missing values are ``nan``, ``UNSET_GS_INDEX`` or ``UNSET_TYPE``).
+
+    The hierarchy ``row -> measure group -> note event -> symbol`` is stored as CSR-style offset arrays:
+        - row ``r`` contains measure groups ``row_offsets[r]:row_offsets[r + 1]``
+        - measure group ``g`` contains items ``group_items[group_offsets[g]:group_offsets[g + 1]]``,
+          an item is an index of a note event if ``group_item_is_event`` is set, otherwise an index of a symbol
+        - note event ``e`` contains symbols ``event_symbols[event_offsets[e]:event_offsets[e + 1]]``
+
+    Graph without any structure (right after preprocessing) has no rows.
+
+    Parent links (``group_row``, ``event_group``, ``symbol_event``, ``symbol_group``, ``symbol_row``)
+    and symbols of each group and row in reading order (``reading_order``, ``group_symbol_offsets``)
+    are derived from the offsets on first access and cached until the structure arrays are replaced.
+    """
+
+    def __init__(
+            self,
+            boxes: np.ndarray,
+            names: np.ndarray,
+            class_ids: np.ndarray = None,
+            confidences: np.ndarray = None,
+            pitch: np.ndarray = None,
+            gs_index: np.ndarray = None,
+            notehead_type: np.ndarray = None,
+            accidental_type: np.ndarray = None,
+            row_offsets: np.ndarray = None,
+            group_offsets: np.ndarray = None,
+            group_items: np.ndarray = None,
+            group_item_is_event: np.ndarray = None,
+            group_gs: np.ndarray = None,
+            event_offsets: np.ndarray = None,
+            event_symbols: np.ndarray = None,
+    ):
+        self.boxes = as_box_array(boxes)
+        n = len(self.boxes)
+
+        def _column(values, dtype, fill):
+            if values is None:
+                return np.full(n, fill, dtype=dtype)
+            values = np.asarray(values, dtype=dtype)
+            if values.shape != (n,):
+                raise ValueError(f"Expected column of shape ({n},), got {values.shape}")
+            return values
+
+        self.names = _column(names, np.int8, 0)
+        self.class_ids = _column(class_ids, np.int16, UNSET_CLASS_ID)
+        self.confidences = _column(confidences, np.float32, np.nan)
+        self.pitch = _column(pitch, np.float64, np.nan)
+        self.gs_index = _column(gs_index, np.int8, UNSET_GS_INDEX)
+        self.notehead_type = _column(notehead_type, np.int8, UNSET_TYPE)
+        self.accidental_type = _column(accidental_type, np.int8, UNSET_TYPE)
+
+        self.row_offsets = np.zeros(1, dtype=np.int64) if row_offsets is None else np.asarray(row_offsets, np.int64)
+        self.group_offsets = (np.zeros(1, dtype=np.int64) if group_offsets is None
+                              else np.asarray(group_offsets, np.int64))
+        self.group_items = (np.empty(0, dtype=np.int64) if group_items is None
+                            else np.asarray(group_items, np.int64))
+        self.group_item_is_event = (np.empty(0, dtype=bool) if group_item_is_event is None
+                                    else np.asarray(group_item_is_event, bool))
+        self.group_gs = np.empty(0, dtype=bool) if group_gs is None else np.asarray(group_gs, bool)
+        self.event_offsets = (np.zeros(1, dtype=np.int64) if event_offsets is None
+                              else np.asarray(event_offsets, np.int64))
+        self.event_symbols = (np.empty(0, dtype=np.int64) if event_symbols is None
+                              else np.asarray(event_symbols, np.int64))
+
+        self._index: dict[str, np.ndarray] | None = None
+        self._index_key: tuple[np.ndarray, ...] | None = None
+
+    @classmethod
+    def from_symbols(
+            cls,
+            boxes: np.ndarray,
+            name: NodeName | np.ndarray,
+            class_ids: np.ndarray = None,
+            notehead_type: NoteheadType | np.ndarray = None,
+            accidental_type: AccidentalType | np.ndarray = None,
+            confidences: np.ndarray = None,
+    ) -> Self:
+        """
+        Creates a graph without structure from raw symbol arrays.
+        Name and types can be given either for every symbol (as an array of codes) or for all of them at once.
+
+        :param boxes: Nx4 array of (left, top, right, bottom)
+        :param name: name of all symbols or array of name codes
+        :param class_ids: optional class ids of symbols
+        :param notehead_type: notehead type of all symbols or array of type values
+        :param accidental_type: accidental type of all symbols or array of type values
+        :param confidences: optional detection confidences of symbols
+        :return: page graph without rows
+        """
+        boxes = as_box_array(boxes)
+
+        def _expand(value, to_code):
+            if value is None or isinstance(value, np.ndarray):
+                return value
+            return np.full(len(boxes), to_code(value))
+
+        return cls(
+            boxes,
+            _expand(name, lambda n: NODE_NAME_TO_CODE[n]),
+            class_ids=class_ids,
+            confidences=confidences,
+            notehead_type=_expand(notehead_type, lambda t: t.value),
+            accidental_type=_expand(accidental_type, lambda t: t.value),
+        )
+
+    @classmethod
+    def from_nodes(cls, nodes: list[Node]) -> Self:
+        """
+        Creates a graph without structure from given nodes, their tags are copied to typed columns.
+        """
+        # columns are gathered into lists and converted at once, writing single elements of arrays is slow
+        return cls(
+            boxes_from_nodes(nodes),
+            [node.name_code for node in nodes],
+            class_ids=[node.annot.class_id for node in nodes],
+            pitch=[np.nan if node.pitch is None else node.pitch for node in nodes],
+            gs_index=[UNSET_GS_INDEX if node.gs_index is None else node.gs_index for node in nodes],
+            notehead_type=[UNSET_TYPE if node.notehead_type is None else node.notehead_type.value for node in nodes],
+            accidental_type=[UNSET_TYPE if node.accidental_type is None else node.accidental_type.value
+                             for node in nodes],
+        )
+
+    @property
+    def symbol_count(self) -> int:
+        return len(self.boxes)
+
+    @property
+    def row_count(self) -> int:
+        return len(self.row_offsets) - 1
+
+    @property
+    def group_count(self) -> int:
+        return len(self.group_offsets) - 1
+
+    @property
+    def event_count(self) -> int:
+        return len(self.event_offsets) - 1
+
+    def slice_symbols(self, start: int, end: int) -> Self:
+        """
+        Returns graph without structure with symbols ``start:end``, its columns are views of this graph's columns.
+        """
+        return type(self)(
+            self.boxes[start:end],
+            self.names[start:end],
+            class_ids=self.class_ids[start:end],
+            confidences=self.confidences[start:end],
+            pitch=self.pitch[start:end],
+            gs_index=self.gs_index[start:end],
+            notehead_type=self.notehead_type[start:end],
+            accidental_type=self.accidental_type[start:end],
+        )
+
+    def _structure(self) -> tuple[np.ndarray, ...]:
+        return (self.row_offsets, self.group_offsets, self.group_items, self.group_item_is_event,
+                self.event_offsets, self.event_symbols)
+
+    def _build_index(self) -> dict[str, np.ndarray]:
+        is_event = self.group_item_is_event
+        item_group = np.repeat(np.arange(self.group_count), np.diff(self.group_offsets))
+
+        group_row = np.repeat(np.arange(self.row_count), np.diff(self.row_offsets))
+        event_group = np.full(self.event_count, -1, dtype=np.int64)
+        event_group[self.group_items[is_event]] = item_group[is_event]
+
+        symbol_event = np.full(self.symbol_count, -1, dtype=np.int64)
+        symbol_event[self.event_symbols] = np.repeat(np.arange(self.event_count), np.diff(self.event_offsets))
+        symbol_group = np.full(self.symbol_count, -1, dtype=np.int64)
+        symbol_group[self.group_items[~is_event]] = item_group[~is_event]
+        in_event = symbol_event >= 0
+        symbol_group[in_event] = event_group[symbol_event[in_event]]
+        symbol_row = np.where(symbol_group >= 0, group_row[np.maximum(symbol_group, 0)], -1)
+
+        # every group item expanded to its symbols, events are replaced by their children
+        event_lengths = np.diff(self.event_offsets)
+        item_lengths = np.where(is_event, event_lengths[np.where(is_event, self.group_items, 0)], 1)
+        item_starts = np.where(is_event, self.event_offsets[np.where(is_event, self.group_items, 0)], 0)
+        positions = (np.arange(item_lengths.sum()) - np.repeat(np.cumsum(item_lengths) - item_lengths, item_lengths)
+                     + np.repeat(item_starts, item_lengths))
+        reading_order = np.where(np.repeat(is_event, item_lengths),
+                                 self.event_symbols[positions] if len(self.event_symbols) > 0 else positions,
+                                 np.repeat(self.group_items, item_lengths))
+        group_symbol_offsets = offsets_from_lengths(
+            np.bincount(item_group, weights=item_lengths, minlength=self.group_count).astype(np.int64)
+        )
+
+        return {
+            "group_row": group_row,
+            "event_group": event_group,
+            "symbol_event": symbol_event,
+            "symbol_group": symbol_group,
+            "symbol_row": symbol_row,
+            "reading_order": reading_order,
+            "group_symbol_offsets": group_symbol_offsets,
+        }
+
+    def _cached_index(self, key: str) -> np.ndarray:
+        structure = self._structure()
+        if self._index is None or any(a is not b for a, b in zip(structure, self._index_key)):
+            self._index = self._build_index()
+            self._index_key = structure
+        return self._index[key]
+
+    @property
+    def group_row(self) -> np.ndarray:
+        """
+        Row of each measure group.
+        """
+        return self._cached_index("group_row")
+
+    @property
+    def event_group(self) -> np.ndarray:
+        """
+        Measure group of each note event.
+        """
+        return self._cached_index("event_group")
+
+    @property
+    def symbol_event(self) -> np.ndarray:
+        """
+        Note event of each symbol, -1 for symbols outside events.
+        """
+        return self._cached_index("symbol_event")
+
+    @property
+    def symbol_group(self) -> np.ndarray:
+        """
+        Measure group of each symbol, directly or through its note event, -1 for symbols outside the structure.
+        """
+        return self._cached_index("symbol_group")
+
+    @property
+    def symbol_row(self) -> np.ndarray:
+        """
+        Row of each symbol, -1 for symbols outside the structure.
+        """
+        return self._cached_index("symbol_row")
+
+    @property
+    def reading_order(self) -> np.ndarray:
+        """
+        All symbols in the structure in reading order, row after row, group after group,
+        with note events replaced by their symbols.
+        """
+        return self._cached_index("reading_order")
+
+    @property
+    def group_symbol_offsets(self) -> np.ndarray:
+        """
+        CSR-style offsets of symbols of each measure group in ``reading_order``.
+        """
+        return self._cached_index("group_symbol_offsets")
+
+    def group_symbols(self, group: int) -> np.ndarray:
+        """
+        Returns all symbols of the given measure group in reading order.
+        """
+        offsets = self.group_symbol_offsets
+        return self.reading_order[offsets[group]:offsets[group + 1]]
+
+    def row_symbols(self, row: int) -> np.ndarray:
+        """
+        Returns all symbols of the given row in reading order.
+        """
+        offsets = self.group_symbol_offsets
+        return self.reading_order[offsets[self.row_offsets[row]]:offsets[self.row_offsets[row + 1]]]
+
+    def symbol_name(self, symbol: int) -> NodeName:
+        return CODE_TO_NODE_NAME[self.names[symbol]]
+
+    def row_groups(self, row: int) -> range:
+        return range(self.row_offsets[row], self.row_offsets[row + 1])
+
+    def group_children(self, group: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns indices of children of the given measure group and a mask telling which of them are note events.
+        """
+        start, end = self.group_offsets[group], self.group_offsets[group + 1]
+        return self.group_items[start:end], self.group_item_is_event[start:end]
+
+    def event_children(self, event: int) -> np.ndarray:
+        return self.event_symbols[self.event_offsets[event]:self.event_offsets[event + 1]]
+
+    def event_boxes(self) -> np.ndarray:
+        """
+        Returns total bounding boxes of all note events as an Ex4 array.
+        """
+        if self.event_count == 0:
+            return np.empty((0, 4), dtype=self.boxes.dtype)
+        member_boxes = self.boxes[self.event_symbols]
+        starts = self.event_offsets[:-1]
+        return np.stack([
+            np.minimum.reduceat(member_boxes[:, 0], starts),
+            np.minimum.reduceat(member_boxes[:, 1], starts),
+            np.maximum.reduceat(member_boxes[:, 2], starts),
+            np.maximum.reduceat(member_boxes[:, 3], starts),
+        ], axis=1)
+
+    @classmethod
+    def from_note_events(cls, measure_groups: list[list[VirtualNode]]) -> Self:
+        """
+        Converts output of ``reconstruct_note_events`` to the columnar representation.
+
+        :param measure_groups: list of rows of measure groups
+        :return: page graph
+        """
+        symbols: list[Node] = []
+        row_lengths: list[int] = []
+        group_lengths: list[int] = []
+        group_items: list[int] = []
+        group_item_is_event: list[bool] = []
+        group_gs: list[bool] = []
+        event_lengths: list[int] = []
+        event_symbols: list[int] = []
+
+        for row in measure_groups:
+            row_lengths.append(len(row))
+            for group in row:
+                group_lengths.append(len(group.children()))
+                group_gs.append(bool(group.in_grand_staff))
+                for child in group.children():
+                    if child.name == NodeName.NOTE_EVENT:
+                        group_items.append(len(event_lengths))
+                        group_item_is_event.append(True)
+                        event_lengths.append(len(child.children()))
+                        for symbol in child.children():
+                            event_symbols.append(len(symbols))
+                            symbols.append(symbol)
+                    else:
+                        group_items.append(len(symbols))
+                        group_item_is_event.append(False)
+                        symbols.append(child)
+
+        graph = cls.from_nodes(symbols)
+        graph.row_offsets = offsets_from_lengths(row_lengths)
+        graph.group_offsets = offsets_from_lengths(group_lengths)
+        graph.group_items = np.asarray(group_items, dtype=np.int64)
+        graph.group_item_is_event = np.asarray(group_item_is_event, dtype=bool)
+        graph.group_gs = np.asarray(group_gs, dtype=bool)
+        graph.event_offsets = offsets_from_lengths(event_lengths)
+        graph.event_symbols = np.asarray(event_symbols, dtype=np.int64)
+        return graph
+
+    def symbol_to_node(self, symbol: int) -> Node:
+        """
+        Materializes a single symbol as a ``Node``.
+        """
+        node = Node(
+            Annotation.from_bbox(int(self.class_ids[symbol]), box_to_bbox(self.boxes[symbol])),
+            name=self.symbol_name(symbol)
+        )
+        if not np.isnan(self.pitch[symbol]):
+            node.pitch = float(self.pitch[symbol])
+        if self.gs_index[symbol] != UNSET_GS_INDEX:
+            node.gs_index = int(self.gs_index[symbol])
+        if self.notehead_type[symbol] != UNSET_TYPE:
+            node.notehead_type = NoteheadType(int(self.notehead_type[symbol]))
+        if self.accidental_type[symbol] != UNSET_TYPE:
+            node.accidental_type = AccidentalType(int(self.accidental_type[symbol]))
+        return node
+
+    def to_note_events(self, nodes: list[Node] = None) -> list[list[VirtualNode]]:
+        """
+        Materializes the graph as ``Node`` and ``VirtualNode`` objects
+        in the same format as returned by ``reconstruct_note_events``.
+
+        :param nodes: existing nodes of symbols to use instead of creating new ones (for example nodes the graph
+            was created from), their pitch and grand staff index are set from the graph
+        :return: list of rows of measure groups
+        """
+        if nodes is None:
+            nodes = [self.symbol_to_node(i) for i in range(self.symbol_count)]
+        else:
+            if len(nodes) != self.symbol_count:
+                raise ValueError(f"Expected {self.symbol_count} nodes, got {len(nodes)}")
+            for node, pitch, gs_index in zip(nodes, self.pitch.tolist(), self.gs_index.tolist()):
+                if not np.isnan(pitch):
+                    node.pitch = pitch
+                if gs_index != UNSET_GS_INDEX:
+                    node.gs_index = gs_index
+        events = [
+            VirtualNode([nodes[s] for s in self.event_children(e)], name=NodeName.NOTE_EVENT)
+            for e in range(self.event_count)
+        ]
+
+        rows: list[list[VirtualNode]] = []
+        for r in range(self.row_count):
+            row: list[VirtualNode] = []
+            for g in self.row_groups(r):
+                items, is_event = self.group_children(g)
+                children = [events[i] if e else nodes[i] for i, e in zip(items, is_event)]
+                row.append(VirtualNode(children, name=NodeName._MEASURER_GROUP,
+                                       tags={MEASURE_GROUP_GS_TAG: bool(self.group_gs[g])}))
+            rows.append(row)
+        return rows
+
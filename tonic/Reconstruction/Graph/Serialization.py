@@ -0,0 +1,134 @@
+import struct
+import zipfile
+from pathlib import Path
+
+import numpy as np
+
+from .Names import NodeName, NODE_NAME_TO_CODE
+from .Node import VirtualNode
+from .PageGraph import PageGraph
+
+# version of the on-disk format, increased on every incompatible change
+PAGE_GRAPH_FORMAT_VERSION = 2
+
+_VERSION_KEY = "format_version"
+_NAME_TABLE_KEY = "name_table"
+
+# arrays of the page graph stored in the file
+_COLUMNS = (
+    "boxes", "names", "class_ids", "confidences", "pitch", "gs_index", "notehead_type", "accidental_type",
+    "row_offsets", "group_offsets", "group_items", "group_item_is_event", "group_gs",
+    "event_offsets", "event_symbols",
+)
+
+# columns that were added in later versions, older files are loaded with default values
+_OPTIONAL_COLUMNS = ("confidences",)
+
+# size of the fixed part of a zip local file header, file name and extra field lengths are stored at its end
+_ZIP_LOCAL_HEADER_SIZE = 30
+
+
+def save_page_graph(graph: PageGraph, path: Path | str, compress: bool = False):
+    """
+    Saves the page graph as a versioned ``.npz`` archive, one array per column.
+
+    Node names are stored as integer codes together with the table of names,
+    so files stay readable when ``NodeName`` changes.
+
+    :param graph: page graph to save
+    :param path: output path
+    :param compress: compress the archive, compressed archives can not be memory-mapped
+    """
+    arrays = {column: getattr(graph, column) for column in _COLUMNS}
+    arrays[_VERSION_KEY] = np.array(PAGE_GRAPH_FORMAT_VERSION, dtype=np.int64)
+    arrays[_NAME_TABLE_KEY] = np.array([name.value for name in NODE_NAME_TO_CODE])
+
+    with open(path, "wb") as file:
+        if compress:
+            np.savez_compressed(file, **arrays)
+        else:
+            np.savez(file, **arrays)
+
+
+def _memmap_member(path: Path, info: zipfile.ZipInfo) -> np.ndarray:
+    """
+    Maps a single uncompressed ``.npy`` member of a zip archive into memory without reading it.
+    """
+    with open(path, "rb") as file:
+        file.seek(info.header_offset)
+        header = file.read(_ZIP_LOCAL_HEADER_SIZE)
+        name_length, extra_length = struct.unpack("<HH", header[26:30])
+        file.seek(info.header_offset + _ZIP_LOCAL_HEADER_SIZE + name_length + extra_length)
+
+        version = np.lib.format.read_magic(file)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+        offset = file.tell()
+
+    if dtype.hasobject:
+        raise ValueError(f"Member {info.filename} contains objects and can not be memory-mapped")
+    # zero-sized arrays can not be mapped
+    if int(np.prod(shape)) == 0:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape, offset=offset, order="F" if fortran_order else "C")
+
+
+def _read_arrays(path: Path, mmap: bool) -> dict[str, np.ndarray]:
+    if not mmap:
+        with np.load(path, allow_pickle=False) as archive:
+            return {key: archive[key] for key in archive.files}
+
+    arrays: dict[str, np.ndarray] = {}
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            key = info.filename.removesuffix(".npy")
+            if info.compress_type == zipfile.ZIP_STORED:
+                arrays[key] = _memmap_member(path, info)
+            else:
+                # compressed members have to be read
+                with archive.open(info) as member:
+                    arrays[key] = np.lib.format.read_array(member, allow_pickle=False)
+    return arrays
+
+
+def load_page_graph(path: Path | str, mmap: bool = True) -> PageGraph:
+    """
+    Loads a page graph saved by ``save_page_graph``.
+
+    :param path: path to the archive
+    :param mmap: memory-map the columns instead of reading them, the columns are read-only
+    :return: page graph
+    """
+    path = Path(path)
+    arrays = _read_arrays(path, mmap)
+
+    if _VERSION_KEY not in arrays:
+        raise ValueError(f"File {path} is not a page graph")
+    version = int(arrays[_VERSION_KEY])
+    if version > PAGE_GRAPH_FORMAT_VERSION:
+        raise ValueError(f"Unsupported page graph format version {version}, "
+                         f"latest supported is {PAGE_GRAPH_FORMAT_VERSION}")
+
+    # translate stored name codes to the current ones
+    stored_names = [NodeName(value) for value in arrays[_NAME_TABLE_KEY].tolist()]
+    if stored_names != list(NODE_NAME_TO_CODE):
+        translation = np.array([NODE_NAME_TO_CODE[name] for name in stored_names], dtype=np.int8)
+        arrays["names"] = translation[arrays["names"]]
+
+    return PageGraph(**{
+        column: arrays[column] for column in _COLUMNS
+        if column in arrays or column not in _OPTIONAL_COLUMNS
+    })
+
+
+def load_note_events(path: Path | str) -> list[list[VirtualNode]]:
+    """
+    Loads a saved page graph in the format returned by ``reconstruct_note_events``,
+    the result can be passed directly to ``linearize_note_events_to_lmx``.
+
+    :param path: path to the archive
+    :return: list of rows of measure groups
+    """
+    return load_page_graph(path, mmap=False).to_note_events()
@@ -0,0 +1,162 @@
+import numpy as np
+
+from .BoxArrays import LEFT, TOP, RIGHT, BOTTOM, as_box_array, intersects, vertical_centers
+
+
+def _expand_ranges(low: np.ndarray, high: np.ndarray, order: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Expands ranges ``[low[i], high[i])`` of sorted positions into (query, box) pairs.
+    """
+    counts = np.maximum(high - low, 0)
+    query_index = np.repeat(np.arange(len(low)), counts)
+    starts = np.cumsum(counts) - counts
+    positions = np.arange(len(query_index)) - np.repeat(starts, counts) + np.repeat(low, counts)
+    return query_index, order[positions]
+
+
+class HorizontalIntervalIndex:
+    """
+    Static index over horizontal extents of boxes (typically measures).
+
+    Boxes are sorted by their left edge, every box that horizontally contains a query
+    has its left edge between ``query.right - max_width`` and ``query.left``,
+    so the candidates are found by two binary searches and a single filter on right edges.
+
+    On tall pages every query lies in the columns of many staffs, so when assigning with an upper limit,
+    candidates are taken from the horizontal band of boxes with vertical centers close to the query
+    whenever the band is the smaller candidate set.
+    """
+
+    def __init__(self, boxes: np.ndarray):
+        self.boxes = as_box_array(boxes)
+        self._order = np.argsort(self.boxes[:, LEFT], kind="stable")
+        self._lefts = self.boxes[self._order, LEFT]
+        self._max_width = int((self.boxes[:, RIGHT] - self.boxes[:, LEFT]).max()) if len(self.boxes) > 0 else 0
+        self._centers = vertical_centers(self.boxes)
+        self._center_order = np.argsort(self._centers, kind="stable")
+        self._sorted_centers = self._centers[self._center_order]
+
+    def __len__(self) -> int:
+        return len(self.boxes)
+
+    def containing_pairs(self, queries: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Finds all (query, box) pairs where the box horizontally contains the query box.
+
+        :param queries: Nx4 array of query boxes
+        :return: indices of queries and of indexed boxes, pairs are sorted by query and then by box index
+        """
+        queries = as_box_array(queries)
+        if len(queries) == 0 or len(self.boxes) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        low, high = self._column_ranges(queries)
+        query_index, box_index = _expand_ranges(low, high, self._order)
+
+        inside = self.boxes[box_index, RIGHT] >= queries[query_index, RIGHT]
+        query_index, box_index = query_index[inside], box_index[inside]
+
+        order = np.lexsort((box_index, query_index))
+        return query_index[order], box_index[order]
+
+    def _column_ranges(self, queries: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # ranges of boxes sorted by left edge that can contain the queries
+        low = np.searchsorted(self._lefts, queries[:, RIGHT] - self._max_width, side="left")
+        high = np.searchsorted(self._lefts, queries[:, LEFT], side="right")
+        return low, high
+
+    def _band_ranges(self, centers: np.ndarray, upper_limit: float) -> tuple[np.ndarray, np.ndarray]:
+        # ranges of boxes sorted by vertical center that can be closer than the limit,
+        # the band is slightly widened so that rounding never drops a candidate, exact distances are checked later
+        margin = upper_limit * (1 + 1e-9) + 1e-9
+        low = np.searchsorted(self._sorted_centers, centers - margin, side="left")
+        high = np.searchsorted(self._sorted_centers, centers + margin, side="right")
+        return low, high
+
+    def _band_pairs(self, queries: np.ndarray, centers: np.ndarray, upper_limit: float):
+        low, high = self._band_ranges(centers, upper_limit)
+        query_index, box_index = _expand_ranges(low, high, self._center_order)
+
+        inside = ((self.boxes[box_index, LEFT] <= queries[query_index, LEFT])
+                  & (self.boxes[box_index, RIGHT] >= queries[query_index, RIGHT]))
+        return query_index[inside], box_index[inside]
+
+    def assign_closest(self, queries: np.ndarray, upper_limit: float = None) -> np.ndarray:
+        """
+        Assigns every query box to the vertically closest indexed box that horizontally contains it.
+        Ties are resolved in favour of the box with the lowest index.
+
+        :param queries: Nx4 array of query boxes
+        :param upper_limit: maximum (exclusive) vertical distance of centers to make an assignment
+        :return: index of the assigned box for each query, -1 if no suitable box was found
+        """
+        queries = as_box_array(queries)
+        assignment = np.full(len(queries), -1, dtype=np.int64)
+        if len(queries) == 0 or len(self.boxes) == 0:
+            return assignment
+
+        centers = vertical_centers(queries)
+        if upper_limit is not None and self._band_is_smaller(queries, centers, upper_limit):
+            query_index, box_index = self._band_pairs(queries, centers, upper_limit)
+        else:
+            query_index, box_index = self.containing_pairs(queries)
+        distance = np.abs(self._centers[box_index] - centers[query_index])
+        if upper_limit is not None:
+            valid = distance < upper_limit
+            query_index, box_index, distance = query_index[valid], box_index[valid], distance[valid]
+
+        if len(query_index) == 0:
+            return assignment
+
+        # closest first, lowest box index on ties
+        order = np.lexsort((box_index, distance, query_index))
+        query_index, box_index = query_index[order], box_index[order]
+        first = np.ones(len(query_index), dtype=bool)
+        first[1:] = query_index[1:] != query_index[:-1]
+        assignment[query_index[first]] = box_index[first]
+        return assignment
+
+    def _band_is_smaller(self, queries: np.ndarray, centers: np.ndarray, upper_limit: float) -> bool:
+        column_low, column_high = self._column_ranges(queries)
+        band_low, band_high = self._band_ranges(centers, upper_limit)
+        return np.maximum(band_high - band_low, 0).sum() < np.maximum(column_high - column_low, 0).sum()
+
+
+class VerticalIntervalIndex:
+    """
+    Static index over vertical extents of boxes (typically grand staffs).
+
+    Boxes are sorted by their top edge, every box that vertically overlaps a query
+    has its top edge between ``query.top - max_height`` and ``query.bottom``,
+    so the candidates are found by two binary searches and filtered by the remaining edges.
+    """
+
+    def __init__(self, boxes: np.ndarray):
+        self.boxes = as_box_array(boxes)
+        self._order = np.argsort(self.boxes[:, TOP], kind="stable")
+        self._tops = self.boxes[self._order, TOP]
+        self._max_height = int((self.boxes[:, BOTTOM] - self.boxes[:, TOP]).max()) if len(self.boxes) > 0 else 0
+
+    def __len__(self) -> int:
+        return len(self.boxes)
+
+    def intersecting_pairs(self, queries: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Finds all (query, box) pairs of intersecting boxes (touching counts as intersecting).
+
+        :param queries: Nx4 array of query boxes
+        :return: indices of queries and of indexed boxes, pairs are sorted by query and then by box index
+        """
+        queries = as_box_array(queries)
+        if len(queries) == 0 or len(self.boxes) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        low = np.searchsorted(self._tops, queries[:, TOP] - self._max_height, side="left")
+        high = np.searchsorted(self._tops, queries[:, BOTTOM], side="right")
+        query_index, box_index = _expand_ranges(low, high, self._order)
+
+        hit = intersects(self.boxes[box_index], queries[query_index])
+        query_index, box_index = query_index[hit], box_index[hit]
+
+        order = np.lexsort((box_index, query_index))
+        return query_index[order], box_index[order]
@@ -0,0 +1,322 @@
+import heapq
+from concurrent.futures import Executor
+
+import numpy as np
+
+from odtools.Conversions.BoundingBox import Direction
+from .BoxArrays import LEFT, TOP, as_box_array, axis_columns, iou_1d
+
+
+def _direction_columns(direction: Direction) -> tuple[int, int, int, int]:
+    """
+    Returns (sort column, within strip key column, overlap start column, overlap end column) for the given direction.
+    """
+    if direction == Direction.HORIZONTAL:
+        return TOP, LEFT, *axis_columns(Direction.VERTICAL)
+    elif direction == Direction.VERTICAL:
+        return LEFT, TOP, *axis_columns(Direction.HORIZONTAL)
+    else:
+        raise NotImplementedError(f"Not implemented for direction {direction}")
+
+
+class _FenwickTree:
+    """
+    Counts of integer keys in range ``[0, size)`` with logarithmic updates and prefix queries.
+    """
+
+    def __init__(self, size: int):
+        self._tree = [0] * (size + 1)
+
+    def add(self, key: int, delta: int):
+        key += 1
+        while key < len(self._tree):
+            self._tree[key] += delta
+            key += key & -key
+
+    def prefix(self, end: int) -> int:
+        """
+        Returns number of keys lower than ``end``.
+        """
+        total = 0
+        while end > 0:
+            total += self._tree[end]
+            end -= end & -end
+        return total
+
+
+def _merge_intersecting_sweep(
+        sorted_boxes: np.ndarray,
+        new_strip: np.ndarray,
+        segment_start: np.ndarray,
+        direction: Direction
+) -> np.ndarray:
+    """
+    Keeps box in the current strip if it intersects with any box already in the strip,
+    same result as comparing every box with all boxes of the current strip, in O(n log n).
+
+    Boxes are sorted by their start in the sorting axis, so a box of the strip can intersect the current box
+    (and all the following ones) only while its end in the sorting axis is not lower than the current start.
+    Such active boxes are kept in a heap ordered by their end and their extents in the cross axis
+    in two Fenwick trees, the number of active boxes overlapping the current box in the cross axis is
+    ``#(cross start <= current cross end) - #(cross end < current cross start)``.
+
+    Boxes that join the strip based on IoU alone are activated lazily, right before the next intersection query,
+    so strips that never need the intersection check cost only the IoU comparison.
+    """
+    # boxes are sorted along the axis in which IoU is computed, the cross axis is the other one
+    _, _, start_column, end_column = _direction_columns(direction)
+    cross_start, cross_end = axis_columns(direction)
+    sort_start = sorted_boxes[:, start_column].tolist()
+    sort_end = sorted_boxes[:, end_column].tolist()
+
+    coordinates = np.unique(sorted_boxes[:, [cross_start, cross_end]])
+    start_rank = np.searchsorted(coordinates, sorted_boxes[:, cross_start]).tolist()
+    end_rank = np.searchsorted(coordinates, sorted_boxes[:, cross_end]).tolist()
+
+    starts = _FenwickTree(len(coordinates))
+    ends = _FenwickTree(len(coordinates))
+    active: list[tuple[int, int]] = []
+
+    def _deactivate(box: int):
+        starts.add(start_rank[box], -1)
+        ends.add(end_rank[box], -1)
+
+    def _clear():
+        for _, box in active:
+            _deactivate(box)
+        active.clear()
+
+    # boxes of the current strip from this index on were not activated yet
+    pending = 0
+
+    new_strip = new_strip.copy()
+    # only boxes that did not join the strip based on IoU need to be visited
+    for i in np.flatnonzero(new_strip).tolist():
+        if segment_start[i]:
+            _clear()
+            pending = i
+
+        elif new_strip[i]:
+            while len(active) > 0 and active[0][0] < sort_start[i]:
+                _deactivate(heapq.heappop(active)[1])
+
+            for box in range(pending, i):
+                # boxes ending before the current start can not intersect anything that follows
+                if sort_end[box] >= sort_start[i]:
+                    heapq.heappush(active, (sort_end[box], box))
+                    starts.add(start_rank[box], 1)
+                    ends.add(end_rank[box], 1)
+            pending = i
+
+            if starts.prefix(end_rank[i] + 1) - ends.prefix(start_rank[i]) > 0:
+                new_strip[i] = False
+            else:
+                _clear()
+
+    return new_strip
+
+
+class SortedSegments:
+    """
+    Boxes of segments sorted along the strip axis together with IoU of consecutive boxes,
+    the part of ``sort_segments_to_strips`` that does not depend on the threshold.
+    Sorting the same boxes into strips with many thresholds then costs a single sort.
+
+    Example usage::
+
+        sorted_segments = SortedSegments(boxes, segment_offsets, direction=Direction.VERTICAL)
+        for threshold in (0.3, 0.4, 0.5):
+            labels, order, strip_offsets = sorted_segments.to_strips(sorted_segments.strip_breaks(threshold))
+    """
+
+    def __init__(
+            self,
+            boxes: np.ndarray,
+            segment_offsets: np.ndarray,
+            direction: Direction = Direction.HORIZONTAL
+    ):
+        """
+        :param boxes: Nx4 array of boxes
+        :param segment_offsets: CSR-style offsets of segments
+        :param direction: the direction of sorting
+        """
+        boxes = as_box_array(boxes)
+        segment_offsets = np.asarray(segment_offsets, dtype=np.int64)
+        self.direction = direction
+        self.segment_count = len(segment_offsets) - 1
+        sort_column, self._key_column, start, end = _direction_columns(direction)
+
+        segment_ids = np.repeat(np.arange(self.segment_count), np.diff(segment_offsets))
+        self.ordered = np.lexsort((boxes[:, sort_column], segment_ids))
+        self.sorted_boxes = boxes[self.ordered]
+        self.sorted_segments = segment_ids[self.ordered]
+
+        self.segment_start = np.ones(len(boxes), dtype=bool)
+        self.segment_start[1:] = self.sorted_segments[1:] != self.sorted_segments[:-1]
+
+        self._iou = iou_1d(self.sorted_boxes[1:, start], self.sorted_boxes[1:, end],
+                           self.sorted_boxes[:-1, start], self.sorted_boxes[:-1, end])
+
+    def __len__(self) -> int:
+        return len(self.sorted_boxes)
+
+    def strip_breaks(self, iou_threshold: float) -> np.ndarray:
+        """
+        Marks sorted boxes that start a new strip based on IoU with the previous box alone,
+        thresholds giving the same breaks give the same strips.
+
+        :param iou_threshold: threshold for sorting
+        :return: boolean mask over sorted boxes
+        """
+        new_strip = self.segment_start.copy()
+        new_strip[1:] |= ~(self._iou > iou_threshold)
+        return new_strip
+
+    def to_strips(
+            self,
+            breaks: np.ndarray,
+            check_intersections: bool = False
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Sorts boxes into strips starting at the given breaks, see ``sort_segments_to_strips``.
+
+        :param breaks: mask returned by ``strip_breaks``
+        :param check_intersections: if true, box is assigned to strip if it intersects with any other box of the strip
+        :return: strip label of every box, reading order of boxes (strip after strip)
+            and CSR-style offsets of strips of each segment
+        """
+        new_strip = breaks
+        if check_intersections:
+            new_strip = _merge_intersecting_sweep(self.sorted_boxes, new_strip, self.segment_start, self.direction)
+
+        sorted_labels = np.cumsum(new_strip) - 1
+        # vertical strips are read from bottom to top
+        keys = self.sorted_boxes[:, self._key_column]
+        if self.direction == Direction.VERTICAL:
+            keys = -keys
+        within = np.lexsort((keys, sorted_labels))
+
+        labels = np.empty(len(self.sorted_boxes), dtype=np.int64)
+        labels[self.ordered] = sorted_labels
+
+        segment_strip_offsets = np.zeros(self.segment_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.sorted_segments[new_strip], minlength=self.segment_count),
+                  out=segment_strip_offsets[1:])
+
+        return labels, self.ordered[within], segment_strip_offsets
+
+
+def sort_segments_to_strips(
+        boxes: np.ndarray,
+        segment_offsets: np.ndarray,
+        iou_threshold: float,
+        direction: Direction = Direction.HORIZONTAL,
+        check_intersections: bool = False
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Sorts boxes of every segment into strips (rows/columns) in a single pass,
+    segment ``s`` are boxes ``segment_offsets[s]:segment_offsets[s + 1]``, strips never cross segments.
+    The result is the same as calling ``sort_to_strips_with_threshold`` for each segment.
+
+    HORIZONTAL corresponds to the reading order: left to right, top to bottom.
+    VERTICAL corresponds to the reading order: bottom to top, left to right.
+
+    Box joins the current strip if its IoU with the last box of the strip is above the threshold,
+    the last box of the current strip is always the previous box in the sorted order,
+    so strip breaks are computed from IoU of consecutive boxes at once.
+
+    :param boxes: Nx4 array of boxes
+    :param segment_offsets: CSR-style offsets of segments
+    :param iou_threshold: threshold for sorting, how big there could be between two objects in the same strip
+    :param direction: the direction of sorting
+    :param check_intersections: if true, box is assigned to strip if it intersects with any other box of the strip
+    :return: strip label of every box, reading order of boxes (strip after strip)
+        and CSR-style offsets of strips of each segment
+    """
+    sorted_segments = SortedSegments(boxes, segment_offsets, direction=direction)
+    return sorted_segments.to_strips(sorted_segments.strip_breaks(iou_threshold), check_intersections)
+
+
+def sort_segments_to_strips_in_chunks(
+        boxes: np.ndarray,
+        segment_offsets: np.ndarray,
+        iou_threshold: float,
+        direction: Direction = Direction.HORIZONTAL,
+        check_intersections: bool = False,
+        executor: Executor = None,
+        segments_per_chunk: int = 64
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Same as ``sort_segments_to_strips``, segments are split into chunks that are sorted concurrently
+    by the given executor (thread or process pool) and merged back in order.
+    Segments are independent, so the result is identical to a single call.
+
+    Without an executor, all segments are sorted in a single call.
+
+    :param executor: executor used to sort chunks, only arrays are sent to it
+    :param segments_per_chunk: number of segments sorted by a single task
+    :return: strip label of every box, reading order of boxes and CSR-style offsets of strips of each segment
+    """
+    boxes = as_box_array(boxes)
+    segment_offsets = np.asarray(segment_offsets, dtype=np.int64)
+    segment_count = len(segment_offsets) - 1
+    if executor is None or segment_count <= segments_per_chunk:
+        return sort_segments_to_strips(boxes, segment_offsets, iou_threshold, direction, check_intersections)
+
+    chunk_starts = list(range(0, segment_count, segments_per_chunk))
+    futures = []
+    for start in chunk_starts:
+        end = min(start + segments_per_chunk, segment_count)
+        first, last = segment_offsets[start], segment_offsets[end]
+        futures.append(executor.submit(
+            sort_segments_to_strips,
+            boxes[first:last],
+            segment_offsets[start:end + 1] - first,
+            iou_threshold,
+            direction,
+            check_intersections
+        ))
+
+    labels: list[np.ndarray] = []
+    orders: list[np.ndarray] = []
+    strip_offsets: list[np.ndarray] = [np.zeros(1, dtype=np.int64)]
+    strip_count = 0
+    for start, future in zip(chunk_starts, futures):
+        chunk_labels, chunk_order, chunk_strip_offsets = future.result()
+        labels.append(chunk_labels + strip_count)
+        orders.append(chunk_order + segment_offsets[start])
+        strip_offsets.append(chunk_strip_offsets[1:] + strip_count)
+        strip_count += chunk_strip_offsets[-1]
+
+    return np.concatenate(labels), np.concatenate(orders), np.concatenate(strip_offsets)
+
+
+def sort_boxes_to_strips(
+        boxes: np.ndarray,
+        iou_threshold: float,
+        direction: Direction = Direction.HORIZONTAL,
+        check_intersections: bool = False
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Array version of ``sort_to_strips_with_threshold``, see ``sort_segments_to_strips``.
+
+    :return: strip label of every box and reading order of boxes (strip after strip)
+    """
+    boxes = as_box_array(boxes)
+    labels, order, _ = sort_segments_to_strips(
+        boxes,
+        np.array([0, len(boxes)]),
+        iou_threshold,
+        direction=direction,
+        check_intersections=check_intersections
+    )
+    return labels, order
+
+
+def split_order_to_strips(labels: np.ndarray, order: np.ndarray) -> list[np.ndarray]:
+    """
+    Splits reading order returned by strip sorting into a list of strips.
+    """
+    if len(labels) == 0:
+        return []
+    return np.split(order, np.cumsum(np.bincount(labels))[:-1])
@@ -7,6 +7,9 @@ SYMBOL_GS_INDEX_TAG = "gs_index"
 NOTEHEAD_TYPE_TAG = "notehead_type"
 ACCIDENTAL_TYPE_TAG = "accidental_type"
 
+# set on measure groups, true if the group was created by linking measures of a grand staff
+MEASURE_GROUP_GS_TAG = "GS"
+
 
 class NoteheadType(Enum):
     HALF = 0
@@ -1,4 +1,6 @@
 from .Names import NodeName
 from .Node import BaseNode, Node, VirtualNode
+from .PageGraph import PageGraph
+from .Serialization import save_page_graph, load_page_graph, load_note_events
 from .Tags import ACCIDENTAL_TYPE_TAG, AccidentalType
 from .Tags import NOTEHEAD_TYPE_TAG, NoteheadType
@@ -1,7 +1,11 @@
 from enum import Enum
 
+import numpy as np
+
+from .Graph.BoxArrays import boxes_from_nodes
+from .Graph.Linkage import link_rows
 from .Graph.Node import Node, VirtualNode
-from odtools.Conversions.BoundingBox import Direction
+from .Graph.PageGraph import offsets_from_lengths
 
 
 class SectionType(Enum):
@@ -26,46 +30,30 @@ def link_measures_inside_grand_staff(
     :param bottom_row: list of nodes representing the bottom staff
     :param linkage_iou_threshold: threshold for linkage to be made
     """
-    top_index = 0
-    bottom_index = 0
-
-    linked_measures: list[VirtualNode] = []
-
-    # going from left to right
-    while top_index < len(top_row) and bottom_index < len(bottom_row):
-        top_measure = top_row[top_index]
-        bottom_measure = bottom_row[bottom_index]
+    return link_measures_inside_system([top_row, bottom_row], linkage_iou_threshold=linkage_iou_threshold)
 
-        iou = top_measure.annot.bbox.intersection_over_union(bottom_measure.annot.bbox, direction=Direction.HORIZONTAL)
 
-        # linkage found
-        if iou > linkage_iou_threshold:
-            linked_measures.append(VirtualNode([top_measure, bottom_measure]))
-            top_index += 1
-            bottom_index += 1
-
-        # throw out one measure and advance in its row
-        else:
-            # drop the leftmost measure
-            if top_measure.annot.bbox.left < bottom_measure.annot.bbox.left:
-                linked_measures.append(VirtualNode([top_measure]))
-                top_index += 1
-            else:
-                linked_measures.append(VirtualNode([bottom_measure]))
-                bottom_index += 1
-
-    if top_index == len(top_row) and bottom_index == len(bottom_row):
-        return linked_measures
+def link_measures_inside_system(
+        rows: list[list[Node]],
+        linkage_iou_threshold: float = 0.5
+) -> list[VirtualNode]:
+    """
+    Takes measures of all staffs of a single system (ordered from top to bottom)
+    and links vertically aligned measures together in a single sweep over all staffs, see ``link_rows``.
+    If a measure does not link with any other measure, it is returned as a single child of VirtualNode.
 
-    # dump the rest of bottom row
-    elif top_index == len(top_row):
-        while bottom_index < len(bottom_row):
-            linked_measures.append(VirtualNode([bottom_row[bottom_index]]))
-            bottom_index += 1
-    # dump the rest of top row
-    else:
-        while top_index < len(top_row):
-            linked_measures.append(VirtualNode([top_row[top_index]]))
-            top_index += 1
+    Linkage is made if the horizontal IoU of a measure with the leftmost unlinked measure
+    is greater than linkage_iou_threshold, for two staffs this is the same as ``link_measures_inside_grand_staff``.
 
-    return linked_measures
+    :param rows: list of staffs, each staff is a list of measures sorted from left to right
+    :param linkage_iou_threshold: threshold for linkage to be made
+    :return: list of linked measures, children of each link are ordered from top to bottom
+    """
+    measures = [measure for row in rows for measure in row]
+    offsets = offsets_from_lengths([len(row) for row in rows])
+    links = link_rows(
+        boxes_from_nodes(measures),
+        [np.arange(start, end) for start, end in zip(offsets[:-1], offsets[1:])],
+        linkage_iou_threshold=linkage_iou_threshold
+    )
+    return [VirtualNode([measures[m] for m in link.tolist()]) for link in links]
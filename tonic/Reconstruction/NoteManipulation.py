@@ -2,28 +2,30 @@ from pathlib import Path
 
 import numpy as np
 
+from .ArrayReconstruction import compute_symbol_pitches
+from .Graph.BoxArrays import boxes_from_nodes
 from .Graph.Node import Node, assign_to_closest
-from .Graph.Tags import SYMBOL_PITCH_TAG, SYMBOL_GS_INDEX_TAG
+from .Stats import PipelineStats, count, measure_stage, STAGE_ASSIGNMENT, STAGE_PITCH, COUNT_DROPPED_SYMBOLS
 from .VizUtils import write_note_heights_to_image
 from odtools.Splitting import draw_rectangles_on_image
 
 
-def _compute_note_pitches(measure: Node):
+def _compute_note_pitches(measures: list[Node]):
     """
     Computes each note's distance from the bottom staff line and assigns a pitch
-    for all notes in the given measure.
+    for all notes in the given measures, pitches of the whole page are computed in a single pass.
     """
-    half_line_height = measure.annot.bbox.height / 8
-    for note in measure.children():
-        x_center, _ = note.annot.bbox.center()
-        distance_from_zero = measure.annot.bbox.bottom - x_center
-        note.set_tag(SYMBOL_PITCH_TAG, distance_from_zero / half_line_height)
+    notes = [note for measure in measures for note in measure.children()]
+    assignment = np.repeat(np.arange(len(measures)), [len(measure.children()) for measure in measures])
+    pitch = compute_symbol_pitches(boxes_from_nodes(measures), boxes_from_nodes(notes), assignment)
+    for note, note_pitch in zip(notes, pitch.tolist()):
+        note.pitch = note_pitch
 
 
 def _assign_gs_index_to_notes(measures: list[Node], gs_index: int):
     for measure in measures:
         for note in measure.children():
-            note.set_tag(SYMBOL_GS_INDEX_TAG, gs_index)
+            note.gs_index = gs_index
 
 
 def assign_notes_to_measures_and_compute_pitch(
@@ -33,6 +35,7 @@ def assign_notes_to_measures_and_compute_pitch(
         image_path: Path = None,
         verbose: bool = False,
         visualize: bool = False,
+        stats: PipelineStats = None,
 ) -> None:
     """
     Assigns given notes to given measures and computes their pitches.
@@ -55,16 +58,20 @@ def assign_notes_to_measures_and_compute_pitch(
     :param image_path: path to image for visualization
     :param verbose: make script verbose
     :param visualize: show visualization on screen
+    :param stats: optional statistics filled in with times of assignment and pitch computation
     """
     if image_path is None and visualize:
         raise ValueError("Image path is required when visualize is set to True.")
 
-    upper_assignment_limit = np.mean([m.annot.bbox.height for m in measures]) * ual_factor
-    assign_to_closest(measures, notes, upper_limit=upper_assignment_limit, verbose=verbose)
+    with measure_stage(stats, STAGE_ASSIGNMENT):
+        assigned_before = sum(len(m.children()) for m in measures)
+        upper_assignment_limit = np.mean([m.annot.bbox.height for m in measures]) * ual_factor
+        assign_to_closest(measures, notes, upper_limit=upper_assignment_limit, verbose=verbose)
+    count(stats, COUNT_DROPPED_SYMBOLS, len(notes) - (sum(len(m.children()) for m in measures) - assigned_before))
 
     # assign pitch to each note
-    for measure in measures:
-        _compute_note_pitches(measure)
+    with measure_stage(stats, STAGE_PITCH):
+        _compute_note_pitches(measures)
 
     if visualize:
         print("Showing note pitches...")
@@ -1,12 +1,20 @@
 import itertools
+from concurrent.futures import Executor
 from pathlib import Path
 
 from odtools.Conversions.BoundingBox import Direction
 from .Graph.Names import NodeName
+from .Graph.BoxArrays import boxes_from_nodes
 from .Graph.Node import Node, VirtualNode, sort_to_strips_with_threshold
-from .MeasureManipulation import SectionType, link_measures_inside_grand_staff
+from .Graph.PageGraph import offsets_from_lengths
+from .Graph.Strips import sort_segments_to_strips_in_chunks, split_order_to_strips
+from .Graph.Tags import MEASURE_GROUP_GS_TAG
+from .ArrayReconstruction import build_measure_reading_order, sort_measures_into_sections
+from .MeasureManipulation import SectionType, link_measures_inside_grand_staff, link_measures_inside_system
 from .NoteManipulation import _assign_gs_index_to_notes
 from .NoteManipulation import assign_notes_to_measures_and_compute_pitch
+from .Stats import (PipelineStats, count, measure_stage, STAGE_SECTION_SORT, STAGE_LINKING, STAGE_EVENT_GROUPING,
+                    COUNT_PAGES, COUNT_MEASURES, COUNT_SYMBOLS, COUNT_ROWS, COUNT_MEASURE_GROUPS, COUNT_EVENTS)
 from .VizUtils import visualize_result
 from .VizUtils import write_numbers_on_image, print_info
 
@@ -23,57 +31,11 @@ def sort_page_into_sections(
     :param grand_staff: list of grand staff
     :return: list of tuples (in/out section type, list of nodes)
     """
-    grand_staff = sorted(grand_staff, key=lambda g: g.annot.bbox.top)
-    measures = sorted(measures, key=lambda m: m.annot.bbox.top)
-    sections: list[tuple[SectionType, list[Node]]] = []
-
-    section = []
-    gs_index = 0
-    in_gs = False
-
-    for measure in measures:
-        # ran out of gs to assign measures to, dump them to last section of page
-        if gs_index >= len(grand_staff):
-            section.append(measure)
-            in_gs = False
-            continue
-
-        current_gs = grand_staff[gs_index]
-        intersects = measure.annot.bbox.intersects(current_gs.annot.bbox)
-
-        # measure is inside gs and it is the first one found
-        if intersects and not in_gs:
-            # edge case, when the algorithm starts inside gs, this could otherwise create an empty section
-            if len(section) > 0:
-                sections.append((SectionType.OUT_GS, section))
-            section = [measure]
-            in_gs = True
-        # measure is inside gs and the gs is the same as the last one
-        elif intersects and in_gs:
-            section.append(measure)
-        # measure is outside any gs, same as the last one
-        elif not intersects and not in_gs:
-            section.append(measure)
-        # measure is outside gs and the last one was inside
-        elif not intersects and in_gs:
-            sections.append((SectionType.IN_GS, section))
-            section = [measure]
-
-            # it can intersect with the next gs
-            if (gs_index + 1 < len(grand_staff)
-                    and measure.annot.bbox.intersects(grand_staff[gs_index + 1].annot.bbox)):
-                in_gs = True
-            else:
-                in_gs = False
-
-            # switch to next gs
-            gs_index += 1
-        else:
-            raise NotImplementedError()
-
-    # append last section
-    sections.append((SectionType.IN_GS if in_gs else SectionType.OUT_GS, section))
-    return sections
+    return [
+        (section_type, [measures[m] for m in section.tolist()])
+        for section_type, section in sort_measures_into_sections(boxes_from_nodes(measures),
+                                                                 boxes_from_nodes(grand_staff))
+    ]
 
 
 def link_measures_based_on_grand_staffs(
@@ -83,6 +45,8 @@ def link_measures_based_on_grand_staffs(
         image_path: Path = None,
         verbose: bool = False,
         visualize: bool = False,
+        link_systems: bool = True,
+        stats: PipelineStats = None,
 ) -> list[list[VirtualNode]]:
     """
     Sorts symbols from given measures into groups based on measure relationships.
@@ -93,31 +57,34 @@ def link_measures_based_on_grand_staffs(
     MRIoU (measure reading IoU) determines if the next measure is in the same staff as the last measure
     based on their vertical overlap.
 
+    If ``link_systems`` is set (the default), sections inside a grand staff with more than two staffs
+    (systems of many staffs) are linked together by ``link_measures_inside_system``, grand staff index
+    is not assigned to their notes. Otherwise their staffs are treated as independent single staffs.
+
     :param measures: list of measures to sort
     :param grand_staffs: list of grand staff
     :param mriou_threshold: "measure reading" IoU, determines whether two measures belong to the same staff based on IoU
     :param image_path: path to image
     :param verbose: make script verbose
     :param visualize: show visualizations
+    :param link_systems: link measures of sections with more than two staffs
+    :param stats: optional statistics filled in with times of section sorting and linking
     :return: list of symbols grouped by measures
     """
     if image_path is None and visualize:
         raise ValueError("Image path is required when visualize is set to True.")
 
-    # SORT MEASURES INTO SECTION IN/OUT OF GRAND STAFF
-    sections = sort_page_into_sections(measures, grand_staffs)
-
-    # SORT SECTIONS INTO ROWS OF MEASURES
-    sorted_sections: list[tuple[SectionType, list[list[Node]]]] = []
-    for section_type, section in sections:
-        # keep section type and sort measures inside by reading order
-        sorted_sections.append(
-            (section_type,
-             sort_to_strips_with_threshold(
-                 section,
-                 mriou_threshold,
-                 direction=Direction.HORIZONTAL
-             )))
+    # SORT MEASURES INTO SECTIONS IN/OUT OF GRAND STAFF AND SECTIONS INTO ROWS OF MEASURES
+    with measure_stage(stats, STAGE_SECTION_SORT):
+        reading_order = build_measure_reading_order(
+            boxes_from_nodes(measures),
+            boxes_from_nodes(grand_staffs),
+            mriou_threshold
+        )
+        sorted_sections: list[tuple[SectionType, list[list[Node]]]] = [
+            (section_type, [[measures[m] for m in row.tolist()] for row in reading_order.section_rows(s)])
+            for s, section_type in enumerate(reading_order.section_types)
+        ]
 
     if verbose:
         print_info(
@@ -134,35 +101,46 @@ def link_measures_based_on_grand_staffs(
         input("Press Enter to continue")
 
     # PREPARE MEASURES FOR EVENT DETECTION
-    grouped_measures_by_row: list[list[VirtualNode]] = []
-
-    for section_type, s_section in sorted_sections:
-        # this is the true grand staff
-        if section_type == SectionType.IN_GS and len(s_section) == 2:
-            # tag staff that belong to it
-            _assign_gs_index_to_notes(s_section[0], 1)
-            _assign_gs_index_to_notes(s_section[1], 2)
-            # and link individual measures together
-            linked_row = link_measures_inside_grand_staff(s_section[0], s_section[1])
-
-            grouped_row: list[VirtualNode] = []
-            for link in linked_row:
-                node = VirtualNode([symbol for m in link.children() for symbol in m.children()])
-                node.set_tag("GS", True)
-                grouped_row.append(node)
-
-            grouped_measures_by_row.append(grouped_row)
-
-        # this is a section of many single staffs (or something undefined)
-        else:
-            for staff in s_section:
-                row: list[VirtualNode] = []
-                for measure in staff:
-                    # list of mesures makes it easier to adapt the following algorithms
-                    measure = VirtualNode(measure.children())
-                    measure.set_tag("GS", False)
-                    row.append(measure)
-                grouped_measures_by_row.append(row)
+    with measure_stage(stats, STAGE_LINKING):
+        grouped_measures_by_row: list[list[VirtualNode]] = []
+
+        for section_type, s_section in sorted_sections:
+            # this is the true grand staff
+            if section_type == SectionType.IN_GS and len(s_section) == 2:
+                # tag staff that belong to it
+                _assign_gs_index_to_notes(s_section[0], 1)
+                _assign_gs_index_to_notes(s_section[1], 2)
+                # and link individual measures together
+                linked_row = link_measures_inside_grand_staff(s_section[0], s_section[1])
+
+                grouped_row: list[VirtualNode] = []
+                for link in linked_row:
+                    node = VirtualNode([symbol for m in link.children() for symbol in m.children()])
+                    node.set_tag(MEASURE_GROUP_GS_TAG, True)
+                    grouped_row.append(node)
+
+                grouped_measures_by_row.append(grouped_row)
+
+            # system of many staffs
+            elif link_systems and section_type == SectionType.IN_GS and len(s_section) > 2:
+                grouped_row: list[VirtualNode] = []
+                for link in link_measures_inside_system(s_section):
+                    node = VirtualNode([symbol for m in link.children() for symbol in m.children()])
+                    node.set_tag(MEASURE_GROUP_GS_TAG, True)
+                    grouped_row.append(node)
+
+                grouped_measures_by_row.append(grouped_row)
+
+            # this is a section of many single staffs (or something undefined)
+            else:
+                for staff in s_section:
+                    row: list[VirtualNode] = []
+                    for measure in staff:
+                        # list of mesures makes it easier to adapt the following algorithms
+                        measure = VirtualNode(measure.children())
+                        measure.set_tag(MEASURE_GROUP_GS_TAG, False)
+                        row.append(measure)
+                    grouped_measures_by_row.append(row)
 
     if verbose:
         pass
@@ -174,7 +152,7 @@ def link_measures_based_on_grand_staffs(
         print_info(
             "Detected sections",
             "in/out: number of measures",
-            [f"{section_type}: {len(section)}" for section_type, section in sections]
+            [f"{section_type}: {sum(len(row) for row in s_section)}" for section_type, s_section in sorted_sections]
         )
 
     # returns a list rows (these are lists of grouped symbols)
@@ -207,23 +185,46 @@ def compute_note_events(note_group: list[Node], neiou_threshold: float = 0.8) ->
     return events
 
 
-def compute_note_events_for_row(
+def compute_measure_groups(
         linked_measures: list[VirtualNode],
-        neiou_treshold: float,
-        image_path: Path = None,
-        verbose: bool = False,
-        visualize: bool = False
+        neiou_threshold: float,
+        executor: Executor = None
 ) -> list[VirtualNode]:
-    if image_path is None and visualize:
-        raise ValueError("Image path is required when visualize is set to True.")
+    """
+    Computes note events inside all given linked measures at once
+    and returns a measure group for each of them.
+    Events of all measures are sorted in a single batched call, the result is the same
+    as calling ``compute_note_events`` for each measure separately.
+
+    If an executor is given, chunks of measures are sorted concurrently (only box arrays are sent to it,
+    so a process pool can be used), results are merged back in reading order and are identical to the serial path.
+
+    :param linked_measures: virtual nodes representing the linked measures
+    :param neiou_threshold: threshold for note sorting to events
+    :param executor: optional executor used to sort chunks of measures
+    :return: list of measure groups containing note events and other symbols sorted from left to right
+    """
+    # filter out notes
+    noteheads_by_measure = [[note for note in mes.children() if note.name == NodeName.NOTEHEAD]
+                            for mes in linked_measures]
+    noteheads = [note for notes in noteheads_by_measure for note in notes]
+
+    labels, order, measure_strip_offsets = sort_segments_to_strips_in_chunks(
+        boxes_from_nodes(noteheads),
+        offsets_from_lengths([len(notes) for notes in noteheads_by_measure]),
+        neiou_threshold,
+        direction=Direction.VERTICAL,
+        check_intersections=True,
+        executor=executor
+    )
+    strips = split_order_to_strips(labels, order)
 
     measure_groups: list[VirtualNode] = []
-    for mes in linked_measures:
-        events_in_measure = compute_note_events(
-            # filter out notes
-            [note for note in mes.children() if note.name == NodeName.NOTEHEAD],
-            neiou_threshold=neiou_treshold
-        )
+    for i, mes in enumerate(linked_measures):
+        events_in_measure = [
+            VirtualNode([noteheads[n] for n in strip], name=NodeName.NOTE_EVENT)
+            for strip in strips[measure_strip_offsets[i]:measure_strip_offsets[i + 1]]
+        ]
         group_symbols = sorted(
             events_in_measure + [symbol for symbol in mes.children() if symbol.name != NodeName.NOTEHEAD],
             key=lambda x: x.total_bbox.left
@@ -231,16 +232,35 @@ def compute_note_events_for_row(
 
         measure_groups.append(
             VirtualNode(group_symbols,
-                        name=NodeName._MEASURER_GROUP, tags=mes._tags))
+                        name=NodeName._MEASURER_GROUP, tags=mes.tags()))
+
+    return measure_groups
+
+
+def _show_note_reading_order(image_path: Path, measure_groups: list[VirtualNode]):
+    flat_list: list[Node] = [note for group in measure_groups
+                             for event in group.children()
+                             for note in event.children()
+                             if event.name == NodeName.NOTE_EVENT]
+    print("Showing note reading order...")
+    write_numbers_on_image(image_path, flat_list)
+    input("Press enter to continue")
+
+
+def compute_note_events_for_row(
+        linked_measures: list[VirtualNode],
+        neiou_treshold: float,
+        image_path: Path = None,
+        verbose: bool = False,
+        visualize: bool = False
+) -> list[VirtualNode]:
+    if image_path is None and visualize:
+        raise ValueError("Image path is required when visualize is set to True.")
+
+    measure_groups = compute_measure_groups(linked_measures, neiou_treshold)
 
     if visualize:
-        flat_list: list[Node] = [note for group in measure_groups
-                                 for event in group.children()
-                                 for note in event.children()
-                                 if event.name == NodeName.NOTE_EVENT]
-        print("Showing note reading order...")
-        write_numbers_on_image(image_path, flat_list)
-        input("Press enter to continue")
+        _show_note_reading_order(image_path, measure_groups)
 
     return measure_groups
 
@@ -254,11 +274,18 @@ def reconstruct_note_events(
         neiou_threshold: float = 0.4,
         image_path: Path = None,
         verbose: bool = False,
-        visualize: bool = False
+        visualize: bool = False,
+        link_systems: bool = True,
+        executor: Executor = None,
+        stats: PipelineStats = None
 ) -> list[list[VirtualNode]]:
     if image_path is None and visualize:
         raise ValueError("Image path is required when visualize is set to True.")
 
+    count(stats, COUNT_PAGES)
+    count(stats, COUNT_MEASURES, len(measures))
+    count(stats, COUNT_SYMBOLS, len(symbols_with_pitch))
+
     if len(measures) == 0:
         return [[]]
 
@@ -269,7 +296,8 @@ def reconstruct_note_events(
         ual_factor=ual_factor,
         image_path=image_path,
         verbose=verbose,
-        visualize=visualize
+        visualize=visualize,
+        stats=stats
     )
 
     #
@@ -279,20 +307,32 @@ def reconstruct_note_events(
         mriou_threshold,
         image_path=image_path,
         verbose=verbose,
-        visualize=visualize
+        visualize=visualize,
+        link_systems=link_systems,
+        stats=stats
     )
 
-    row_measure_events: list[list[VirtualNode]] = []
-    for row in linked_measures:
-        row_measure_events.append(
-            compute_note_events_for_row(
-                row,
-                neiou_threshold,
-                image_path=image_path,
-                verbose=verbose,
-                visualize=visualize
-            )
+    # events of the whole page are computed at once and split back to rows
+    with measure_stage(stats, STAGE_EVENT_GROUPING):
+        measure_groups = compute_measure_groups(
+            [m for row in linked_measures for m in row],
+            neiou_threshold,
+            executor=executor
         )
+    row_offsets = offsets_from_lengths([len(row) for row in linked_measures])
+    row_measure_events: list[list[VirtualNode]] = [
+        measure_groups[row_offsets[i]:row_offsets[i + 1]] for i in range(len(linked_measures))
+    ]
+
+    count(stats, COUNT_ROWS, len(linked_measures))
+    count(stats, COUNT_MEASURE_GROUPS, len(measure_groups))
+    count(stats, COUNT_EVENTS, sum(
+        1 for group in measure_groups for child in group.children() if child.name == NodeName.NOTE_EVENT
+    ))
+
+    if visualize:
+        for row in row_measure_events:
+            _show_note_reading_order(image_path, row)
 
     if visualize:
         print("Showing end result...")
@@ -0,0 +1,321 @@
+import functools
+import traceback
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from .BatchReconstruction import PageResult, _chunks, _map_chunks
+from .Graph.BoxArrays import LEFT, TOP, RIGHT, BOTTOM, as_box_array, boxes_from_nodes, clip_boxes
+from .Graph.Node import Node, VirtualNode
+from .Graph.PageGraph import PageGraph
+
+# names of layers, drawn in this order
+LAYER_GRAND_STAFFS = "grand_staffs"
+LAYER_MEASURES = "measures"
+LAYER_EVENTS = "events"
+LAYER_READING_ORDER = "reading_order"
+LAYER_PITCHES = "pitches"
+ALL_LAYERS = (LAYER_GRAND_STAFFS, LAYER_MEASURES, LAYER_EVENTS, LAYER_READING_ORDER, LAYER_PITCHES)
+
+# RGB colors of layers, the same as in VizUtils
+LAYER_COLORS = {
+    LAYER_GRAND_STAFFS: (0, 255, 0),
+    LAYER_MEASURES: (255, 0, 0),
+    LAYER_EVENTS: (0, 0, 255),
+    LAYER_READING_ORDER: (255, 128, 0),
+    LAYER_PITCHES: (0, 255, 0),
+}
+
+# image, overlay and output path of a single page rendered by ``render_pages_batch``
+RenderInput = tuple[np.ndarray | str | Path, "PageOverlay", str | Path]
+
+
+@functools.lru_cache(maxsize=None)
+def load_font(size: int) -> ImageFont.ImageFont:
+    """
+    Loads the label font of the given size once per process.
+    """
+    try:
+        return ImageFont.truetype("arial.ttf", size=size)
+    except IOError:
+        return ImageFont.load_default()
+
+
+@functools.lru_cache(maxsize=4096)
+def _label_bitmap(size: int, label: str) -> tuple[Image.Image, tuple[int, int]]:
+    """
+    Rasterizes the label once per process, labels (pitches) repeat many times on every page.
+
+    :return: mask of the label and its offset from the text position
+    """
+    mask, offset = load_font(size).getmask2(label, mode="L")
+    return Image.frombytes("L", mask.size, bytes(mask)), offset
+
+
+def _rectangle_pixels(rectangles: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns rows and columns of all pixels covered by the given (left, top, right, bottom) rectangles.
+    """
+    widths = rectangles[:, RIGHT] - rectangles[:, LEFT]
+    areas = widths * (rectangles[:, BOTTOM] - rectangles[:, TOP])
+    keep = areas > 0
+    rectangles, widths, areas = rectangles[keep], widths[keep], areas[keep]
+
+    # position of every pixel within its rectangle
+    positions = np.arange(areas.sum()) - np.repeat(np.cumsum(areas) - areas, areas)
+    widths = np.repeat(widths, areas)
+    return (np.repeat(rectangles[:, TOP], areas) + positions // widths,
+            np.repeat(rectangles[:, LEFT], areas) + positions % widths)
+
+
+def draw_box_outlines(canvas: np.ndarray, boxes: np.ndarray, color: tuple[int, ...], thickness: int = 2):
+    """
+    Draws outlines of all boxes into the canvas at once, the outlines lie inside the boxes.
+
+    :param canvas: HxWxC image, modified in place
+    :param boxes: Nx4 array of boxes
+    :param color: color in the channel order of the canvas
+    :param thickness: thickness of the outlines in pixels
+    """
+    boxes = clip_boxes(as_box_array(boxes), canvas.shape)
+    if len(boxes) == 0:
+        return
+    left, top, right, bottom = boxes[:, LEFT], boxes[:, TOP], boxes[:, RIGHT], boxes[:, BOTTOM]
+
+    # the four sides of every box as rectangles
+    strips = np.concatenate([
+        np.stack([left, top, right, np.minimum(top + thickness, bottom)], axis=1),
+        np.stack([left, np.maximum(bottom - thickness, top), right, bottom], axis=1),
+        np.stack([left, top, np.minimum(left + thickness, right), bottom], axis=1),
+        np.stack([np.maximum(right - thickness, left), top, right, bottom], axis=1),
+    ])
+    rows, columns = _rectangle_pixels(strips)
+    canvas[rows, columns] = color
+
+
+def _load_canvas(image: np.ndarray | Image.Image | str | Path) -> np.ndarray:
+    """
+    Decodes the image into an RGB canvas, loaded 3-channel arrays are in the BGR order of OpenCV.
+    """
+    if isinstance(image, str) or isinstance(image, Path):
+        image = cv2.imread(str(image), cv2.IMREAD_COLOR)
+        if image is None:
+            raise FileNotFoundError("Image could not be loaded")
+    if isinstance(image, Image.Image):
+        return np.array(image.convert("RGB"))
+    if image.ndim == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+class PageOverlay:
+    """
+    Layers of a page visualization as arrays, cheap to keep for many pages and to send to worker processes.
+
+    Boxes are Nx4 arrays, labels are texts written at the (x, y) positions of their top-left corners
+    and the reading order is a list of Kx2 arrays of (x, y) points, one for each row of the page.
+    """
+
+    def __init__(
+            self,
+            grand_staffs: np.ndarray = None,
+            measures: np.ndarray = None,
+            events: np.ndarray = None,
+            label_positions: np.ndarray = None,
+            labels: list[str] = None,
+            reading_order: list[np.ndarray] = None
+    ):
+        self.grand_staffs = as_box_array(grand_staffs if grand_staffs is not None else np.empty((0, 4)))
+        self.measures = as_box_array(measures if measures is not None else np.empty((0, 4)))
+        self.events = as_box_array(events if events is not None else np.empty((0, 4)))
+        self.label_positions = (np.asarray(label_positions, dtype=np.int64).reshape(-1, 2)
+                                if label_positions is not None else np.empty((0, 2), dtype=np.int64))
+        self.labels = list(labels) if labels is not None else []
+        self.reading_order = reading_order if reading_order is not None else []
+
+    @classmethod
+    def from_page_graph(
+            cls,
+            graph: PageGraph,
+            measures: np.ndarray | list[Node] = None,
+            grand_staffs: np.ndarray | list[Node] = None
+    ) -> "PageOverlay":
+        """
+        Overlay of a reconstructed page, pitch of every symbol with known pitch is written at its box
+        and the reading order connects centers of symbols of each row.
+
+        :param graph: reconstructed page graph
+        :param measures: measure boxes or nodes
+        :param grand_staffs: grand staff boxes or nodes
+        """
+        if measures is not None and not isinstance(measures, np.ndarray):
+            measures = boxes_from_nodes(measures)
+        if grand_staffs is not None and not isinstance(grand_staffs, np.ndarray):
+            grand_staffs = boxes_from_nodes(grand_staffs)
+
+        symbols = graph.reading_order
+        with_pitch = symbols[np.isfinite(graph.pitch[symbols])]
+        centers = np.stack([(graph.boxes[:, LEFT] + graph.boxes[:, RIGHT]) / 2,
+                            (graph.boxes[:, TOP] + graph.boxes[:, BOTTOM]) / 2], axis=1)
+        return cls(
+            grand_staffs=grand_staffs,
+            measures=measures,
+            events=graph.event_boxes(),
+            label_positions=graph.boxes[with_pitch][:, [LEFT, TOP]],
+            labels=[str(round(pitch)) for pitch in graph.pitch[with_pitch].tolist()],
+            reading_order=[centers[graph.row_symbols(row)] for row in range(graph.row_count)]
+        )
+
+    @classmethod
+    def from_note_events(
+            cls,
+            measure_groups: list[list[VirtualNode]],
+            measures: np.ndarray | list[Node] = None,
+            grand_staffs: np.ndarray | list[Node] = None
+    ) -> "PageOverlay":
+        """
+        Overlay of the output of ``reconstruct_note_events``, see ``from_page_graph``.
+        """
+        return cls.from_page_graph(PageGraph.from_note_events(measure_groups), measures, grand_staffs)
+
+
+class PageRenderer:
+    """
+    Headless renderer of page visualizations into image files.
+
+    The page is decoded once and all layers are composited onto a single canvas, boxes are drawn
+    by vectorized NumPy indexing, the reading order by a single call to OpenCV and labels by PIL
+    with a font loaded and every distinct label rasterized once per process.
+    Nothing is shown, unlike the helpers in ``VizUtils``.
+
+    Example usage::
+
+        renderer = PageRenderer(layers=(LAYER_MEASURES, LAYER_EVENTS, LAYER_PITCHES))
+        overlay = PageOverlay.from_note_events(events, measures, grand_staffs)
+        renderer.save(image_path, overlay, output_dir / f"{image_path.stem}.jpg")
+    """
+
+    def __init__(
+            self,
+            layers: Iterable[str] = ALL_LAYERS,
+            thickness: int = 2,
+            font_size: int = 30,
+            jpeg_quality: int = 90,
+            png_compression: int = 1
+    ):
+        """
+        :param layers: names of drawn layers
+        :param thickness: thickness of box outlines and of the reading order in pixels
+        :param font_size: size of label font
+        :param jpeg_quality: quality of written JPEG files
+        :param png_compression: zlib compression level of written PNG files, low levels are much faster
+        """
+        unknown = set(layers) - set(ALL_LAYERS)
+        if len(unknown) > 0:
+            raise ValueError(f"Unknown layers: {', '.join(sorted(unknown))}")
+        self.layers = tuple(layer for layer in ALL_LAYERS if layer in set(layers))
+        self.thickness = thickness
+        self.font_size = font_size
+        self.jpeg_quality = jpeg_quality
+        self.png_compression = png_compression
+
+    def render(self, image: np.ndarray | Image.Image | str | Path, overlay: PageOverlay) -> Image.Image:
+        """
+        Composites all layers of the overlay onto the image.
+
+        :param image: path to image, loaded gray or BGR image or PIL image
+        :param overlay: layers of the page
+        :return: RGB image
+        """
+        canvas = _load_canvas(image)
+
+        for layer, boxes in [(LAYER_GRAND_STAFFS, overlay.grand_staffs), (LAYER_MEASURES, overlay.measures),
+                             (LAYER_EVENTS, overlay.events)]:
+            if layer in self.layers:
+                draw_box_outlines(canvas, boxes, LAYER_COLORS[layer], self.thickness)
+
+        if LAYER_READING_ORDER in self.layers and len(overlay.reading_order) > 0:
+            cv2.polylines(canvas, [np.round(row).astype(np.int32) for row in overlay.reading_order], False,
+                          LAYER_COLORS[LAYER_READING_ORDER], self.thickness)
+
+        rendered = Image.fromarray(canvas)
+        if LAYER_PITCHES in self.layers and len(overlay.labels) > 0:
+            draw = ImageDraw.Draw(rendered)
+            for (x, y), label in zip(overlay.label_positions.tolist(), overlay.labels):
+                bitmap, (offset_x, offset_y) = _label_bitmap(self.font_size, label)
+                draw.bitmap((x + offset_x, y + offset_y), bitmap, fill=LAYER_COLORS[LAYER_PITCHES])
+        return rendered
+
+    def save(self, image: np.ndarray | Image.Image | str | Path, overlay: PageOverlay, output_path: str | Path) -> Path:
+        """
+        Renders the page and writes it to the given file, the format is given by its suffix.
+
+        :return: path of the written file
+        """
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        self.render(image, overlay).save(output_path, quality=self.jpeg_quality, compress_level=self.png_compression)
+        return output_path
+
+
+def _render_chunk(chunk: list[tuple[int, RenderInput]], renderer: PageRenderer) -> list[PageResult]:
+    results: list[PageResult] = []
+    for index, (image, overlay, output_path) in chunk:
+        try:
+            results.append(PageResult(index, result=renderer.save(image, overlay, output_path)))
+        except Exception:
+            results.append(PageResult(index, error=traceback.format_exc()))
+    return results
+
+
+def _render_pages_batch(
+        pages: Iterable[RenderInput],
+        renderer: PageRenderer,
+        workers: int,
+        chunksize: int,
+        ordered: bool,
+        max_pending_chunks: int,
+        executor: Executor
+) -> Iterator[PageResult]:
+    if workers == 0 and executor is None:
+        for chunk in _chunks(pages, chunksize):
+            yield from _render_chunk(chunk, renderer)
+        return
+
+    yield from _map_chunks(_render_chunk, _chunks(pages, chunksize), (renderer,), workers, ordered,
+                           max_pending_chunks, executor)
+
+
+def render_pages_batch(
+        pages: Iterable[RenderInput],
+        renderer: PageRenderer = None,
+        workers: int = None,
+        chunksize: int = 1,
+        ordered: bool = True,
+        max_pending_chunks: int = None,
+        executor: Executor = None
+) -> Iterator[PageResult]:
+    """
+    Renders many pages into files on a process pool, in the same way as ``reconstruct_note_events_batch``.
+    Result of every page is the path of its written file, exception raised by a page is reported in its result.
+
+    :param pages: iterable of (image, overlay, output path) of each page, images are best given as paths,
+        so that they are decoded by the workers
+    :param renderer: renderer sent to the workers, the default renderer draws all layers
+    :param workers: number of worker processes, ``None`` uses all cores, 0 renders pages in this process
+    :param chunksize: number of pages sent to a worker at once
+    :param ordered: yield results in the input order, otherwise as soon as they are completed
+    :param max_pending_chunks: maximum number of chunks in flight, four per worker (or core) by default
+    :param executor: optional executor to use instead of creating a new process pool
+    :return: iterator of results, one for each page
+    """
+    if chunksize < 1:
+        raise ValueError(f"Chunk size has to be positive, got {chunksize}")
+    if renderer is None:
+        renderer = PageRenderer()
+
+    return _render_pages_batch(pages, renderer, workers, chunksize, ordered, max_pending_chunks, executor)
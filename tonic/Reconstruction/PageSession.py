@@ -0,0 +1,395 @@
+import numpy as np
+
+from odtools.Conversions.BoundingBox import BoundingBox
+from .ArrayReconstruction import MeasureLinks, compute_symbol_pitches, link_page_measures
+from .Graph.BoxArrays import LEFT, RIGHT, boxes_from_nodes, heights, vertical_centers
+from .Graph.Node import Node, VirtualNode
+from .Graph.Names import NodeName
+from .Graph.PageGraph import UNSET_GS_INDEX
+from .Graph.SpatialIndex import HorizontalIntervalIndex
+from .Graph.Tags import MEASURE_GROUP_GS_TAG
+from .PageReconstruction import compute_measure_groups
+from ..Linearization.LMXWrapper import LMXWrapper
+
+
+class PageSession:
+    """
+    Reconstructed page kept up to date while individual detections are inserted, deleted or moved.
+
+    The page is reconstructed when the session is created, with the same result as ``reconstruct_note_events``.
+    Every edit then reassigns only the symbols it can affect, recomputes note events of the touched
+    measure groups and patches tokens of these groups in the LMX sequence of the page,
+    after any sequence of edits the result is the same as reconstructing the edited page from scratch.
+
+    A symbol edit costs about one measure of work. A measure edit also re-links measures of the page,
+    which works with measure boxes only, and recomputes all measure groups only when the linking changes.
+    Changing height of a measure changes the upper assignment limit, when it shrinks, distances of all assigned
+    symbols are checked.
+
+    The session owns given nodes: measures receive their symbols as children, symbols get their pitch
+    and grand staff index. Measures must not have any children when they are passed to the session.
+
+    Example usage::
+
+        session = PageSession(measures, grand_staffs, noteheads)
+        session.move_symbol(notehead, BoundingBox(10, 20, 26, 36))
+        session.delete_symbol(other_notehead)
+        tokens = session.lmx.tokens
+    """
+
+    def __init__(
+            self,
+            measures: list[Node],
+            grand_staffs: list[Node],
+            symbols: list[Node],
+            ual_factor: float = 1.5,
+            mriou_threshold: float = 0.5,
+            neiou_threshold: float = 0.4,
+            link_systems: bool = True
+    ):
+        """
+        :param measures: list of measures
+        :param grand_staffs: list of grand staffs
+        :param symbols: list of symbols with pitch (noteheads, accidentals)
+        :param ual_factor: upper assignment limit factor, see ``assign_notes_to_measures_and_compute_pitch``
+        :param mriou_threshold: measure reading IoU, see ``link_measures_based_on_grand_staffs``
+        :param neiou_threshold: note event IoU, see ``compute_note_events``
+        :param link_systems: link measures of grand staff sections with more than two staffs
+        """
+        self.ual_factor = ual_factor
+        self.mriou_threshold = mriou_threshold
+        self.neiou_threshold = neiou_threshold
+        self.link_systems = link_systems
+
+        self._measures: list[Node] = []
+        for measure in measures:
+            self._check_new_measure(measure)
+            self._measures.append(measure)
+        self._grand_staff_boxes = boxes_from_nodes(grand_staffs)
+
+        # symbols in input order and their sequence numbers, new symbols are added to the end
+        self._symbols: dict[Node, int] = {}
+        self._next_sequence = 0
+        for symbol in symbols:
+            self._add_symbol(symbol)
+        # measure of each symbol, None for symbols without a suitable measure
+        self._assignment: dict[Node, Node | None] = {}
+        # ordered set of symbols without a suitable measure
+        self._dropped: dict[Node, None] = {}
+
+        self._measure_boxes = np.empty((0, 4))
+        self._measure_index: HorizontalIntervalIndex | None = None
+        self._measure_position: dict[Node, int] = {}
+        self._upper_limit = 0.0
+
+        self._links: MeasureLinks | None = None
+        self._link_measures: list[tuple[Node, ...]] = []
+        self._measure_gs: dict[Node, int] = {}
+        self._measure_group: dict[Node, int] = {}
+
+        self._groups: list[VirtualNode] = []
+        self._group_has_events = np.zeros(0, dtype=bool)
+        self._tokens: list[str] = []
+        self._token_offsets = np.zeros(1, dtype=np.int64)
+
+        self._update_measure_index()
+        symbols = list(self._symbols)
+        self._place(symbols)
+        self._relink(set())
+
+    @property
+    def note_events(self) -> list[list[VirtualNode]]:
+        """
+        Rows of measure groups, in the format returned by ``reconstruct_note_events``.
+        """
+        offsets = self._links.row_offsets.tolist()
+        return [self._groups[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+    @property
+    def lmx(self) -> LMXWrapper:
+        """
+        LMX of the page, the same as ``linearize_note_events_to_lmx(session.note_events)``.
+        """
+        if not self._group_has_events.any():
+            return LMXWrapper([])
+        return LMXWrapper(list(self._tokens))
+
+    def group_tokens(self, group: int) -> list[str]:
+        """
+        Returns LMX tokens of a single measure group.
+        """
+        return self._tokens[self._token_offsets[group]:self._token_offsets[group + 1]]
+
+    # SYMBOL EDITS
+    def insert_symbol(self, symbol: Node) -> list[int]:
+        """
+        Adds a new symbol to the page.
+
+        :param symbol: symbol to add
+        :return: indices of measure groups that were recomputed
+        """
+        if symbol in self._symbols:
+            raise ValueError("Symbol is already part of the page")
+        self._add_symbol(symbol)
+        return self._refresh_measures(self._place([symbol]))
+
+    def delete_symbol(self, symbol: Node) -> list[int]:
+        """
+        Removes a symbol from the page.
+
+        :param symbol: symbol to remove
+        :return: indices of measure groups that were recomputed
+        """
+        self._check_symbol(symbol)
+        touched = self._unplace([symbol])
+        del self._symbols[symbol]
+        del self._assignment[symbol]
+        self._dropped.pop(symbol, None)
+        return self._refresh_measures(touched)
+
+    def move_symbol(self, symbol: Node, bbox: BoundingBox) -> list[int]:
+        """
+        Changes bounding box of a symbol.
+
+        :param symbol: symbol to move
+        :param bbox: new bounding box of the symbol
+        :return: indices of measure groups that were recomputed
+        """
+        self._check_symbol(symbol)
+        touched = self._unplace([symbol])
+        symbol.set_bbox(bbox)
+        touched |= self._place([symbol])
+        return self._refresh_measures(touched)
+
+    # MEASURE EDITS
+    def insert_measure(self, measure: Node) -> list[int]:
+        """
+        Adds a new measure to the page.
+
+        :param measure: measure to add
+        :return: indices of measure groups that were recomputed
+        """
+        self._check_new_measure(measure)
+        if measure in self._measure_position:
+            raise ValueError("Measure is already part of the page")
+        self._measures.append(measure)
+        return self._update_measures([measure], [])
+
+    def delete_measure(self, measure: Node) -> list[int]:
+        """
+        Removes a measure from the page, its symbols are assigned to other measures.
+
+        :param measure: measure to remove
+        :return: indices of measure groups that were recomputed
+        """
+        self._check_measure(measure)
+        released = list(measure.children())
+        self._unplace(released)
+        del self._measures[self._measure_position[measure]]
+        return self._update_measures([], released)
+
+    def move_measure(self, measure: Node, bbox: BoundingBox) -> list[int]:
+        """
+        Changes bounding box of a measure.
+
+        :param measure: measure to move
+        :param bbox: new bounding box of the measure
+        :return: indices of measure groups that were recomputed
+        """
+        self._check_measure(measure)
+        measure.set_bbox(bbox)
+        return self._update_measures([measure], list(measure.children()))
+
+    # INTERNALS
+    def _add_symbol(self, symbol: Node):
+        self._symbols[symbol] = self._next_sequence
+        self._next_sequence += 1
+
+    def _check_symbol(self, symbol: Node):
+        if symbol not in self._symbols:
+            raise ValueError("Symbol is not part of the page")
+
+    def _check_measure(self, measure: Node):
+        if measure not in self._measure_position:
+            raise ValueError("Measure is not part of the page")
+
+    @staticmethod
+    def _check_new_measure(measure: Node):
+        if len(measure.children()) > 0:
+            raise ValueError("Measures passed to the session must not have any children")
+
+    def _update_measure_index(self):
+        self._measure_boxes = boxes_from_nodes(self._measures)
+        self._measure_index = HorizontalIntervalIndex(self._measure_boxes)
+        self._measure_position = {measure: i for i, measure in enumerate(self._measures)}
+        self._upper_limit = (np.mean(heights(self._measure_boxes)) * self.ual_factor
+                             if len(self._measures) > 0 else 0.0)
+
+    def _insert_child(self, measure: Node, symbol: Node):
+        # children keep the input order of symbols, the same order as in a full reconstruction
+        children = measure.children()
+        sequence = self._symbols[symbol]
+        position = len(children)
+        while position > 0 and self._symbols[children[position - 1]] > sequence:
+            position -= 1
+        measure.insert_child(position, symbol)
+
+    def _place(self, symbols: list[Node]) -> set[Node]:
+        """
+        Assigns symbols to their closest measures and computes their pitch, returns the measures that changed.
+        """
+        touched: set[Node] = set()
+        if len(symbols) == 0:
+            return touched
+
+        symbol_boxes = boxes_from_nodes(symbols)
+        if len(self._measures) > 0:
+            assignment = self._measure_index.assign_closest(symbol_boxes, upper_limit=self._upper_limit)
+        else:
+            assignment = np.full(len(symbols), -1, dtype=np.int64)
+        pitch = compute_symbol_pitches(self._measure_boxes, symbol_boxes, assignment)
+
+        for symbol, measure_index, symbol_pitch in zip(symbols, assignment.tolist(), pitch.tolist()):
+            if measure_index < 0:
+                self._assignment[symbol] = None
+                self._dropped[symbol] = None
+                symbol.pitch = None
+                symbol.gs_index = None
+                continue
+
+            measure = self._measures[measure_index]
+            self._insert_child(measure, symbol)
+            self._assignment[symbol] = measure
+            self._dropped.pop(symbol, None)
+            symbol.pitch = symbol_pitch
+            symbol.gs_index = self._measure_gs.get(measure)
+            touched.add(measure)
+
+        for measure in touched:
+            measure.update_total_bbox()
+        return touched
+
+    def _unplace(self, symbols: list[Node]) -> set[Node]:
+        """
+        Removes symbols from their measures, returns the measures that changed.
+        """
+        touched: set[Node] = set()
+        for symbol in symbols:
+            measure = self._assignment.get(symbol)
+            if measure is not None:
+                measure.remove_child(symbol)
+                touched.add(measure)
+            self._assignment[symbol] = None
+        return touched
+
+    def _symbols_near(self, measure: Node, reach: float) -> list[Node]:
+        """
+        Returns symbols of measures that can contain a symbol together with the given measure,
+        only these symbols can be reassigned to it.
+        """
+        box = self._measure_boxes[self._measure_position[measure]]
+        centers = vertical_centers(self._measure_boxes)
+        center = vertical_centers(box[np.newaxis])[0]
+        # slightly widened, rounding must never drop a candidate
+        reach = reach * (1 + 1e-9) + 1e-9
+        near = ((self._measure_boxes[:, LEFT] <= box[RIGHT]) & (self._measure_boxes[:, RIGHT] >= box[LEFT])
+                & (np.abs(centers - center) <= reach))
+        return [symbol for m in np.flatnonzero(near).tolist() for symbol in self._measures[m].children()]
+
+    def _symbols_beyond(self, upper_limit: float) -> list[Node]:
+        """
+        Returns assigned symbols that are not closer to their measure than the limit.
+        """
+        symbols = [symbol for measure in self._measures for symbol in measure.children()]
+        measures = np.array([self._measure_position[self._assignment[symbol]] for symbol in symbols], dtype=np.int64)
+        distance = np.abs(vertical_centers(self._measure_boxes)[measures] - vertical_centers(boxes_from_nodes(symbols)))
+        return [symbols[s] for s in np.flatnonzero(distance >= upper_limit).tolist()]
+
+    def _update_measures(self, changed: list[Node], released: list[Node]) -> list[int]:
+        """
+        Reassigns symbols after measures were changed, released symbols lost their measure.
+        """
+        old_limit = self._upper_limit
+        self._update_measure_index()
+
+        candidates: dict[Node, None] = dict.fromkeys(released)
+        for measure in changed:
+            candidates.update(dict.fromkeys(self._symbols_near(measure, old_limit + self._upper_limit)))
+        # dropped symbols can be assigned to a changed measure or after the limit grows
+        candidates.update(self._dropped)
+        if self._upper_limit < old_limit:
+            candidates.update(dict.fromkeys(self._symbols_beyond(self._upper_limit)))
+
+        symbols = list(candidates)
+        touched = self._unplace(symbols) | self._place(symbols) | set(changed)
+        return self._relink({measure for measure in touched if measure in self._measure_position})
+
+    def _relink(self, touched: set[Node]) -> list[int]:
+        """
+        Links measures of the page, only groups of touched measures are recomputed if the linking did not change.
+        """
+        links = link_page_measures(
+            self._measure_boxes,
+            self._grand_staff_boxes,
+            self.mriou_threshold,
+            link_systems=self.link_systems
+        )
+        link_measures = [tuple(self._measures[m] for m in link.tolist()) for link in links.links]
+        measure_gs = {
+            measure: gs_index
+            for measure, gs_index in zip(self._measures, links.measure_gs_index.tolist())
+            if gs_index != UNSET_GS_INDEX
+        }
+        unchanged = (
+                self._links is not None
+                and link_measures == self._link_measures
+                and links.group_gs == self._links.group_gs
+                and np.array_equal(links.row_offsets, self._links.row_offsets)
+                and measure_gs == self._measure_gs
+        )
+
+        self._links = links
+        self._link_measures = link_measures
+        self._measure_gs = measure_gs
+        self._measure_group = {measure: g for g, link in enumerate(link_measures) for measure in link}
+        if unchanged:
+            return self._refresh_measures(touched)
+
+        for measure in self._measures:
+            gs_index = measure_gs.get(measure)
+            for symbol in measure.children():
+                symbol.gs_index = gs_index
+
+        self._groups = [None] * links.group_count
+        self._group_has_events = np.zeros(links.group_count, dtype=bool)
+        self._tokens = []
+        self._token_offsets = np.zeros(links.group_count + 1, dtype=np.int64)
+        return self._refresh_groups(range(links.group_count))
+
+    def _refresh_measures(self, measures: set[Node]) -> list[int]:
+        return self._refresh_groups({self._measure_group[measure] for measure in measures})
+
+    def _refresh_groups(self, groups) -> list[int]:
+        """
+        Recomputes note events of given measure groups and patches their tokens.
+        """
+        # linearization imports the reconstruction package, importing it at the top would be circular
+        from ..Linearization.GraphToLMX import linearize_measure_group_to_lmx
+
+        groups = sorted(groups)
+        linked_measures: list[VirtualNode] = []
+        for g in groups:
+            node = VirtualNode([symbol for measure in self._link_measures[g] for symbol in measure.children()])
+            node.set_tag(MEASURE_GROUP_GS_TAG, self._links.group_gs[g])
+            linked_measures.append(node)
+
+        for g, group in zip(groups, compute_measure_groups(linked_measures, self.neiou_threshold)):
+            self._groups[g] = group
+            self._group_has_events[g] = any(child.name == NodeName.NOTE_EVENT for child in group.children())
+
+            tokens = linearize_measure_group_to_lmx(group, first=(g == 0))
+            start, end = int(self._token_offsets[g]), int(self._token_offsets[g + 1])
+            self._tokens[start:end] = tokens
+            self._token_offsets[g + 1:] += len(tokens) - (end - start)
+
+        return groups
@@ -0,0 +1,337 @@
+import itertools
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from odtools.Conversions.BoundingBox import Direction
+from .ArrayReconstruction import (MeasureGroupMembers, MeasureLinks, MeasureSections, _group_symbols_by_measure,
+                                  link_measures_in_reading_order, compute_symbol_pitches_and_gs_index,
+                                  set_measure_groups)
+from .Graph.BoxArrays import heights, vertical_centers
+from .Graph.Node import Node
+from .Graph.PageGraph import PageGraph, UNSET_GS_INDEX
+from .Graph.SpatialIndex import HorizontalIntervalIndex
+from .Graph.Strips import SortedSegments
+from .ReconstructionCache import _as_arrays
+from .StaLiXWrapper import refine_measure_boxes
+from ..Linearization.LMXWrapper import LMXWrapper
+from ..SERVal.utils import compute_LMX_metrics
+
+
+def _mask_key(mask: np.ndarray) -> bytes:
+    return np.packbits(mask).tobytes()
+
+
+class SweepPoint:
+    """
+    Single combination of thresholds of a ``ParameterSweep`` and its result.
+
+    ``ser`` holds SER of standardized, reduced, melody and contour format (see ``compute_LMX_metrics``),
+    it is ``None`` when the sweep runs without ground truth.
+    """
+
+    def __init__(
+            self,
+            ual_factor: float,
+            mriou_threshold: float,
+            neiou_threshold: float,
+            shift_threshold_factor: float | None,
+            lmx: LMXWrapper,
+            ser: tuple[float, float, float, float] = None
+    ):
+        self.ual_factor = ual_factor
+        self.mriou_threshold = mriou_threshold
+        self.neiou_threshold = neiou_threshold
+        self.shift_threshold_factor = shift_threshold_factor
+        self.lmx = lmx
+        self.ser = ser
+
+    def to_dict(self) -> dict:
+        output = {
+            "ual_factor": self.ual_factor,
+            "mriou_threshold": self.mriou_threshold,
+            "neiou_threshold": self.neiou_threshold,
+            "shift_threshold_factor": self.shift_threshold_factor,
+            "tokens": len(self.lmx.tokens),
+        }
+        if self.ser is not None:
+            for name, value in zip(("standardized", "reduced", "melody", "contour"), self.ser):
+                output[name] = value
+        return output
+
+
+class _MeasureVariant:
+    """
+    Intermediates shared by all reconstructions with the same measure boxes.
+    """
+
+    def __init__(self, measures: np.ndarray, grand_staffs: np.ndarray, symbols: PageGraph, link_systems: bool):
+        self.measures = measures
+        self.mean_height = np.mean(heights(measures)) if len(measures) > 0 else 0.0
+        self._symbols = symbols
+        self._link_systems = link_systems
+        self._index = HorizontalIntervalIndex(measures)
+        self._measure_centers = vertical_centers(measures)
+        self._symbol_centers = vertical_centers(symbols.boxes)
+        self._sections = MeasureSections(measures, grand_staffs) if len(measures) > 0 else None
+
+        # closest measure of every symbol found within the largest limit so far
+        self._limit = 0.0
+        self._closest = np.full(len(symbols.boxes), -1, dtype=np.int64)
+        self._distance = np.full(len(symbols.boxes), np.inf)
+
+        self._links: dict[bytes, MeasureLinks] = {}
+        self._members: dict[tuple[int, bytes], tuple[MeasureGroupMembers, SortedSegments]] = {}
+        self._strips: dict[tuple[int, bytes, bytes], tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+
+    def reserve(self, ual_factor: float):
+        """
+        Finds the closest measures for the given and all lower upper assignment limit factors at once.
+        """
+        limit = self.mean_height * ual_factor
+        if limit <= self._limit or len(self.measures) == 0:
+            return
+        self._limit = limit
+        self._closest = self._index.assign_closest(self._symbols.boxes, upper_limit=limit)
+        assigned = self._closest >= 0
+        self._distance = np.full(len(self._closest), np.inf)
+        self._distance[assigned] = np.abs(self._measure_centers[self._closest[assigned]]
+                                          - self._symbol_centers[assigned])
+
+    def assignment(self, ual_factor: float) -> tuple[np.ndarray, int]:
+        """
+        Assignment of symbols for the given factor and the number of assigned symbols. Symbols are always assigned
+        to the closest measure and the assigned symbols only grow with the limit,
+        so the number of assigned symbols identifies the assignment.
+        """
+        self.reserve(ual_factor)
+        assigned = self._distance < self.mean_height * ual_factor
+        return np.where(assigned, self._closest, -1), int(np.count_nonzero(assigned))
+
+    def links(self, mriou_threshold: float) -> tuple[bytes, MeasureLinks]:
+        row_breaks = self._sections.row_breaks(mriou_threshold)
+        key = _mask_key(row_breaks)
+        if key not in self._links:
+            reading_order = self._sections.reading_order(row_breaks)
+            self._links[key] = link_measures_in_reading_order(self.measures, reading_order,
+                                                              link_systems=self._link_systems)
+        return key, self._links[key]
+
+    def members(
+            self,
+            assignment: np.ndarray,
+            assigned_count: int,
+            links_key: bytes,
+            linked: MeasureLinks
+    ) -> tuple[MeasureGroupMembers, SortedSegments]:
+        key = (assigned_count, links_key)
+        if key not in self._members:
+            measure_offsets, measure_symbols = _group_symbols_by_measure(assignment, len(self.measures))
+            members = MeasureGroupMembers(self._symbols.names, linked.links, measure_offsets, measure_symbols)
+            sorted_noteheads = SortedSegments(self._symbols.boxes[members.noteheads], members.notehead_offsets,
+                                              direction=Direction.VERTICAL)
+            self._members[key] = (members, sorted_noteheads)
+        return self._members[key]
+
+    def event_strips(
+            self,
+            sorted_noteheads: SortedSegments,
+            neiou_threshold: float,
+            assigned_count: int,
+            links_key: bytes
+    ) -> tuple[bytes, tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        event_breaks = sorted_noteheads.strip_breaks(neiou_threshold)
+        key = (assigned_count, links_key, _mask_key(event_breaks))
+        if key not in self._strips:
+            self._strips[key] = sorted_noteheads.to_strips(event_breaks, check_intersections=True)
+        return key[2], self._strips[key]
+
+
+class ParameterSweep:
+    """
+    Reconstruction of a single page with many combinations of thresholds.
+
+    Work that does not depend on a threshold is done once per page and shared by all combinations:
+    closest measures of symbols are found once for the largest upper assignment limit (lower limits only
+    drop more symbols), measures are sorted into sections once, noteheads of measure groups are sorted once,
+    and thresholds are compared with precomputed IoUs of neighbouring boxes. Reading orders, event strips
+    and LMX are then computed only for distinct outcomes of the thresholds, not for every combination.
+
+    Staff line refinement runs once for every distinct ``shift_threshold_factor``, ``None`` skips the refinement.
+    Results are the same as ``reconstruct_page_graph`` (of the refined measures) with the same thresholds.
+
+    Example usage::
+
+        sweep = ParameterSweep(measures, grand_staffs, noteheads)
+        points = sweep.run([1.2, 1.5, 1.8], [0.4, 0.5], [0.3, 0.4, 0.5], ground_truth=ground_truth_lmx)
+        best = min(points, key=lambda point: point.ser[0])
+    """
+
+    def __init__(
+            self,
+            measures: np.ndarray | list[Node],
+            grand_staffs: np.ndarray | list[Node],
+            symbols: PageGraph | list[Node],
+            image: np.ndarray | str | Path = None,
+            link_systems: bool = True,
+            bin_threshold: int = 200,
+            space_stddev_threshold: float = 0.02
+    ):
+        """
+        :param measures: measures as Mx4 array of boxes or list of nodes
+        :param grand_staffs: grand staffs as Gx4 array of boxes or list of nodes
+        :param symbols: page graph or list of symbols with pitch (noteheads, accidentals), they are not modified
+        :param image: loaded gray image or path to image, required to sweep ``shift_threshold_factor``
+        :param link_systems: link measures of grand staff sections with more than two staffs
+        :param bin_threshold: threshold to use for binarization, see ``refactor_measures_on_page``
+        :param space_stddev_threshold: see ``refactor_measures_on_page``
+        """
+        self.measures, self.grand_staffs, self.symbols = _as_arrays(measures, grand_staffs, symbols)
+        if isinstance(image, str) or isinstance(image, Path):
+            image = cv2.imread(str(image), cv2.IMREAD_GRAYSCALE)
+        self.image = image
+        self.link_systems = link_systems
+        self.bin_threshold = bin_threshold
+        self.space_stddev_threshold = space_stddev_threshold
+
+        self._variants: dict[float | None, _MeasureVariant] = {}
+        self._lmx: dict[tuple, LMXWrapper] = {}
+        self._ser: dict[tuple, tuple[float, float, float, float]] = {}
+
+    def _variant(self, shift_threshold_factor: float | None) -> _MeasureVariant:
+        if shift_threshold_factor not in self._variants:
+            measures = self.measures
+            if shift_threshold_factor is not None:
+                if self.image is None:
+                    raise ValueError("Image is required to sweep shift_threshold_factor.")
+                measures = refine_measure_boxes(
+                    measures,
+                    self.image,
+                    bin_threshold=self.bin_threshold,
+                    space_stddev_threshold=self.space_stddev_threshold,
+                    shift_threshold_factor=shift_threshold_factor
+                )
+            self._variants[shift_threshold_factor] = _MeasureVariant(measures, self.grand_staffs, self.symbols,
+                                                                     self.link_systems)
+        return self._variants[shift_threshold_factor]
+
+    def _reconstruct(
+            self,
+            ual_factor: float,
+            mriou_threshold: float,
+            neiou_threshold: float,
+            shift_threshold_factor: float | None
+    ) -> tuple[tuple, PageGraph]:
+        symbols = self.symbols
+        graph = PageGraph(
+            symbols.boxes, symbols.names,
+            class_ids=symbols.class_ids,
+            confidences=symbols.confidences,
+            pitch=symbols.pitch.copy(),
+            gs_index=symbols.gs_index.copy(),
+            notehead_type=symbols.notehead_type,
+            accidental_type=symbols.accidental_type,
+        )
+
+        variant = self._variant(shift_threshold_factor)
+        if len(variant.measures) == 0:
+            graph.row_offsets = np.zeros(2, dtype=np.int64)
+            return (shift_threshold_factor,), graph
+
+        assignment, assigned_count = variant.assignment(ual_factor)
+        links_key, linked = variant.links(mriou_threshold)
+        members, sorted_noteheads = variant.members(assignment, assigned_count, links_key, linked)
+        events_key, event_strips = variant.event_strips(sorted_noteheads, neiou_threshold, assigned_count, links_key)
+
+        pitch, gs_index = compute_symbol_pitches_and_gs_index(variant.measures, symbols.boxes, assignment,
+                                                              measure_gs_index=linked.measure_gs_index)
+        assigned = assignment >= 0
+        graph.pitch[assigned] = pitch[assigned]
+        in_gs = gs_index != UNSET_GS_INDEX
+        graph.gs_index[in_gs] = gs_index[in_gs]
+
+        set_measure_groups(graph, linked, members, event_strips)
+        return (shift_threshold_factor, assigned_count, links_key, events_key), graph
+
+    def reconstruct_page_graph(
+            self,
+            ual_factor: float = 1.5,
+            mriou_threshold: float = 0.5,
+            neiou_threshold: float = 0.4,
+            shift_threshold_factor: float = None
+    ) -> PageGraph:
+        """
+        Reconstructs the page with the given thresholds, see ``reconstruct_page_graph``.
+
+        :param ual_factor: upper assignment limit factor
+        :param mriou_threshold: measure reading IoU
+        :param neiou_threshold: note event IoU
+        :param shift_threshold_factor: StaLiX shift threshold factor, ``None`` to keep measures as they are
+        :return: page graph, symbol columns are shared with the sweep
+        """
+        return self._reconstruct(ual_factor, mriou_threshold, neiou_threshold, shift_threshold_factor)[1]
+
+    def reconstruct_lmx(
+            self,
+            ual_factor: float = 1.5,
+            mriou_threshold: float = 0.5,
+            neiou_threshold: float = 0.4,
+            shift_threshold_factor: float = None
+    ) -> LMXWrapper:
+        """
+        Reconstructs and linearizes the page with the given thresholds,
+        combinations with the same outcome share a single linearization.
+        """
+        return LMXWrapper(list(self._linearize(ual_factor, mriou_threshold, neiou_threshold,
+                                               shift_threshold_factor)[1].tokens))
+
+    def _linearize(
+            self,
+            ual_factor: float,
+            mriou_threshold: float,
+            neiou_threshold: float,
+            shift_threshold_factor: float | None
+    ) -> tuple[tuple, LMXWrapper]:
+        # linearization imports the reconstruction package, importing it at the top would be circular
+        from ..Linearization.GraphToLMX import linearize_page_graph_to_lmx
+
+        key, graph = self._reconstruct(ual_factor, mriou_threshold, neiou_threshold, shift_threshold_factor)
+        if key not in self._lmx:
+            self._lmx[key] = linearize_page_graph_to_lmx(graph)
+        return key, self._lmx[key]
+
+    def run(
+            self,
+            ual_factors: list[float],
+            mriou_thresholds: list[float],
+            neiou_thresholds: list[float],
+            shift_threshold_factors: list[float | None] = (None,),
+            ground_truth: LMXWrapper = None
+    ) -> list[SweepPoint]:
+        """
+        Evaluates all combinations of the given thresholds.
+
+        :param ual_factors: upper assignment limit factors
+        :param mriou_thresholds: measure reading IoUs
+        :param neiou_thresholds: note event IoUs
+        :param shift_threshold_factors: StaLiX shift threshold factors, ``None`` to keep measures as they are
+        :param ground_truth: optional ground truth LMX, SER is computed for every combination when given
+        :return: one point per combination, in the order of ``itertools.product`` of the given values
+        """
+        if len(ual_factors) > 0:
+            for shift_threshold_factor in shift_threshold_factors:
+                self._variant(shift_threshold_factor).reserve(max(ual_factors))
+
+        points = []
+        grid = itertools.product(shift_threshold_factors, ual_factors, mriou_thresholds, neiou_thresholds)
+        for shift_threshold_factor, ual_factor, mriou_threshold, neiou_threshold in grid:
+            key, lmx = self._linearize(ual_factor, mriou_threshold, neiou_threshold, shift_threshold_factor)
+            ser = None
+            if ground_truth is not None:
+                if key not in self._ser:
+                    self._ser[key] = compute_LMX_metrics(lmx, ground_truth)
+                ser = self._ser[key]
+            points.append(SweepPoint(ual_factor, mriou_threshold, neiou_threshold, shift_threshold_factor,
+                                     LMXWrapper(list(lmx.tokens)), ser))
+        return points
@@ -1,7 +1,12 @@
-from typing import Any
+from typing import Any, Callable
 
-from .Graph.Names import NodeName
+import numpy as np
+
+from .Graph.BoxArrays import as_box_array
+from .Graph.Names import NodeName, NODE_NAME_TO_CODE
 from .Graph.Node import Node
+from .Graph.PageGraph import PageGraph, offsets_from_lengths
+from .Graph.Tags import SYMBOL_PITCH_TAG, SYMBOL_GS_INDEX_TAG, NOTEHEAD_TYPE_TAG, ACCIDENTAL_TYPE_TAG
 from odtools.Conversions.Annotations.Annotation import Annotation
 
 
@@ -84,3 +89,139 @@ def preprocess_annots_for_reconstruction(
             raise ValueError("Unsupported format")
 
     return output
+
+
+# page graph columns of tags known to the array based preprocessing and conversion of their values
+_TAG_COLUMNS: dict[str, tuple[str, Callable[[Any], Any]]] = {
+    SYMBOL_PITCH_TAG: ("pitch", float),
+    SYMBOL_GS_INDEX_TAG: ("gs_index", int),
+    NOTEHEAD_TYPE_TAG: ("notehead_type", lambda t: t.value),
+    ACCIDENTAL_TYPE_TAG: ("accidental_type", lambda t: t.value),
+}
+
+
+def _select_detections(
+        class_ids: np.ndarray,
+        selections: list[tuple[int | list[int], list[Any]]]
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns indices of detections matching given class ids and index of the selection each of them matched,
+    detections are ordered selection after selection, in their input order within a selection.
+    """
+    if len(selections) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    indices: list[np.ndarray] = []
+    selection_ids: list[np.ndarray] = []
+    for i, (selected_ids, _) in enumerate(selections):
+        matching = np.flatnonzero(np.isin(class_ids, np.atleast_1d(selected_ids)))
+        indices.append(matching)
+        selection_ids.append(np.full(len(matching), i, dtype=np.int64))
+    return np.concatenate(indices), np.concatenate(selection_ids)
+
+
+def _tag_columns(
+        tag_names: list[str],
+        selections: list[tuple[int | list[int], list[Any]]],
+        selection_ids: np.ndarray
+) -> dict[str, np.ndarray]:
+    columns: dict[str, np.ndarray] = {}
+    for t, tag_name in enumerate(tag_names):
+        if tag_name not in _TAG_COLUMNS:
+            raise ValueError(f"Tag {tag_name} can not be stored in a page graph")
+        column, convert = _TAG_COLUMNS[tag_name]
+        values = np.array([convert(tag_values[t]) for _, tag_values in selections])
+        columns[column] = values[selection_ids]
+    return columns
+
+
+def preprocess_detections_for_reconstruction(
+        boxes: np.ndarray,
+        class_ids: np.ndarray,
+        data: list[
+            tuple[NodeName, list[str], list[tuple[int | list[int], list[Any]]]]
+            | tuple[NodeName, int | list[int]]],
+        confidences: np.ndarray = None,
+        page_offsets: np.ndarray = None
+) -> list[PageGraph] | list[list[PageGraph]]:
+    """
+    Array version of ``preprocess_annots_for_reconstruction``, takes raw detections
+    of a single page or a batch of pages and returns them as page graphs without creating any per-box objects.
+
+    The specification format is the same, only lists of annotations are replaced
+    by class ids of detections (a single id or a list of them):
+        - ``tuple[NodeName, int | list[int]]``: every detection of the given classes gets this name
+        - ``tuple[NodeName, list[str], list[tuple[int | list[int], list[Any]]]]``:
+            every detection of the given classes gets this name and it will be tagged with the tags
+            given by the ``list[str]`` set to values given by the ``list[Any]``,
+            only tags with a page graph column are supported
+
+    Detections of a batch are selected at once, graphs of individual pages share the selected arrays (as views).
+    Boxes of measures and grand staffs for ``reconstruct_page_graph`` are the ``boxes`` of the respective graphs.
+
+    :param boxes: Nx4 array of (left, top, right, bottom)
+    :param class_ids: class id of each detection
+    :param data: list of preprocessing specifications
+    :param confidences: optional confidence of each detection
+    :param page_offsets: CSR-style offsets of pages in the batch, page ``p`` are detections
+        ``page_offsets[p]:page_offsets[p + 1]``, if not given, all detections are from a single page
+    :return: graph for each specification, for a batch a list of such lists, one for each page
+
+    Example usage::
+
+        measures, grand_staffs, noteheads = preprocess_detections_for_reconstruction(
+            boxes, class_ids,
+            [
+                (NodeName.MEASURE, 0),
+                (NodeName.GRAND_STAFF, 1),
+                (
+                    NodeName.NOTEHEAD, [NOTEHEAD_TYPE_TAG],
+                    [
+                        (2, [NoteheadType.FULL]),
+                        (3, [NoteheadType.HALF])
+                    ]
+                )
+            ]
+        )
+    """
+    boxes = as_box_array(boxes)
+    class_ids = np.asarray(class_ids)
+    if class_ids.shape != (len(boxes),):
+        raise ValueError(f"Expected class ids of shape ({len(boxes)},), got {class_ids.shape}")
+    if confidences is not None:
+        confidences = np.asarray(confidences, dtype=np.float32)
+    single_page = page_offsets is None
+    page_offsets = np.array([0, len(boxes)]) if single_page else np.asarray(page_offsets, dtype=np.int64)
+    page_count = len(page_offsets) - 1
+
+    output: list[list[PageGraph]] = [[] for _ in range(page_count)]
+
+    for dato in data:
+        if len(dato) == 2:
+            name, selected_ids = dato
+            selections = [(selected_ids, [])]
+            tag_names = []
+        elif len(dato) == 3:
+            name, tag_names, selections = dato
+        else:
+            raise ValueError("Unsupported format")
+
+        indices, selection_ids = _select_detections(class_ids, selections)
+        # page after page, keep the selection order inside every page
+        pages = np.searchsorted(page_offsets, indices, side="right") - 1
+        order = np.argsort(pages, kind="stable")
+        indices, selection_ids = indices[order], selection_ids[order]
+
+        graph = PageGraph(
+            boxes[indices],
+            np.full(len(indices), NODE_NAME_TO_CODE[name]),
+            class_ids=class_ids[indices],
+            confidences=confidences[indices] if confidences is not None else None,
+            **_tag_columns(tag_names, selections, selection_ids)
+        )
+
+        page_starts = offsets_from_lengths(np.bincount(pages, minlength=page_count))
+        for p, (start, end) in enumerate(zip(page_starts[:-1], page_starts[1:])):
+            output[p].append(graph.slice_symbols(start, end))
+
+    return output[0] if single_page else output
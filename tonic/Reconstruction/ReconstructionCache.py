@@ -0,0 +1,321 @@
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+
+from .ArrayReconstruction import reconstruct_page_graph
+from .Graph.BoxArrays import as_box_array, boxes_from_nodes
+from .Graph.Names import NODE_NAME_TO_CODE
+from .Graph.Node import Node, VirtualNode
+from .Graph.PageGraph import PageGraph
+from .Graph.Serialization import PAGE_GRAPH_FORMAT_VERSION, save_page_graph, load_page_graph
+from ..Linearization.LMXWrapper import LMXWrapper
+
+# increased whenever the reconstruction changes its results, old entries on disk are then never hit
+RECONSTRUCTION_CACHE_VERSION = 1
+
+# symbol columns that influence the reconstruction
+_SYMBOL_COLUMNS = (
+    "boxes", "names", "class_ids", "confidences", "pitch", "gs_index", "notehead_type", "accidental_type",
+)
+# all arrays of a reconstructed graph
+_GRAPH_COLUMNS = _SYMBOL_COLUMNS + (
+    "row_offsets", "group_offsets", "group_items", "group_item_is_event", "group_gs",
+    "event_offsets", "event_symbols",
+)
+
+# kinds of cached results
+_GRAPH = "graph"
+_LMX = "lmx"
+
+_DISK_SUFFIX = {
+    _GRAPH: ".npz",
+    _LMX: ".lmx",
+}
+
+
+def _update_digest(digest, array: np.ndarray):
+    array = np.ascontiguousarray(array)
+    digest.update(f"{array.dtype.str}{array.shape}".encode())
+    digest.update(array.data)
+
+
+def reconstruction_key(
+        measures: np.ndarray,
+        grand_staffs: np.ndarray,
+        symbols: PageGraph,
+        ual_factor: float = 1.5,
+        mriou_threshold: float = 0.5,
+        neiou_threshold: float = 0.4,
+        link_systems: bool = True
+) -> str:
+    """
+    Computes a key of a page from the content of its detections and reconstruction parameters,
+    the same detections with the same parameters always get the same key.
+
+    :param measures: Mx4 array of measure boxes
+    :param grand_staffs: Gx4 array of grand staff boxes
+    :param symbols: page graph with symbols
+    :param ual_factor: upper assignment limit factor
+    :param mriou_threshold: measure reading IoU
+    :param neiou_threshold: note event IoU
+    :param link_systems: link measures of grand staff sections with more than two staffs
+    :return: hexadecimal digest
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{RECONSTRUCTION_CACHE_VERSION}:{PAGE_GRAPH_FORMAT_VERSION}".encode())
+    digest.update(",".join(name.value for name in NODE_NAME_TO_CODE).encode())
+    _update_digest(digest, as_box_array(measures))
+    _update_digest(digest, as_box_array(grand_staffs))
+    for column in _SYMBOL_COLUMNS:
+        _update_digest(digest, getattr(symbols, column))
+    digest.update(repr((float(ual_factor), float(mriou_threshold), float(neiou_threshold), bool(link_systems))).encode())
+    return digest.hexdigest()
+
+
+def _freeze_graph(graph: PageGraph) -> PageGraph:
+    """
+    Detaches the graph from arrays of the caller and makes it read-only, cached graphs are shared.
+    """
+    for column in _SYMBOL_COLUMNS:
+        setattr(graph, column, np.array(getattr(graph, column)))
+    for column in _GRAPH_COLUMNS:
+        getattr(graph, column).setflags(write=False)
+    return graph
+
+
+def _entry_size(kind: str, value: Any) -> int:
+    if kind == _GRAPH:
+        return sum(getattr(value, column).nbytes for column in _GRAPH_COLUMNS)
+    return sys.getsizeof(value) + sum(sys.getsizeof(token) for token in value)
+
+
+class ReconstructionCache:
+    """
+    Memoized reconstruction, results are kept in a LRU cache keyed by ``reconstruction_key``
+    of the detections and parameters, so repeated reconstruction of the same page is almost free.
+
+    Both reconstructed page graphs and LMX tokens are cached. The cache holds at most ``max_memory`` bytes
+    of results (least recently used results are evicted first), optionally results are also stored in
+    ``directory`` and survive the process, the directory can be shared by many processes.
+
+    Cached page graphs are shared between calls and read-only. Counters ``hits``, ``disk_hits`` and ``misses``
+    count lookups of both graphs and tokens, tokens missing in the cache are linearized from a (cached) graph.
+
+    Example usage::
+
+        cache = ReconstructionCache(max_memory=64 * 2 ** 20, directory="cache")
+        tokens = cache.reconstruct_lmx(measures, grand_staffs, noteheads).tokens
+        print(cache.hits, cache.misses)
+    """
+
+    def __init__(self, max_memory: int = 256 * 2 ** 20, directory: Path | str = None):
+        """
+        :param max_memory: maximum size of cached results in memory in bytes
+        :param directory: optional directory for persistent storage of results
+        """
+        self.max_memory = max_memory
+        self.directory = Path(directory) if directory is not None else None
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+        self._entries: OrderedDict[tuple[str, str], tuple[Any, int]] = OrderedDict()
+        self._memory = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def memory(self) -> int:
+        """
+        Size of results cached in memory in bytes.
+        """
+        return self._memory
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.disk_hits + self.misses
+        return (self.hits + self.disk_hits) / lookups if lookups > 0 else 0.0
+
+    def clear(self):
+        """
+        Drops all results cached in memory, results stored on disk are kept.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._memory = 0
+
+    def reconstruct_page_graph(
+            self,
+            measures: np.ndarray | list[Node],
+            grand_staffs: np.ndarray | list[Node],
+            symbols: PageGraph | list[Node],
+            ual_factor: float = 1.5,
+            mriou_threshold: float = 0.5,
+            neiou_threshold: float = 0.4,
+            link_systems: bool = True,
+            executor: Executor = None
+    ) -> PageGraph:
+        """
+        Memoized ``reconstruct_page_graph``, detections can also be given as lists of nodes.
+
+        :return: read-only page graph
+        """
+        measures, grand_staffs, symbols = _as_arrays(measures, grand_staffs, symbols)
+        key = reconstruction_key(measures, grand_staffs, symbols, ual_factor, mriou_threshold, neiou_threshold,
+                                 link_systems)
+        return self._get(_GRAPH, key, lambda: _freeze_graph(reconstruct_page_graph(
+            measures, grand_staffs, symbols,
+            ual_factor=ual_factor,
+            mriou_threshold=mriou_threshold,
+            neiou_threshold=neiou_threshold,
+            link_systems=link_systems,
+            executor=executor
+        )))
+
+    def reconstruct_lmx(
+            self,
+            measures: np.ndarray | list[Node],
+            grand_staffs: np.ndarray | list[Node],
+            symbols: PageGraph | list[Node],
+            ual_factor: float = 1.5,
+            mriou_threshold: float = 0.5,
+            neiou_threshold: float = 0.4,
+            link_systems: bool = True,
+            executor: Executor = None
+    ) -> LMXWrapper:
+        """
+        Memoized reconstruction followed by linearization, the same tokens as ``linearize_note_events_to_lmx``
+        of the result of ``reconstruct_note_events``.
+        """
+        # linearization imports the reconstruction package, importing it at the top would be circular
+        from ..Linearization.GraphToLMX import linearize_page_graph_to_lmx
+
+        measures, grand_staffs, symbols = _as_arrays(measures, grand_staffs, symbols)
+        key = reconstruction_key(measures, grand_staffs, symbols, ual_factor, mriou_threshold, neiou_threshold,
+                                 link_systems)
+        tokens = self._get(_LMX, key, lambda: linearize_page_graph_to_lmx(self.reconstruct_page_graph(
+            measures, grand_staffs, symbols,
+            ual_factor=ual_factor,
+            mriou_threshold=mriou_threshold,
+            neiou_threshold=neiou_threshold,
+            link_systems=link_systems,
+            executor=executor
+        )).tokens)
+        return LMXWrapper(list(tokens))
+
+    def reconstruct_note_events(
+            self,
+            measures: list[Node],
+            grand_staffs: list[Node],
+            symbols_with_pitch: list[Node],
+            ual_factor: float = 1.5,
+            mriou_threshold: float = 0.5,
+            neiou_threshold: float = 0.4,
+            link_systems: bool = True,
+            executor: Executor = None
+    ) -> list[list[VirtualNode]]:
+        """
+        Memoized ``reconstruct_note_events``. Pitch and grand staff index of given symbols are set
+        and returned note events contain the given symbols, measures are not modified.
+        """
+        graph = self.reconstruct_page_graph(
+            measures, grand_staffs, symbols_with_pitch,
+            ual_factor=ual_factor,
+            mriou_threshold=mriou_threshold,
+            neiou_threshold=neiou_threshold,
+            link_systems=link_systems,
+            executor=executor
+        )
+        return graph.to_note_events(nodes=symbols_with_pitch)
+
+    def _get(self, kind: str, key: str, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = self._entries.get((kind, key))
+            if entry is not None:
+                self._entries.move_to_end((kind, key))
+                self.hits += 1
+                return entry[0]
+
+        value = self._load(kind, key)
+        if value is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            value = compute()
+            self._store(kind, key, value)
+
+        self._put(kind, key, value)
+        return value
+
+    def _put(self, kind: str, key: str, value: Any):
+        size = _entry_size(kind, value)
+        if size > self.max_memory:
+            return
+
+        with self._lock:
+            previous = self._entries.pop((kind, key), None)
+            if previous is not None:
+                self._memory -= previous[1]
+            self._entries[(kind, key)] = (value, size)
+            self._memory += size
+
+            while self._memory > self.max_memory:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._memory -= evicted_size
+                self.evictions += 1
+
+    def _path(self, kind: str, key: str) -> Path:
+        return self.directory / f"{key}{_DISK_SUFFIX[kind]}"
+
+    def _load(self, kind: str, key: str) -> Any:
+        if self.directory is None:
+            return None
+        path = self._path(kind, key)
+        if not path.exists():
+            return None
+
+        if kind == _GRAPH:
+            return _freeze_graph(load_page_graph(path, mmap=False))
+        with open(path, "r", encoding="utf8") as file:
+            return file.read().split()
+
+    def _store(self, kind: str, key: str, value: Any):
+        if self.directory is None:
+            return
+        path = self._path(kind, key)
+        # written under a temporary name, other processes never see partially written files
+        temporary = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+        if kind == _GRAPH:
+            save_page_graph(value, temporary)
+        else:
+            with open(temporary, "w", encoding="utf8") as file:
+                file.write(" ".join(value))
+        os.replace(temporary, path)
+
+
+def _as_arrays(
+        measures: np.ndarray | list[Node],
+        grand_staffs: np.ndarray | list[Node],
+        symbols: PageGraph | list[Node]
+) -> tuple[np.ndarray, np.ndarray, PageGraph]:
+    if not isinstance(measures, np.ndarray):
+        measures = boxes_from_nodes(measures)
+    if not isinstance(grand_staffs, np.ndarray):
+        grand_staffs = boxes_from_nodes(grand_staffs)
+    if not isinstance(symbols, PageGraph):
+        symbols = PageGraph.from_nodes(symbols)
+    return measures, grand_staffs, symbols
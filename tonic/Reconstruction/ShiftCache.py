@@ -0,0 +1,185 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+from .Graph.BoxArrays import as_box_array
+
+# increased whenever staff line detection changes its results, old entries on disk are then never hit
+SHIFT_CACHE_VERSION = 1
+
+
+def image_key(image: np.ndarray | str | Path) -> str:
+    """
+    Computes a key of an image from its content. Images given by path are keyed by the bytes of the file,
+    so cached shifts of a page can be found without decoding it. The same image given as a path
+    and as a loaded array gets different keys.
+
+    :param image: loaded gray image or path to image
+    :return: hexadecimal digest
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    if isinstance(image, str) or isinstance(image, Path):
+        digest.update(b"file")
+        with open(image, "rb") as file:
+            for chunk in iter(lambda: file.read(2 ** 20), b""):
+                digest.update(chunk)
+    else:
+        image = np.ascontiguousarray(image)
+        digest.update(f"array{image.dtype.str}{image.shape}".encode())
+        digest.update(image.data)
+    return digest.hexdigest()
+
+
+def _page_key(image_digest: str, parameters: dict) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{SHIFT_CACHE_VERSION}:{image_digest}".encode())
+    digest.update(repr(sorted(parameters.items())).encode())
+    return digest.hexdigest()
+
+
+class ShiftCache:
+    """
+    Content-addressed cache of (top, bottom) shifts of measures found by staff line detection,
+    pass an instance to ``refactor_measures_on_page`` or ``refine_measure_boxes``.
+
+    Shifts are keyed by ``image_key`` of the page, the box of the measure and parameters of the detection,
+    so rerunning the pipeline on unchanged scans skips detection of every measure whose box did not change.
+    The cache holds at most ``max_entries`` shifts in memory (least recently used shifts are evicted first),
+    optionally shifts are also stored in ``directory``, one file per page and parameters,
+    and survive the process. Pages whose shifts are all cached are not even decoded.
+
+    Counters ``hits``, ``disk_hits`` and ``misses`` count looked up measures.
+
+    Example usage::
+
+        cache = ShiftCache(directory="shifts")
+        for image_path, measures in pages:
+            refactor_measures_on_page(measures, image_path, shift_cache=cache)
+        print(cache.hit_rate)
+    """
+
+    def __init__(self, max_entries: int = 2 ** 20, directory: Path | str = None):
+        """
+        :param max_entries: maximum number of measure shifts kept in memory
+        :param directory: optional directory for persistent storage of shifts
+        """
+        self.max_entries = max_entries
+        self.directory = Path(directory) if directory is not None else None
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+        self._entries: OrderedDict[tuple[str, tuple[int, int, int, int]], tuple[int, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.disk_hits + self.misses
+        return (self.hits + self.disk_hits) / lookups if lookups > 0 else 0.0
+
+    def clear(self):
+        """
+        Drops all shifts cached in memory, shifts stored on disk are kept.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def compute_shifts(
+            self,
+            image: np.ndarray | str | Path,
+            measures: np.ndarray,
+            compute: Callable[[np.ndarray], np.ndarray],
+            parameters: dict,
+            image_digest: str = None
+    ) -> tuple[np.ndarray, int]:
+        """
+        Returns shifts of all measures, ``compute`` is called only with boxes of measures missing in the cache.
+
+        :param image: loaded gray image or path to image, only used for its key
+        :param measures: Mx4 array of measure boxes
+        :param compute: computes Kx2 array of (top, bottom) shifts of the given Kx4 boxes
+        :param parameters: parameters of the detection, shifts computed with other parameters are never returned
+        :param image_digest: precomputed ``image_key`` of the image
+        :return: Mx2 array of (top, bottom) shifts and the number of measures computed by ``compute``
+        """
+        measures = as_box_array(measures)
+        page = _page_key(image_digest if image_digest is not None else image_key(image), parameters)
+        boxes = [tuple(box) for box in measures.astype(np.int64).tolist()]
+
+        shifts = np.zeros((len(boxes), 2), dtype=np.int64)
+        missing = []
+        with self._lock:
+            for m, box in enumerate(boxes):
+                entry = self._entries.get((page, box))
+                if entry is None:
+                    missing.append(m)
+                    continue
+                self._entries.move_to_end((page, box))
+                shifts[m] = entry
+            self.hits += len(boxes) - len(missing)
+
+        if len(missing) == 0:
+            return shifts, 0
+
+        stored = self._load(page)
+        computed = []
+        for m in missing:
+            entry = stored.get(boxes[m])
+            if entry is None:
+                computed.append(m)
+            else:
+                shifts[m] = entry
+        self.disk_hits += len(missing) - len(computed)
+        self.misses += len(computed)
+
+        if len(computed) > 0:
+            shifts[computed] = np.asarray(compute(measures[computed]), dtype=np.int64).reshape(len(computed), 2)
+            if self.directory is not None:
+                stored.update((boxes[m], tuple(shifts[m].tolist())) for m in computed)
+                self._store(page, stored)
+
+        with self._lock:
+            for m in missing:
+                self._entries[(page, boxes[m])] = tuple(shifts[m].tolist())
+                self._entries.move_to_end((page, boxes[m]))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return shifts, len(computed)
+
+    def _path(self, page: str) -> Path:
+        return self.directory / f"{page}.npz"
+
+    def _load(self, page: str) -> dict[tuple[int, int, int, int], tuple[int, int]]:
+        if self.directory is None:
+            return {}
+        path = self._path(page)
+        if not path.exists():
+            return {}
+
+        with np.load(path) as data:
+            return {tuple(box): tuple(shift) for box, shift in zip(data["boxes"].tolist(), data["shifts"].tolist())}
+
+    def _store(self, page: str, stored: dict[tuple[int, int, int, int], tuple[int, int]]):
+        path = self._path(page)
+        # written under a temporary name, other processes never see partially written files,
+        # concurrent writers of the same page may lose each other's shifts, which are then only recomputed
+        temporary = path.with_name(f"{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp.npz")
+        np.savez(
+            temporary,
+            boxes=np.array(list(stored.keys()), dtype=np.int64).reshape(-1, 4),
+            shifts=np.array(list(stored.values()), dtype=np.int64).reshape(-1, 2)
+        )
+        os.replace(temporary, path)
@@ -1,3 +1,7 @@
+import os
+from collections import deque
+from timeit import default_timer as timer
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
 from pathlib import Path
 
 import cv2
@@ -6,6 +10,11 @@ from odtools import BoundingBox
 from stalix import compute_shift_for_measure
 
 from .Graph import Node
+from .Graph.BoxArrays import LEFT, TOP, RIGHT, BOTTOM, as_box_array, boxes_from_nodes
+from .ShiftCache import ShiftCache
+from .StaffLines import select_measures_to_refine, share_row_shifts
+from .Stats import (PipelineStats, count, measure_stage, STAGE_STAFF_LINE_REFINEMENT, COUNT_REFINED_MEASURES,
+                    COUNT_DETECTED_MEASURES, COUNT_ROW_CORRECTED_MEASURES, COUNT_CACHED_MEASURES)
 
 
 def _refactor_measure_bbox(
@@ -23,6 +32,117 @@ def _refactor_measure_bbox(
     measure.annot.bbox = new_bbox
 
 
+def _load_image(bw_image: np.ndarray | str | Path) -> np.ndarray:
+    if isinstance(bw_image, str) or isinstance(bw_image, Path):
+        return cv2.imread(str(bw_image), cv2.IMREAD_GRAYSCALE)
+    return bw_image
+
+
+def _compute_measure_shifts(
+        loaded_image: np.ndarray,
+        boxes: np.ndarray,
+        workers: int,
+        max_pending_measures: int | None,
+        executor: Executor | None,
+        **parameters
+) -> list[tuple[int, int]]:
+    """
+    Computes (top, bottom) shift of every measure box, in the order of the boxes.
+
+    Crops are refined sequentially unless ``workers`` or ``executor`` is given, then only a bounded number
+    of crops is in flight and shifts are collected in submission order, so the result does not depend
+    on the order in which workers finish.
+    """
+
+    def _crop(box: np.ndarray) -> np.ndarray:
+        return loaded_image[box[TOP]:box[BOTTOM], box[LEFT]:box[RIGHT]]
+
+    if workers == 0 and executor is None:
+        return [compute_shift_for_measure(_crop(box), **parameters) for box in boxes]
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=workers)
+    if max_pending_measures is None:
+        max_pending_measures = 4 * (workers or os.cpu_count() or 1)
+
+    shifts: list[tuple[int, int]] = []
+    pending: deque[Future] = deque()
+    try:
+        for box in boxes:
+            if len(pending) >= max_pending_measures:
+                shifts.append(pending.popleft().result())
+            pending.append(executor.submit(compute_shift_for_measure, _crop(box), **parameters))
+        while len(pending) > 0:
+            shifts.append(pending.popleft().result())
+    finally:
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
+    return shifts
+
+
+def _compute_gated_shifts(
+        bw_image: np.ndarray | str | Path,
+        boxes: np.ndarray,
+        adaptive: bool,
+        height_tolerance: float,
+        alignment_tolerance: float,
+        shift_cache: ShiftCache | None,
+        workers: int,
+        max_pending_measures: int | None,
+        executor: Executor | None,
+        **parameters
+) -> tuple[np.ndarray, int, int]:
+    """
+    Computes Mx2 array of (top, bottom) shifts of all measure boxes. In the adaptive mode staff lines
+    are detected only in measures picked by ``select_measures_to_refine``, the others are corrected
+    from their rows by ``share_row_shifts``. Shifts found in ``shift_cache`` are not detected again,
+    the image is loaded only when some shift is missing.
+
+    :return: shifts, the number of measures in which staff lines were detected
+        and the number of measures corrected from their rows
+    """
+    loaded_image = None
+
+    def _detect(detected_boxes: np.ndarray) -> np.ndarray:
+        nonlocal loaded_image
+        if loaded_image is None:
+            loaded_image = _load_image(bw_image)
+        shifts = _compute_measure_shifts(loaded_image, detected_boxes, workers, max_pending_measures, executor,
+                                         **parameters)
+        return np.asarray(shifts, dtype=np.int64).reshape(len(detected_boxes), 2)
+
+    def _detect_or_cached(detected_boxes: np.ndarray) -> tuple[np.ndarray, int]:
+        if shift_cache is None:
+            return _detect(detected_boxes), len(detected_boxes)
+        return shift_cache.compute_shifts(bw_image, detected_boxes, _detect, {
+            "bin_threshold": parameters["bin_threshold"],
+            "space_stddev_threshold": parameters["space_stddev_threshold"],
+            "shift_threshold_factor": parameters["shift_threshold_factor"],
+        })
+
+    if not adaptive:
+        return *_detect_or_cached(boxes), 0
+
+    selected, anchors, rows = select_measures_to_refine(boxes, height_tolerance, alignment_tolerance)
+
+    start = timer()
+    shifts = np.zeros((len(boxes), 2), dtype=np.int64)
+    shifts[selected], detected = _detect_or_cached(boxes[selected])
+    detection_time = timer() - start
+
+    shifts = share_row_shifts(boxes, shifts, selected, anchors, rows, parameters["shift_threshold_factor"])
+    shared = len(boxes) - int(selected.sum())
+    if parameters["verbose"]:
+        message = (f"Detected staff lines in {detected}/{len(boxes)} measures, "
+                   f"{len(boxes) - detected - shared} cached, {shared} corrected from their rows")
+        # without any detection on this page there is no time per measure to estimate from
+        if detected > 0:
+            message += f", estimated {detection_time / detected * shared:.3f} s saved"
+        print(message)
+    return shifts, detected, shared
+
+
 def refactor_measures_on_page(
         measures: list[Node],
         bw_image: np.ndarray | str | Path,
@@ -30,37 +150,137 @@ def refactor_measures_on_page(
         space_stddev_threshold: float = 0.02,
         shift_threshold_factor: float = 0.25,
         verbose: bool = False,
-        visualize: bool = False
+        visualize: bool = False,
+        stats: PipelineStats = None,
+        workers: int = 0,
+        max_pending_measures: int = None,
+        executor: Executor = None,
+        adaptive: bool = False,
+        height_tolerance: float = 0.1,
+        alignment_tolerance: float = 0.1,
+        shift_cache: ShiftCache = None
 ):
     """
     Goes over all given measures and refactors them according to detected staff lines.
 
+    Staff lines detection works with NumPy and OpenCV on independent crops, which release the GIL,
+    so measures can be refined concurrently by a thread pool. Boxes of measures are always updated
+    in the order of the measures, the result is the same as with sequential refinement.
+
+    With ``adaptive``, staff lines are detected only in measures that do not fit their staff row
+    and in a few anchors of each row, the remaining measures take edges interpolated between the anchors.
+    The share of measures with detected staff lines is counted in ``stats``, see ``select_measures_to_refine``.
+    The adaptive mode is experimental and off by default, its effect on SER was not evaluated on real pages.
+
+    With ``shift_cache``, shifts of measures refined before on the same image with the same parameters
+    are reused, see ``ShiftCache``.
+
     :param measures: measures to be refactored
     :param bw_image: loaded gray image or path to image
     :param bin_threshold: threshold to use for binarization
     :param space_stddev_threshold: found staff lines with stddev of their spaces above this threshold will be ignored
     :param shift_threshold_factor: shifts larger than this fraction of the measure height will be ignored
     :param verbose: make script verbose
-    :param visualize: visualize process
+    :param visualize: visualize process, measures are then always refined sequentially
+    :param stats: optional statistics filled in with the time of refinement and the number of shifted measures
+    :param workers: number of worker threads, 0 refines measures sequentially in this thread
+    :param max_pending_measures: maximum number of measures in flight, four per worker by default
+    :param executor: optional executor to use instead of creating a new thread pool
+    :param adaptive: detect staff lines only in measures not aligned with their row (experimental)
+    :param height_tolerance: allowed relative deviation of measure height from its row median in the adaptive mode
+    :param alignment_tolerance: allowed distance of measure edges from its neighbours in the adaptive mode,
+        relative to the row median height
+    :param shift_cache: optional cache of shifts, staff lines are detected only in measures missing in it
     """
     # skip loading image when no measures were found
     if len(measures) == 0:
         return
 
-    if isinstance(bw_image, str) or isinstance(bw_image, Path):
-        loaded_image: np.ndarray = cv2.imread(str(bw_image), cv2.IMREAD_GRAYSCALE)
-    else:
-        loaded_image: np.ndarray = bw_image
-
-    for measure in measures:
-        bbox = measure.annot.bbox
-        cropped_image = loaded_image[bbox.top:bbox.bottom, bbox.left:bbox.right]
-        top_shift, bottom_shift = compute_shift_for_measure(
-            cropped_image,
+    if visualize:
+        workers, executor = 0, None
+
+    with measure_stage(stats, STAGE_STAFF_LINE_REFINEMENT):
+        shifts, detected, shared = _compute_gated_shifts(
+            bw_image,
+            boxes_from_nodes(measures),
+            adaptive,
+            height_tolerance,
+            alignment_tolerance,
+            shift_cache,
+            workers,
+            max_pending_measures,
+            executor,
             bin_threshold=bin_threshold,
             space_stddev_threshold=space_stddev_threshold,
             shift_threshold_factor=shift_threshold_factor,
             verbose=verbose,
             visualize=visualize
         )
-        _refactor_measure_bbox(measure, top_shift, bottom_shift)
+        refined = 0
+        for measure, (top_shift, bottom_shift) in zip(measures, shifts.tolist()):
+            _refactor_measure_bbox(measure, top_shift, bottom_shift)
+            refined += top_shift != 0 or bottom_shift != 0
+    count(stats, COUNT_REFINED_MEASURES, refined)
+    count(stats, COUNT_DETECTED_MEASURES, detected)
+    count(stats, COUNT_ROW_CORRECTED_MEASURES, shared)
+    count(stats, COUNT_CACHED_MEASURES, len(measures) - detected - shared)
+
+
+def refine_measure_boxes(
+        measures: np.ndarray,
+        bw_image: np.ndarray | str | Path,
+        bin_threshold: int = 200,
+        space_stddev_threshold: float = 0.02,
+        shift_threshold_factor: float = 0.25,
+        verbose: bool = False,
+        workers: int = 0,
+        max_pending_measures: int = None,
+        executor: Executor = None,
+        adaptive: bool = False,
+        height_tolerance: float = 0.1,
+        alignment_tolerance: float = 0.1,
+        shift_cache: ShiftCache = None
+) -> np.ndarray:
+    """
+    Array version of ``refactor_measures_on_page``, the given boxes are not modified.
+
+    :param measures: Mx4 array of measure boxes
+    :param bw_image: loaded gray image or path to image
+    :param bin_threshold: threshold to use for binarization
+    :param space_stddev_threshold: found staff lines with stddev of their spaces above this threshold will be ignored
+    :param shift_threshold_factor: shifts larger than this fraction of the measure height will be ignored
+    :param verbose: make script verbose
+    :param workers: number of worker threads, 0 refines measures sequentially in this thread
+    :param max_pending_measures: maximum number of measures in flight, four per worker by default
+    :param executor: optional executor to use instead of creating a new thread pool
+    :param adaptive: detect staff lines only in measures not aligned with their row (experimental)
+    :param height_tolerance: allowed relative deviation of measure height from its row median in the adaptive mode
+    :param alignment_tolerance: allowed distance of measure edges from its neighbours in the adaptive mode,
+        relative to the row median height
+    :param shift_cache: optional cache of shifts, staff lines are detected only in measures missing in it
+    :return: Mx4 array of refined measure boxes
+    """
+    refined = as_box_array(measures).copy()
+    if len(refined) == 0:
+        return refined
+
+    shifts, _, _ = _compute_gated_shifts(
+        bw_image,
+        refined,
+        adaptive,
+        height_tolerance,
+        alignment_tolerance,
+        shift_cache,
+        workers,
+        max_pending_measures,
+        executor,
+        bin_threshold=bin_threshold,
+        space_stddev_threshold=space_stddev_threshold,
+        shift_threshold_factor=shift_threshold_factor,
+        verbose=verbose,
+        visualize=False
+    )
+    shifts = shifts.astype(refined.dtype)
+    refined[:, TOP] += shifts[:, 0]
+    refined[:, BOTTOM] -= shifts[:, 1]
+    return refined
@@ -0,0 +1,109 @@
+import numpy as np
+
+from odtools.Conversions.BoundingBox import Direction
+from .Graph.BoxArrays import LEFT, TOP, RIGHT, BOTTOM, as_box_array
+from .Graph.Strips import sort_boxes_to_strips, split_order_to_strips
+
+
+def select_measures_to_refine(
+        measures: np.ndarray,
+        height_tolerance: float = 0.1,
+        alignment_tolerance: float = 0.1,
+        anchors_per_row: int = 2,
+        row_iou_threshold: float = 0.5
+) -> tuple[np.ndarray, np.ndarray, list[np.ndarray]]:
+    """
+    Picks measures whose staff lines have to be detected, the rest can be corrected from their row.
+
+    Measures are sorted into staff rows. A measure is an outlier when its height differs from the median height
+    of its row by more than ``height_tolerance`` of the median, or when its top or bottom edge is further
+    than ``alignment_tolerance`` of the median height from the same edge of both of its neighbours in the row.
+    Outliers and ``anchors_per_row`` inliers spread over each row (the first and the last one for two anchors)
+    are selected, rows too short to save any detection are selected whole.
+
+    :param measures: Mx4 array of measure boxes
+    :param height_tolerance: allowed relative deviation of measure height from the row median
+    :param alignment_tolerance: allowed distance of top and bottom edges from neighbours, relative to row median height
+    :param anchors_per_row: number of inliers refined in every row, see ``share_row_shifts``
+    :param row_iou_threshold: vertical IoU of measures in the same staff row
+    :return: mask of selected measures, mask of anchors and rows of measure indices sorted from left to right
+    """
+    measures = as_box_array(measures)
+    selected = np.zeros(len(measures), dtype=bool)
+    anchors = np.zeros(len(measures), dtype=bool)
+    if len(measures) == 0:
+        return selected, anchors, []
+
+    labels, order = sort_boxes_to_strips(measures, row_iou_threshold, direction=Direction.HORIZONTAL)
+    rows = [row[np.argsort(measures[row, LEFT], kind="stable")] for row in split_order_to_strips(labels, order)]
+    for row in rows:
+        if len(row) <= anchors_per_row + 1:
+            selected[row] = True
+            continue
+
+        boxes = measures[row]
+        heights = boxes[:, BOTTOM] - boxes[:, TOP]
+        median_height = np.median(heights)
+        outliers = np.abs(heights - median_height) > height_tolerance * median_height
+
+        # distance of each edge to the closer of the same edges of its neighbours,
+        # the first and the last measure of the row have a single neighbour
+        for edge in (TOP, BOTTOM):
+            distances = np.abs(np.diff(boxes[:, edge])).astype(np.float64)
+            closest = np.minimum(np.append(distances, np.inf), np.insert(distances, 0, np.inf))
+            outliers |= closest > alignment_tolerance * median_height
+
+        inliers = np.flatnonzero(~outliers)
+        if len(inliers) <= anchors_per_row:
+            selected[row] = True
+            continue
+        row_anchors = row[inliers[np.linspace(0, len(inliers) - 1, anchors_per_row).round().astype(int)]]
+        anchors[row_anchors] = True
+        selected[row_anchors] = True
+        selected[row[outliers]] = True
+    return selected, anchors, rows
+
+
+def share_row_shifts(
+        measures: np.ndarray,
+        shifts: np.ndarray,
+        selected: np.ndarray,
+        anchors: np.ndarray,
+        rows: list[np.ndarray],
+        shift_threshold_factor: float = 0.25
+) -> np.ndarray:
+    """
+    Completes shifts of measures not selected by ``select_measures_to_refine`` from their row.
+
+    Refined top and bottom edges of the anchors of each row are interpolated linearly along the row
+    at the centers of the remaining measures, so rows of skewed pages get skewed edges. Outliers are never
+    anchors, their boxes are not trusted even when no staff lines were found in them.
+    Shifts larger than ``shift_threshold_factor`` of the measure height are ignored as in the detection.
+
+    :param measures: Mx4 array of measure boxes
+    :param shifts: Mx2 array of (top, bottom) shifts, filled in for the selected measures
+    :param selected: mask of selected measures
+    :param anchors: mask of selected measures the others are corrected from
+    :param rows: rows of measure indices sorted from left to right
+    :param shift_threshold_factor: shifts larger than this fraction of the measure height are ignored
+    :return: Mx2 array of (top, bottom) shifts of all measures
+    """
+    measures = as_box_array(measures)
+    shifts = np.array(shifts, dtype=np.int64).reshape(len(measures), 2)
+    centers = (measures[:, LEFT] + measures[:, RIGHT]) / 2
+    for row in rows:
+        shared, row_anchors = row[~selected[row]], row[anchors[row]]
+        if len(shared) == 0:
+            continue
+        row_anchors = row_anchors[np.argsort(centers[row_anchors], kind="stable")]
+
+        tops = np.interp(centers[shared], centers[row_anchors],
+                         measures[row_anchors, TOP] + shifts[row_anchors, 0])
+        bottoms = np.interp(centers[shared], centers[row_anchors],
+                            measures[row_anchors, BOTTOM] - shifts[row_anchors, 1])
+        row_shifts = np.round(np.stack([tops - measures[shared, TOP], measures[shared, BOTTOM] - bottoms],
+                                       axis=1)).astype(np.int64)
+
+        limit = shift_threshold_factor * (measures[shared, BOTTOM] - measures[shared, TOP])
+        shifts[shared] = np.where(np.abs(row_shifts) <= limit[:, np.newaxis], row_shifts, 0)
+    return shifts
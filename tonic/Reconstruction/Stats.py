@@ -0,0 +1,161 @@
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, ContextManager, Iterator, Self
+
+# names of stages filled in by the reconstruction
+STAGE_ASSIGNMENT = "assignment"
+STAGE_PITCH = "pitch"
+STAGE_SECTION_SORT = "section_sort"
+STAGE_LINKING = "linking"
+STAGE_EVENT_GROUPING = "event_grouping"
+STAGE_STAFF_LINE_REFINEMENT = "staff_line_refinement"
+
+# names of counters filled in by the reconstruction
+COUNT_PAGES = "pages"
+COUNT_MEASURES = "measures"
+COUNT_SYMBOLS = "symbols"
+COUNT_DROPPED_SYMBOLS = "dropped_symbols"
+COUNT_ROWS = "rows"
+COUNT_MEASURE_GROUPS = "measure_groups"
+COUNT_EVENTS = "events"
+COUNT_REFINED_MEASURES = "refined_measures"
+COUNT_DETECTED_MEASURES = "detected_measures"
+COUNT_ROW_CORRECTED_MEASURES = "row_corrected_measures"
+COUNT_CACHED_MEASURES = "cached_measures"
+
+
+class StageStats:
+    """
+    Accumulated wall time, CPU time and peak traced allocations of a single stage.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.peak_memory: int | None = None
+
+    def add(self, wall_time: float, cpu_time: float, peak_memory: int | None):
+        self.calls += 1
+        self.wall_time += wall_time
+        self.cpu_time += cpu_time
+        if peak_memory is not None:
+            self.peak_memory = peak_memory if self.peak_memory is None else max(self.peak_memory, peak_memory)
+
+    def merge(self, other: Self):
+        self.calls += other.calls
+        self.wall_time += other.wall_time
+        self.cpu_time += other.cpu_time
+        if other.peak_memory is not None:
+            self.peak_memory = (other.peak_memory if self.peak_memory is None
+                                else max(self.peak_memory, other.peak_memory))
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "wall_time": self.wall_time,
+            "cpu_time": self.cpu_time,
+            "peak_memory": self.peak_memory,
+        }
+
+
+class PipelineStats:
+    """
+    Structured statistics of the reconstruction pipeline, pass an instance to ``reconstruct_note_events``
+    or ``refactor_measures_on_page`` to fill it in. One instance can be reused for many pages,
+    times and counts are summed, peak allocations are maximized.
+
+    Stages must not be nested when allocations are tracked, each stage resets the peak of ``tracemalloc``.
+
+    Example usage::
+
+        stats = PipelineStats(track_memory=True)
+        for page in pages:
+            reconstruct_note_events(*page, stats=stats)
+        stats.save_json("stats.json")
+    """
+
+    def __init__(self, track_memory: bool = False):
+        """
+        :param track_memory: trace peak allocations of every stage with ``tracemalloc``, slows the stages down
+        """
+        self.track_memory = track_memory
+        self.stages: dict[str, StageStats] = {}
+        self.counts: dict[str, int] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Measures the wrapped block as the given stage.
+        """
+        started_tracing = False
+        if self.track_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - wall_start
+            cpu_time = time.process_time() - cpu_start
+
+            peak_memory = None
+            if self.track_memory:
+                _, peak = tracemalloc.get_traced_memory()
+                peak_memory = max(peak - baseline, 0)
+                if started_tracing:
+                    tracemalloc.stop()
+
+            self.stages.setdefault(name, StageStats()).add(wall_time, cpu_time, peak_memory)
+
+    def count(self, name: str, value: int = 1):
+        """
+        Adds the value to the given counter.
+        """
+        self.counts[name] = self.counts.get(name, 0) + int(value)
+
+    def merge(self, other: Self) -> Self:
+        """
+        Adds statistics of another instance (for example from another worker) to this one.
+        """
+        for name, stage in other.stages.items():
+            self.stages.setdefault(name, StageStats()).merge(stage)
+        for name, value in other.counts.items():
+            self.count(name, value)
+        return self
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "stages": {name: stage.to_dict() for name, stage in self.stages.items()},
+            "counts": dict(self.counts),
+        }
+
+    def to_json(self, indent: int = 4) -> str:
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def save_json(self, path: Path | str, indent: int = 4):
+        with open(path, "w", encoding="utf8") as file:
+            file.write(self.to_json(indent=indent))
+
+
+def measure_stage(stats: PipelineStats | None, name: str) -> ContextManager:
+    """
+    Returns context measuring the given stage, or an empty context if no statistics are collected.
+    """
+    return stats.stage(name) if stats is not None else nullcontext()
+
+
+def count(stats: PipelineStats | None, name: str, value: int = 1):
+    """
+    Adds the value to the given counter if statistics are collected.
+    """
+    if stats is not None:
+        stats.count(name, value)
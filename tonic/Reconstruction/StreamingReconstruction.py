@@ -0,0 +1,320 @@
+import math
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from .ArrayReconstruction import compute_symbol_pitches, link_page_measures
+from .Graph.BoxArrays import LEFT, TOP, RIGHT, BOTTOM, as_box_array, boxes_from_nodes, heights, vertical_centers
+from .Graph.Names import NodeName
+from .Graph.Node import Node, VirtualNode
+from .Graph.PageGraph import UNSET_GS_INDEX
+from .Graph.SpatialIndex import HorizontalIntervalIndex
+from .Graph.Tags import MEASURE_GROUP_GS_TAG
+from .PageReconstruction import compute_measure_groups
+from ..Linearization.LMXWrapper import LMXWrapper
+
+
+def split_page_into_tiles(
+        width: int,
+        height: int,
+        tile_width: int,
+        tile_height: int,
+        overlap_ratio: float = 0.0
+) -> np.ndarray:
+    """
+    Covers the page with a grid of tiles of the given size, neighbouring tiles overlap by the given fraction
+    of their size and tiles of the last row and column are aligned with the edge of the page.
+
+    :param width: width of the page
+    :param height: height of the page
+    :param tile_width: width of a tile
+    :param tile_height: height of a tile
+    :param overlap_ratio: overlap of neighbouring tiles
+    :return: Tx4 array of tile boxes, row after row from the top left corner
+    """
+
+    def _starts(size: int, tile_size: int) -> list[int]:
+        tile_size = min(tile_size, size)
+        stride = max(1, int(tile_size * (1 - overlap_ratio)))
+        count = max(1, math.ceil((size - tile_size) / stride) + 1)
+        return [min(i * stride, size - tile_size) for i in range(count)]
+
+    return as_box_array([
+        (left, top, min(left + tile_width, width), min(top + tile_height, height))
+        for top in _starts(height, tile_height)
+        for left in _starts(width, tile_width)
+    ])
+
+
+class StreamingReconstruction:
+    """
+    Reconstruction of a page whose symbols arrive tile by tile, while measures and grand staffs are known upfront.
+
+    Measures are linked as soon as the reconstruction is created, they do not depend on symbols.
+    Every incoming symbol is assigned to its measure and gets its pitch right away. A symbol can only be assigned
+    to a measure that horizontally contains it and whose vertical center is closer than the upper assignment limit,
+    so only tiles intersecting this region around the measure can still add symbols to it. Once all such tiles
+    of all measures of a measure group arrived, note events of the group are computed and the group is final.
+
+    Detections of a tile must have their centers inside the tile, duplicates from overlapping tiles
+    are kept as they are. When all tiles arrived, the result is the same as ``reconstruct_note_events``
+    of all symbols in the order of their arrival.
+
+    Example usage::
+
+        tiles = split_page_into_tiles(width, height, 640, 640, overlap_ratio=0.1)
+        stream = StreamingReconstruction(measures, grand_staffs, tiles)
+        for tile, noteheads in detect_tiles(image, tiles):
+            for group in stream.add_tile(tile, noteheads):
+                print(stream.group_tokens(group))
+        events = stream.note_events
+    """
+
+    def __init__(
+            self,
+            measures: list[Node],
+            grand_staffs: list[Node],
+            tiles: np.ndarray,
+            ual_factor: float = 1.5,
+            mriou_threshold: float = 0.5,
+            neiou_threshold: float = 0.4,
+            link_systems: bool = True
+    ):
+        """
+        :param measures: list of measures, they must not have any children
+        :param grand_staffs: list of grand staffs
+        :param tiles: Tx4 array of tile boxes in page coordinates
+        :param ual_factor: upper assignment limit factor, see ``assign_notes_to_measures_and_compute_pitch``
+        :param mriou_threshold: measure reading IoU, see ``link_measures_based_on_grand_staffs``
+        :param neiou_threshold: note event IoU, see ``compute_note_events``
+        :param link_systems: link measures of grand staff sections with more than two staffs
+        """
+        for measure in measures:
+            if len(measure.children()) > 0:
+                raise ValueError("Measures passed to the reconstruction must not have any children")
+
+        self.neiou_threshold = neiou_threshold
+        self.tiles = as_box_array(tiles)
+        self._measures = measures
+        self._measure_boxes = boxes_from_nodes(measures)
+        self._measure_index = HorizontalIntervalIndex(self._measure_boxes)
+        self._upper_limit = np.mean(heights(self._measure_boxes)) * ual_factor if len(measures) > 0 else 0.0
+
+        self._links = link_page_measures(
+            self._measure_boxes,
+            boxes_from_nodes(grand_staffs),
+            mriou_threshold,
+            link_systems=link_systems
+        )
+        self._measure_gs_index = self._links.measure_gs_index.tolist()
+        self._measure_group = np.zeros(len(measures), dtype=np.int64)
+        for g, link in enumerate(self._links.links):
+            self._measure_group[link] = g
+
+        # tiles each measure group is waiting for
+        reachable = self._reachable_tiles()
+        self._pending_tiles: list[set[int]] = [
+            set(np.flatnonzero(reachable[link].any(axis=0)).tolist()) for link in self._links.links
+        ]
+        self._tile_groups: list[list[int]] = [[] for _ in range(len(self.tiles))]
+        for g, pending in enumerate(self._pending_tiles):
+            for tile in pending:
+                self._tile_groups[tile].append(g)
+        self._arrived = np.zeros(len(self.tiles), dtype=bool)
+
+        self._groups: list[VirtualNode | None] = [None] * self._links.group_count
+        self._group_tokens: list[list[str] | None] = [None] * self._links.group_count
+        self.dropped: list[Node] = []
+
+        # groups without any reachable tile are final from the start
+        self.initial_groups = self._finalize([g for g, pending in enumerate(self._pending_tiles) if len(pending) == 0])
+
+    @property
+    def group_count(self) -> int:
+        return self._links.group_count
+
+    @property
+    def finished(self) -> bool:
+        """
+        True when all measure groups are final.
+        """
+        return all(group is not None for group in self._groups)
+
+    def is_final(self, group: int) -> bool:
+        return self._groups[group] is not None
+
+    def group(self, group: int) -> VirtualNode:
+        """
+        Returns a final measure group, in the format of the groups returned by ``reconstruct_note_events``.
+        """
+        self._check_final(group)
+        return self._groups[group]
+
+    def group_tokens(self, group: int) -> list[str]:
+        """
+        Returns LMX tokens of a final measure group.
+        """
+        self._check_final(group)
+        return self._group_tokens[group]
+
+    @property
+    def note_events(self) -> list[list[VirtualNode]]:
+        """
+        Rows of measure groups, in the format returned by ``reconstruct_note_events``, available when finished.
+        """
+        self._check_finished()
+        if len(self._measures) == 0:
+            return [[]]
+        offsets = self._links.row_offsets.tolist()
+        return [self._groups[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+    @property
+    def lmx(self) -> LMXWrapper:
+        """
+        LMX of the page, the same as ``linearize_note_events_to_lmx(stream.note_events)``, available when finished.
+        """
+        self._check_finished()
+        has_events = any(child.name == NodeName.NOTE_EVENT for group in self._groups for child in group.children())
+        if not has_events:
+            return LMXWrapper([])
+        return LMXWrapper([token for tokens in self._group_tokens for token in tokens])
+
+    def add_tile(self, tile: int, symbols: list[Node]) -> list[int]:
+        """
+        Assigns symbols detected in the tile to their measures and finalizes measure groups
+        that can not receive any more symbols.
+
+        :param tile: index of the tile
+        :param symbols: symbols with pitch (noteheads, accidentals) detected in the tile, in page coordinates
+        :return: indices of measure groups that became final, in reading order
+        """
+        if self._arrived[tile]:
+            raise ValueError(f"Tile {tile} was already added")
+        self._place(symbols)
+        self._arrived[tile] = True
+
+        ready = []
+        for g in self._tile_groups[tile]:
+            self._pending_tiles[g].discard(tile)
+            if len(self._pending_tiles[g]) == 0:
+                ready.append(g)
+        return self._finalize(sorted(ready))
+
+    def finish(self) -> list[int]:
+        """
+        Finalizes all remaining measure groups, tiles that did not arrive are treated as empty.
+
+        :return: indices of measure groups that became final, in reading order
+        """
+        self._arrived[:] = True
+        for pending in self._pending_tiles:
+            pending.clear()
+        return self._finalize([g for g in range(self.group_count) if self._groups[g] is None])
+
+    # INTERNALS
+    def _check_final(self, group: int):
+        if self._groups[group] is None:
+            raise ValueError(f"Measure group {group} is not final yet")
+
+    def _check_finished(self):
+        if not self.finished:
+            raise ValueError("Not all measure groups are final yet, add remaining tiles or call finish()")
+
+    def _reachable_tiles(self) -> np.ndarray:
+        """
+        Returns MxT matrix of tiles that can contain a center of a symbol assignable to each measure.
+        """
+        boxes = self._measure_boxes
+        centers = vertical_centers(boxes)
+        # slightly widened, rounding must never drop a tile
+        reach = self._upper_limit * (1 + 1e-9) + 1e-9
+        tiles = self.tiles
+        return ((tiles[np.newaxis, :, LEFT] <= boxes[:, np.newaxis, RIGHT])
+                & (tiles[np.newaxis, :, RIGHT] >= boxes[:, np.newaxis, LEFT])
+                & (tiles[np.newaxis, :, TOP] <= (centers + reach)[:, np.newaxis])
+                & (tiles[np.newaxis, :, BOTTOM] >= (centers - reach)[:, np.newaxis]))
+
+    def _place(self, symbols: list[Node]):
+        if len(symbols) == 0:
+            return
+
+        symbol_boxes = boxes_from_nodes(symbols)
+        if len(self._measures) > 0:
+            assignment = self._measure_index.assign_closest(symbol_boxes, upper_limit=self._upper_limit)
+        else:
+            assignment = np.full(len(symbols), -1, dtype=np.int64)
+        pitch = compute_symbol_pitches(self._measure_boxes, symbol_boxes, assignment)
+
+        for symbol, measure_index, symbol_pitch in zip(symbols, assignment.tolist(), pitch.tolist()):
+            if measure_index < 0:
+                self.dropped.append(symbol)
+                continue
+
+            if self._groups[self._measure_group[measure_index]] is not None:
+                raise ValueError("Symbol belongs to a final measure group, "
+                                 "centers of detections of a tile must lie inside the tile")
+            measure = self._measures[measure_index]
+            measure.add_child(symbol)
+            symbol.pitch = symbol_pitch
+            gs_index = self._measure_gs_index[measure_index]
+            if gs_index != UNSET_GS_INDEX:
+                symbol.gs_index = gs_index
+
+    def _finalize(self, groups: list[int]) -> list[int]:
+        # linearization imports the reconstruction package, importing it at the top would be circular
+        from ..Linearization.GraphToLMX import linearize_measure_group_to_lmx
+
+        linked_measures: list[VirtualNode] = []
+        for g in groups:
+            measures = [self._measures[m] for m in self._links.links[g].tolist()]
+            for measure in measures:
+                measure.update_total_bbox()
+            node = VirtualNode([symbol for measure in measures for symbol in measure.children()])
+            node.set_tag(MEASURE_GROUP_GS_TAG, self._links.group_gs[g])
+            linked_measures.append(node)
+
+        for g, group in zip(groups, compute_measure_groups(linked_measures, self.neiou_threshold)):
+            self._groups[g] = group
+            self._group_tokens[g] = linearize_measure_group_to_lmx(group, first=(g == 0))
+        return groups
+
+
+def stream_note_events(
+        measures: list[Node],
+        grand_staffs: list[Node],
+        tiles: np.ndarray,
+        tile_symbols: Iterable[tuple[int, list[Node]]],
+        ual_factor: float = 1.5,
+        mriou_threshold: float = 0.5,
+        neiou_threshold: float = 0.4,
+        link_systems: bool = True
+) -> Iterator[tuple[int, VirtualNode]]:
+    """
+    Streaming version of ``reconstruct_note_events``, see ``StreamingReconstruction``.
+    Symbols are consumed tile by tile and every measure group is yielded as soon as it is final,
+    so reconstruction of a page overlaps with detection of its remaining tiles.
+
+    :param measures: list of measures
+    :param grand_staffs: list of grand staffs
+    :param tiles: Tx4 array of tile boxes in page coordinates
+    :param tile_symbols: iterable of (tile index, symbols detected in the tile)
+    :param ual_factor: upper assignment limit factor
+    :param mriou_threshold: measure reading IoU
+    :param neiou_threshold: note event IoU
+    :param link_systems: link measures of grand staff sections with more than two staffs
+    :return: iterator of (index of measure group in reading order, measure group)
+    """
+    stream = StreamingReconstruction(
+        measures, grand_staffs, tiles,
+        ual_factor=ual_factor,
+        mriou_threshold=mriou_threshold,
+        neiou_threshold=neiou_threshold,
+        link_systems=link_systems
+    )
+    for g in stream.initial_groups:
+        yield g, stream.group(g)
+    for tile, symbols in tile_symbols:
+        for g in stream.add_tile(tile, symbols):
+            yield g, stream.group(g)
+    for g in stream.finish():
+        yield g, stream.group(g)
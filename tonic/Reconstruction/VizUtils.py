@@ -4,8 +4,7 @@ import cv2
 from PIL import Image, ImageDraw, ImageFont
 
 from .Graph.Names import NodeName
-from .Graph.Node import Node, VirtualNode, BaseNode
-from .Graph.Tags import SYMBOL_PITCH_TAG
+from .Graph.Node import Node, VirtualNode
 from odtools.Splitting import draw_rectangles_on_image
 
 
@@ -37,7 +36,7 @@ def write_note_heights_to_image(image, measures: list[Node]):
     for note in measures:
         draw.text(
             (note.annot.bbox.left, note.annot.bbox.top),
-            str(round(note.get_tag(SYMBOL_PITCH_TAG))),
+            str(round(note.pitch)),
             font=font,
             fill=(0, 255, 0)
         )
@@ -1,3 +1,12 @@
+from .ArrayReconstruction import reconstruct_page_graph
+from .BatchReconstruction import reconstruct_note_events_batch, BatchOutput, PageResult
 from .Graph.Tags import NoteheadType
 from .PageReconstruction import reconstruct_note_events
-from .Preprocessing import preprocess_annots_for_reconstruction
+from .PageRenderer import PageOverlay, PageRenderer, render_pages_batch
+from .PageSession import PageSession
+from .ParameterSweep import ParameterSweep, SweepPoint
+from .ReconstructionCache import ReconstructionCache
+from .ShiftCache import ShiftCache
+from .StreamingReconstruction import StreamingReconstruction, stream_note_events, split_page_into_tiles
+from .Preprocessing import preprocess_annots_for_reconstruction, preprocess_detections_for_reconstruction
+from .Stats import PipelineStats
@@ -1,5 +1,10 @@
 from .Linearization import LMXWrapper
-from .Linearization.GraphToLMX import linearize_note_events_to_lmx
-from .Reconstruction import preprocess_annots_for_reconstruction, reconstruct_note_events
-from .Reconstruction.Graph import NOTEHEAD_TYPE_TAG, NoteheadType, NodeName, Node
+from .Linearization.GraphToLMX import linearize_note_events_to_lmx, linearize_page_graph_to_lmx
+from .Reconstruction import (preprocess_annots_for_reconstruction, preprocess_detections_for_reconstruction,
+                             reconstruct_note_events, reconstruct_page_graph, reconstruct_note_events_batch,
+                             PipelineStats, PageSession, ReconstructionCache, ShiftCache, ParameterSweep, SweepPoint,
+                             StreamingReconstruction, stream_note_events, PageOverlay, PageRenderer,
+                             render_pages_batch)
+from .Reconstruction.Graph import NOTEHEAD_TYPE_TAG, NoteheadType, NodeName, Node, PageGraph
+from .Reconstruction.Graph import save_page_graph, load_page_graph, load_note_events
 from .Reconstruction.StaLiXWrapper import refactor_measures_on_page